@@ -0,0 +1,127 @@
+// --------------------------------------------------
+// Micro-benchmark of the pareto set merge strategies
+// --------------------------------------------------
+
+// Merges random pareto sets with every strategy of pareto_merge.hpp, checks
+// that they give the same solutions and number of comparisons as the list,
+// and prints the average time of a merge.
+//
+// Usage: pareto_bench [num_objs] [set_size] [depth] [repeats]
+
+#include <cassert>
+#include <chrono>
+#include <cmath>
+#include <cstdlib>
+#include <iostream>
+#include <list>
+#include <random>
+#include <vector>
+
+#include "pareto_util.hpp"
+#include "pareto_merge.hpp"
+
+using namespace std;
+
+//
+// Random pareto set of about 'size' solutions with 'depth' primal values.
+// Objectives are drawn close to a simplex so that few are dominated
+//
+ParetoSet random_pareto_set(int num_objs, int size, int depth, mt19937 &rng)
+{
+	uniform_real_distribution<double> unif(0.0, 1.0);
+	uniform_int_distribution<int> bit(0, 1);
+	ParetoSet pset(num_objs);
+	for (int s = 0; s < size; ++s)
+	{
+		vector<double> w(num_objs);
+		double total = 0;
+		for (int o = 0; o < num_objs; ++o)
+		{
+			w[o] = -log(unif(rng));
+			total += w[o];
+		}
+		vector<int> obj(num_objs), x(depth);
+		double noise = 1.0 + 0.05 * unif(rng);
+		for (int o = 0; o < num_objs; ++o)
+		{
+			obj[o] = (int)(100000 * noise * w[o] / total);
+		}
+		for (int i = 0; i < depth; ++i)
+		{
+			x[i] = bit(rng);
+		}
+		Solution sol(x, obj);
+		pset.add(sol);
+	}
+	return pset;
+}
+
+//
+// Main function
+//
+int main(int argc, char *argv[])
+{
+	int num_objs = (argc > 1) ? atoi(argv[1]) : 3;
+	int size = (argc > 2) ? atoi(argv[2]) : 2000;
+	int depth = (argc > 3) ? atoi(argv[3]) : 40;
+	int repeats = (argc > 4) ? atoi(argv[4]) : 5;
+
+	mt19937 rng(12345);
+	vector<ParetoSet> sets, others;
+	vector<vector<int>> shifts;
+	for (int r = 0; r < repeats; ++r)
+	{
+		sets.push_back(random_pareto_set(num_objs, size, depth, rng));
+		others.push_back(random_pareto_set(num_objs, size, depth, rng));
+		vector<int> shift(num_objs);
+		for (int o = 0; o < num_objs; ++o)
+		{
+			shift[o] = rng() % 2000;
+		}
+		shifts.push_back(shift);
+	}
+
+	const char *names[] = {"list", "sorted", "sweep", "bbox"};
+	ParetoMethod methods[] = {PARETO_LIST, PARETO_SORTED, PARETO_SWEEP, PARETO_BBOX};
+	vector<ParetoSet> expected;
+	vector<size_t> expected_comparisons;
+
+	cout << "num_objs = " << num_objs << ", |A| ~ " << sets[0].sols.size() << ", |B| ~ " << others[0].sols.size()
+		 << ", depth = " << depth << ", repeats = " << repeats << endl;
+	for (int m = 0; m < 4; ++m)
+	{
+		double elapsed = 0;
+		size_t num_comparisons = 0;
+		for (int r = 0; r < repeats; ++r)
+		{
+			ParetoSet pset = sets[r];
+			auto start = chrono::steady_clock::now();
+			size_t comparisons = merge_pareto_sets(pset, others[r], 1, shifts[r], methods[m]);
+			elapsed += chrono::duration<double>(chrono::steady_clock::now() - start).count();
+			num_comparisons += comparisons;
+
+			if (m == 0)
+			{
+				expected.push_back(pset);
+				expected_comparisons.push_back(comparisons);
+				continue;
+			}
+			// Same solutions, in the same order, and the same number of comparisons
+			bool same = (comparisons == expected_comparisons[r] && pset.sols.size() == expected[r].sols.size());
+			SolutionList::iterator a = pset.sols.begin(), b = expected[r].sols.begin();
+			for (; same && a != pset.sols.end(); ++a, ++b)
+			{
+				same = (a->obj == b->obj && a->x == b->x);
+			}
+			if (!same)
+			{
+				cout << "Error: " << names[m] << " differs from list on repeat " << r << endl;
+				return 1;
+			}
+		}
+		cout << names[m] << ": " << 1000 * elapsed / repeats << " ms per merge, "
+			 << num_comparisons / repeats << " comparisons" << endl;
+	}
+
+	return 0;
+}
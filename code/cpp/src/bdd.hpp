@@ -34,6 +34,10 @@ struct Node
 	// Destructor
 	~Node();
 
+	// Nodes are allocated in blocks, see NodePool
+	static void *operator new(size_t size);
+	static void operator delete(void *ptr);
+
 	// Layer of node
 	int layer;
 	// Node index in layer
@@ -93,6 +97,12 @@ struct BDD
 	// Get BDD width
 	int get_width();
 
+	// Get number of nodes of a layer
+	int get_layer_size(int l)
+	{
+		return layers[l].size();
+	}
+
 	// Get number of nodes
 	int get_num_nodes();
 
@@ -147,10 +157,106 @@ struct BDD
 	//  vector< vector<Node*> > layers(num_layers);
 };
 
+//
+// Free list of node memory, refilled a block of nodes at a time. Compiling a
+// BDD creates and deletes many nodes, and the blocks are reused while it is
+// compiled. Every thread has its own pool, so that nodes can still be created
+// by several threads, and nodes are deleted by the thread that created them.
+// release() returns the blocks to the system once all nodes are deleted, so
+// that the memory of an order is not kept for the next one in batch mode
+//
+struct NodePool
+{
+	static const size_t BLOCK_SIZE = 4096;
+
+	union Slot
+	{
+		Slot *next;
+		alignas(Node) char node[sizeof(Node)];
+	};
+
+	Slot *free_list;
+	// Allocated blocks
+	vector<Slot *> blocks;
+	// Number of nodes not deleted yet
+	size_t num_live;
+
+	NodePool() : free_list(NULL), num_live(0) {}
+
+	~NodePool()
+	{
+		release();
+	}
+
+	void *allocate()
+	{
+		if (free_list == NULL)
+		{
+			// Recorded first, so that the block is not lost if recording it fails
+			blocks.push_back(NULL);
+			Slot *block = static_cast<Slot *>(::operator new(BLOCK_SIZE * sizeof(Slot)));
+			blocks.back() = block;
+			for (size_t i = 0; i < BLOCK_SIZE; ++i)
+			{
+				block[i].next = free_list;
+				free_list = &block[i];
+			}
+		}
+		Slot *slot = free_list;
+		free_list = slot->next;
+		++num_live;
+		return slot;
+	}
+
+	void deallocate(void *ptr)
+	{
+		Slot *slot = static_cast<Slot *>(ptr);
+		slot->next = free_list;
+		free_list = slot;
+		--num_live;
+	}
+
+	// Free the blocks if no node is alive. Returns whether they were freed
+	bool release()
+	{
+		if (num_live != 0)
+		{
+			return false;
+		}
+		for (size_t i = 0; i < blocks.size(); ++i)
+		{
+			::operator delete(blocks[i]);
+		}
+		blocks.clear();
+		blocks.shrink_to_fit();
+		free_list = NULL;
+		return true;
+	}
+};
+
+inline thread_local NodePool node_pool;
+
 // ---------------------------------------------------------------------------------------------
 // Inline implementations
 // ---------------------------------------------------------------------------------------------
 
+//
+// Node memory
+//
+inline void *Node::operator new(size_t size)
+{
+	assert(size == sizeof(Node));
+	return node_pool.allocate();
+}
+
+inline void Node::operator delete(void *ptr)
+{
+	if (ptr != NULL)
+	{
+		node_pool.deallocate(ptr);
+	}
+}
+
 //
 // Node constructor
 //
@@ -109,6 +109,147 @@ void BDDAlg::reduce(BDD *bdd)
 	}
 }
 
+//
+// Reduce compact BDD. As in BDDAlg::reduce, the last node of a layer with
+// given arcs is kept and nodes without arcs are removed. Unlike it, the nodes
+// of a layer keep their order rather than the order of a hash map, so the
+// Pareto set computation takes a different number of comparisons
+//
+void BDDAlg::reduce(CompactBDD *bdd)
+{
+	vector<vector<int>> order(bdd->num_layers);
+	// New index of the nodes of the next layer, -1 if removed
+	vector<int> next_index(bdd->get_layer_size(bdd->num_layers - 1));
+	for (size_t i = 0; i < next_index.size(); ++i)
+	{
+		next_index[i] = i;
+		order[bdd->num_layers - 1].push_back(i);
+	}
+
+	// Nodes grouped by zero arc, and the node kept for each one arc in a group
+	vector<int> group_first, group_next, kept_by_one_arc;
+
+	for (int l = bdd->num_layers - 2; l >= 0; --l)
+	{
+		int size = bdd->get_layer_size(l);
+		int next_size = next_index.size();
+
+		// Redirect arcs to the nodes kept in the next layer
+		for (int i = 0; i < size; ++i)
+		{
+			size_t p = bdd->pos(l, i);
+			if (bdd->zero_arc[p] >= 0)
+				bdd->zero_arc[p] = next_index[bdd->zero_arc[p]];
+			if (bdd->one_arc[p] >= 0)
+				bdd->one_arc[p] = next_index[bdd->one_arc[p]];
+		}
+
+		// Group nodes by zero arc, in reverse layer order
+		group_first.assign(next_size + 1, -1);
+		group_next.resize(size);
+		for (int i = 0; i < size; ++i)
+		{
+			int group = bdd->zero_arc[bdd->pos(l, i)] + 1;
+			group_next[i] = group_first[group];
+			group_first[group] = i;
+		}
+
+		// Node each node is merged into, or -1 if removed
+		vector<int> merged(size, -1);
+		kept_by_one_arc.assign(next_size + 1, -1);
+		for (int group = 0; group <= next_size; ++group)
+		{
+			for (int i = group_first[group]; i >= 0; i = group_next[i])
+			{
+				int one = bdd->one_arc[bdd->pos(l, i)] + 1;
+				if (group == 0 && one == 0)
+					continue;
+				if (kept_by_one_arc[one] < 0)
+					kept_by_one_arc[one] = i;
+				merged[i] = kept_by_one_arc[one];
+			}
+			for (int i = group_first[group]; i >= 0; i = group_next[i])
+			{
+				kept_by_one_arc[bdd->one_arc[bdd->pos(l, i)] + 1] = -1;
+			}
+		}
+
+		// Kept nodes in layer order
+		vector<int> index(size, -1);
+		for (int i = 0; i < size; ++i)
+		{
+			if (merged[i] == i)
+			{
+				index[i] = order[l].size();
+				order[l].push_back(i);
+			}
+		}
+		next_index.resize(size);
+		for (int i = 0; i < size; ++i)
+		{
+			next_index[i] = (merged[i] >= 0) ? index[merged[i]] : -1;
+		}
+	}
+
+	bdd->compact(order);
+}
+
+//
+// Remove dangling nodes of a compact BDD. As in BDDAlg::remove_dangling_nodes,
+// a removed node is replaced by the last node of its layer
+//
+void BDDAlg::remove_dangling_nodes(CompactBDD *bdd)
+{
+	vector<vector<int>> order(bdd->num_layers);
+	// New index of the nodes of the next layer, -1 if removed
+	vector<int> next_index(bdd->get_layer_size(bdd->num_layers - 1));
+	for (size_t i = 0; i < next_index.size(); ++i)
+	{
+		next_index[i] = i;
+		order[bdd->num_layers - 1].push_back(i);
+	}
+
+	for (int l = bdd->num_layers - 2; l >= 0; --l)
+	{
+		int size = bdd->get_layer_size(l);
+		for (int i = 0; i < size; ++i)
+		{
+			size_t p = bdd->pos(l, i);
+			if (bdd->zero_arc[p] >= 0)
+				bdd->zero_arc[p] = next_index[bdd->zero_arc[p]];
+			if (bdd->one_arc[p] >= 0)
+				bdd->one_arc[p] = next_index[bdd->one_arc[p]];
+		}
+
+		order[l].resize(size);
+		for (int i = 0; i < size; ++i)
+		{
+			order[l][i] = i;
+		}
+		for (size_t k = 0; k < order[l].size();)
+		{
+			size_t p = bdd->pos(l, order[l][k]);
+			if (bdd->zero_arc[p] < 0 && bdd->one_arc[p] < 0)
+			{
+				order[l][k] = order[l].back();
+				order[l].pop_back();
+			}
+			else
+			{
+				k++;
+			}
+		}
+
+		next_index.assign(size, -1);
+		for (size_t k = 0; k < order[l].size(); ++k)
+		{
+			next_index[order[l][k]] = k;
+		}
+	}
+
+	bdd->compact(order);
+}
+
 //
 // Create new reduced BDD contaning the paths from the input BDD with the given length
 //
@@ -879,13 +1020,192 @@ inline vector<int> BDDAlg::longest_path_multi_obj_from_node(BDD *bdd, int obj, c
 	return optimum;
 }
 
+//
+// Incoming arcs of the nodes of a BDD, for pareto_set_objectives
+//
+struct NodeInArcs
+{
+	BDD *bdd;
+
+	NodeInArcs(BDD *_bdd) : bdd(_bdd) {}
+
+	void load_layer(int l) {}
+
+	// Call f(tail, value) for the zero then the one arcs entering node i of layer l
+	template <typename F>
+	void for_each(int l, size_t i, F f) const
+	{
+		Node *node = bdd->layers[l][i];
+		for (vector<Node *>::iterator prev = node->zero_prev.begin(); prev != node->zero_prev.end(); ++prev)
+		{
+			f((*prev)->index, 0);
+		}
+		for (vector<Node *>::iterator prev = node->one_prev.begin(); prev != node->one_prev.end(); ++prev)
+		{
+			f((*prev)->index, 1);
+		}
+	}
+};
+
+//
+// Incoming arcs of the nodes of a compact BDD, gathered for one layer at a
+// time. The tails of the arcs of each value entering node i are
+// tails[value][first[value][i]..first[value][i+1]-1], in layer order, the
+// order of the incoming arcs of BDDAlg::reduce
+//
+struct CompactInArcs
+{
+	CompactBDD *bdd;
+	vector<int> first[2], tails[2];
+
+	CompactInArcs(CompactBDD *_bdd) : bdd(_bdd) {}
+
+	void load_layer(int l)
+	{
+		const vector<int> *arcs[2] = {&bdd->zero_arc, &bdd->one_arc};
+		int num_tails = bdd->get_layer_size(l - 1);
+		for (int v = 0; v < 2; ++v)
+		{
+			// Counting sort of the tails by head
+			first[v].assign(bdd->get_layer_size(l) + 1, 0);
+			for (int t = 0; t < num_tails; ++t)
+			{
+				int head = (*arcs[v])[bdd->pos(l - 1, t)];
+				if (head >= 0)
+					first[v][head + 1] += 1;
+			}
+			for (size_t i = 1; i < first[v].size(); ++i)
+			{
+				first[v][i] += first[v][i - 1];
+			}
+			tails[v].resize(first[v].back());
+			vector<int> next(first[v].begin(), first[v].end() - 1);
+			for (int t = 0; t < num_tails; ++t)
+			{
+				int head = (*arcs[v])[bdd->pos(l - 1, t)];
+				if (head >= 0)
+					tails[v][next[head]++] = t;
+			}
+		}
+	}
+
+	template <typename F>
+	void for_each(int l, size_t i, F f) const
+	{
+		for (int v = 0; v < 2; ++v)
+		{
+			for (int k = first[v][i]; k < first[v][i + 1]; ++k)
+			{
+				f(tails[v][k], v);
+			}
+		}
+	}
+};
+
+//
+// Same as BDDAlg::pareto_set, propagating objective vectors only, over the
+// layers of 'bdd' and their incoming arcs 'in_arcs'
+//
+template <typename BDDType, typename InArcs>
+static MultiobjResult *pareto_set_objectives(BDDType *bdd, InArcs &in_arcs, const vector<vector<int>> &obj_coeffs,
+											 ParetoMethod method, SolutionMode mode, int num_threads)
+{
+	int width = bdd->get_width();
+	int num_objs = obj_coeffs.size();
+
+	// Per node objective vectors, reused across layers
+	vector<ObjectiveParetoSet> sets[2];
+	for (int o = 0; o < 2; ++o)
+	{
+		sets[o] = vector<ObjectiveParetoSet>(width, ObjectiveParetoSet(num_objs));
+	}
+	SolutionTrace *trace = (mode == SOLUTIONS_TRACE) ? new SolutionTrace() : NULL;
+
+	MultiobjResult *mo_result = new MultiobjResult(bdd->num_layers);
+
+	int bef = 0, cur = 1; // 'before' and 'current' pareto set indices
+	vector<int> shift_zero(num_objs, 0);
+	vector<int> shift_one(num_objs, 0);
+	size_t num_comparisons = 0;
+
+	// root node, labeled with the root of the trace
+	sets[bef][0].objs.assign(num_objs, 0);
+	if (trace != NULL)
+	{
+		sets[bef][0].labels.assign(1, 0);
+	}
+	mo_result->num_pareto_sol[0] = 1;
+
+	for (int l = 1; l < bdd->num_layers; ++l)
+	{
+		for (int o = 0; o < num_objs; ++o)
+		{
+			shift_one[o] = obj_coeffs[o][l - 1];
+		}
+
+		in_arcs.load_layer(l);
+		num_comparisons += merge_layer(bdd->get_layer_size(l), num_threads, [&](size_t i)
+		{
+			size_t comparisons = 0;
+			sets[cur][i].clear();
+			in_arcs.for_each(l, i, [&](int prev, int val)
+			{
+				comparisons += merge_objective_sets(sets[cur][i], sets[bef][prev], val, val ? shift_one : shift_zero,
+													method, trace);
+			});
+			return comparisons;
+		});
+
+		size_t layer_size = 0;
+		for (int i = 0; i < bdd->get_layer_size(l); ++i)
+		{
+			layer_size += sets[cur][i].size();
+		}
+		mo_result->num_pareto_sol[l] = (unsigned long int)layer_size;
+		mo_result->num_comparisons = num_comparisons;
+
+		bef = !bef;
+		cur = !cur;
+	}
+
+	// Frontier at the terminal node
+	ObjectiveParetoSet &frontier = sets[bef][0];
+	mo_result->pareto_set = new ParetoSet(num_objs);
+	for (size_t i = 0; i < frontier.size(); ++i)
+	{
+		vector<int> x = (trace != NULL) ? trace->solution(frontier.labels[i]) : vector<int>();
+		vector<int> obj(frontier.objs.begin() + i * num_objs, frontier.objs.begin() + (i + 1) * num_objs);
+		mo_result->pareto_set->sols.push_back(Solution(x, obj));
+	}
+	delete trace;
+
+	return mo_result;
+}
+
+//
+// Compute pareto-set solution of a compact BDD
+//
+MultiobjResult *BDDAlg::pareto_set(CompactBDD *bdd, const vector<vector<int>> &obj_coeffs, ParetoMethod method,
+								   SolutionMode mode, int num_threads)
+{
+	CompactInArcs in_arcs(bdd);
+	return pareto_set_objectives(bdd, in_arcs, obj_coeffs, method,
+								 (mode == SOLUTIONS_FULL) ? SOLUTIONS_TRACE : mode, num_threads);
+}
+
 //
 // Compute pareto-set solution of BDD given 'n' objective functions
 // Assume zero-arc lenghts are zero and one-arc lenghts are fixed per layer
 //
 // ParetoSet *BDDAlg::pareto_set(BDD *bdd, const vector<vector<int>> &obj_coeffs)
-MultiobjResult *BDDAlg::pareto_set(BDD *bdd, const vector<vector<int>> &obj_coeffs)
+MultiobjResult *BDDAlg::pareto_set(BDD *bdd, const vector<vector<int>> &obj_coeffs, ParetoMethod method,
+								   SolutionMode mode, int num_threads)
 {
+	if (mode != SOLUTIONS_FULL)
+	{
+		NodeInArcs in_arcs(bdd);
+		return pareto_set_objectives(bdd, in_arcs, obj_coeffs, method, mode, num_threads);
+	}
 	// cout << "\nComputing Pareto Set...\n";
 
 	int width = bdd->get_width();
@@ -933,28 +1253,36 @@ MultiobjResult *BDDAlg::pareto_set(BDD *bdd, const vector<vector<int>> &obj_coef
 
 		avg_size = 0;
 
-		for (vector<Node *>::iterator it = bdd->layers[l].begin(); it != bdd->layers[l].end(); ++it)
+		// merge the nodes of the layer, possibly in parallel
+		num_comparisons += merge_layer(bdd->layers[l].size(), num_threads, [&](size_t i)
 		{
-
-			int id = (*it)->index;
+			Node *node = bdd->layers[l][i];
+			int id = node->index;
+			size_t comparisons = 0;
 			// clear efficient set of this node
 			sets[cur][id]->clear();
 
 			// add zero arc prev
-			for (vector<Node *>::iterator prev = (*it)->zero_prev.begin();
-				 prev != (*it)->zero_prev.end(); ++prev)
+			for (vector<Node *>::iterator prev = node->zero_prev.begin();
+				 prev != node->zero_prev.end(); ++prev)
 			{
-				num_comparisons += sets[cur][id]->merge(*(sets[bef][(*prev)->index]), 0, shift_zero);
+				comparisons += merge_pareto_sets(*(sets[cur][id]), *(sets[bef][(*prev)->index]), 0, shift_zero,
+												 method);
 			}
 
 			// add one arc prev
-			for (vector<Node *>::iterator prev = (*it)->one_prev.begin();
-				 prev != (*it)->one_prev.end(); ++prev)
+			for (vector<Node *>::iterator prev = node->one_prev.begin();
+				 prev != node->one_prev.end(); ++prev)
 			{
-				num_comparisons += sets[cur][id]->merge(*(sets[bef][(*prev)->index]), 1, shift_one);
+				comparisons += merge_pareto_sets(*(sets[cur][id]), *(sets[bef][(*prev)->index]), 1, shift_one,
+												 method);
 			}
+			return comparisons;
+		});
 
-			avg_size += sets[cur][id]->sols.size();
+		for (vector<Node *>::iterator it = bdd->layers[l].begin(); it != bdd->layers[l].end(); ++it)
+		{
+			avg_size += sets[cur][(*it)->index]->sols.size();
 		}
 		// Record the number of pareto solutions at layer l
 		mo_result->num_pareto_sol[l] = (unsigned long int)avg_size;
@@ -15,7 +15,9 @@
 #include <ilcplex/ilocplex.h>
 
 #include "bdd.hpp"
+#include "compact_bdd.hpp"
 #include "pareto_util.hpp"
+#include "pareto_merge.hpp"
 
 using namespace std;
 
@@ -49,6 +51,12 @@ struct MultiobjResult
 		delete[] num_pareto_sol;
 	}
 
+	// Number of solutions of the pareto frontier
+	size_t frontier_size()
+	{
+		return pareto_set->sols.size();
+	}
+
 	void print_num_pareto_sol()
 	{
 		cout << " # " << num_pareto_sol[0];
@@ -78,15 +86,31 @@ public:
 	// Reduce BDD
 	static void reduce(BDD *bdd);
 
+	// Reduce compact BDD, giving the same nodes in the same order as for a BDD
+	static void reduce(CompactBDD *bdd);
+
 	// Remove dangling nodes
 	static void remove_dangling_nodes(BDD *bdd);
 
+	// Remove dangling nodes of a compact BDD, giving the same nodes in the same order as for a BDD
+	static void remove_dangling_nodes(CompactBDD *bdd);
+
 	// Intersect BDDs
 	static BDD *intersect(BDD *bddA, BDD *bddB);
 
 	// Compute pareto-set solution of BDD given 'n' objective functions
 	// Assume zero-arc lenghts are zero and one-arc lenghts are fixed per layer
-	static MultiobjResult *pareto_set(BDD *bdd, const vector<vector<int>> &obj_coeffs);
+	// With mode other than SOLUTIONS_FULL, only objective vectors are propagated and the primal
+	// values of the frontier are left empty (SOLUTIONS_OBJECTIVES) or rebuilt at the end (SOLUTIONS_TRACE)
+	// The nodes of a layer are merged by up to 'num_threads' threads, with the same result
+	static MultiobjResult *pareto_set(BDD *bdd, const vector<vector<int>> &obj_coeffs,
+									  ParetoMethod method = PARETO_LIST, SolutionMode mode = SOLUTIONS_FULL,
+									  int num_threads = 1);
+
+	// Same for a compact BDD. Solutions are always traced, and rebuilt with SOLUTIONS_FULL
+	static MultiobjResult *pareto_set(CompactBDD *bdd, const vector<vector<int>> &obj_coeffs,
+									  ParetoMethod method = PARETO_LIST, SolutionMode mode = SOLUTIONS_FULL,
+									  int num_threads = 1);
 
 	// Compute pareto-set solution of BDD given 'n' objective functions, with delayed states
 	// Assume zero-arc lenghts are zero and one-arc lenghts are fixed per layer
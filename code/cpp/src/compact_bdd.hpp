@@ -0,0 +1,128 @@
+// ----------------------------------------------------------
+// Compact BDD Data Structure
+// ----------------------------------------------------------
+
+#ifndef COMPACT_BDD_HPP_
+#define COMPACT_BDD_HPP_
+
+#include <cassert>
+#include <vector>
+
+using namespace std;
+
+//
+// Layered BDD stored as arrays instead of node objects. The nodes of layer l
+// are the positions start[l]..start[l+1]-1 of the node arrays, and an arc
+// holds the index of its head in the next layer, -1 if there is no arc.
+// Layers are built one after the other, so the arrays are filled in order.
+// Node indices are always their position in the layer.
+//
+// As in the knapsack BDDs, zero arcs have length zero and the one arcs of
+// layer l have length obj_coeffs[o][l], so arc lengths are not stored
+//
+struct CompactBDD
+{
+	// Number of layers
+	const int num_layers;
+	// First node of each layer built, followed by the number of nodes
+	vector<size_t> start;
+	// Head of the zero and one arcs of each node
+	vector<int> zero_arc;
+	vector<int> one_arc;
+	// Int state of each node
+	vector<int> state;
+
+	// Constructor
+	CompactBDD(int _num_layers) : num_layers(_num_layers)
+	{
+		start.reserve(num_layers + 1);
+		start.push_back(0);
+	}
+
+	// Start a new layer after the ones built
+	void add_layer()
+	{
+		assert((int)start.size() <= num_layers);
+		start.push_back(start.back());
+	}
+
+	// Add node in the last layer built, and return its index in the layer
+	int add_node(int _state)
+	{
+		zero_arc.push_back(-1);
+		one_arc.push_back(-1);
+		state.push_back(_state);
+		return start.back()++ - start[start.size() - 2];
+	}
+
+	// Position of node i of layer l in the node arrays
+	size_t pos(int l, int i) const
+	{
+		return start[l] + i;
+	}
+
+	// Get number of nodes of a layer
+	int get_layer_size(int l) const
+	{
+		return start[l + 1] - start[l];
+	}
+
+	// Get BDD width
+	int get_width() const
+	{
+		int w = 0;
+		for (int l = 0; l < num_layers; ++l)
+		{
+			w = max(w, get_layer_size(l));
+		}
+		return w;
+	}
+
+	// Get number of nodes
+	int get_num_nodes() const
+	{
+		return start.back();
+	}
+
+	// Get number of arcs
+	int get_num_arcs() const
+	{
+		size_t num_arcs = 0;
+		for (size_t p = 0; p < start.back(); ++p)
+		{
+			num_arcs += (zero_arc[p] >= 0) + (one_arc[p] >= 0);
+		}
+		return num_arcs;
+	}
+
+	// Get average in-degree, every arc entering one node
+	double get_average_in_degree() const
+	{
+		return (double)get_num_arcs() / get_num_nodes();
+	}
+
+	// Keep the nodes order[l] of every layer l, in that order. Arcs must
+	// already hold the indices of their heads in the new order
+	void compact(const vector<vector<int>> &order)
+	{
+		vector<size_t> new_start(1, 0);
+		vector<int> new_zero_arc, new_one_arc, new_state;
+		for (int l = 0; l < num_layers; ++l)
+		{
+			for (size_t k = 0; k < order[l].size(); ++k)
+			{
+				size_t p = pos(l, order[l][k]);
+				new_zero_arc.push_back(zero_arc[p]);
+				new_one_arc.push_back(one_arc[p]);
+				new_state.push_back(state[p]);
+			}
+			new_start.push_back(new_zero_arc.size());
+		}
+		start.swap(new_start);
+		zero_arc.swap(new_zero_arc);
+		one_arc.swap(new_one_arc);
+		state.swap(new_state);
+	}
+};
+
+#endif /* COMPACT_BDD_HPP_ */
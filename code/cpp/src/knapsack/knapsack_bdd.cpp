@@ -8,6 +8,69 @@ bool CompareStates(Node *node1, Node *node2)
 	return node1->intState < node2->intState;
 }
 
+//
+// Create the nodes of layer l+1 and the arcs from layer l, or the arcs to the
+// terminal node from the last layer. The nodes of layer l+1 are created in the
+// order of their first incoming arc
+//
+void KnapsackBDDConstructor::build_layer(BDD *bdd, int l, Node *terminal_node)
+{
+	vector<Node *> &layer = bdd->layers[l];
+
+	if (l == inst->n_vars - 1)
+	{
+		// if last layer, just add arcs to the terminal node
+		for (size_t i = 0; i < layer.size(); ++i)
+		{
+			// zero arc
+			layer[i]->add_out_arc(terminal_node, false, 0);
+			// one arc
+			if (layer[i]->intState + inst->coeffs[l] <= inst->rhs)
+			{
+				layer[i]->add_out_arc(terminal_node, true, inst->obj_coeffs[l]);
+			}
+		}
+		return;
+	}
+
+	// Every node has at most two children, and states are at most rhs
+	size_t max_nodes = min(2 * layer.size(), (size_t)inst->rhs + 1);
+	states.reset(max_nodes);
+	bdd->layers[l + 1].reserve(max_nodes);
+
+	for (size_t i = 0; i < layer.size(); ++i)
+	{
+		Node *node = layer[i];
+		int weight = node->intState;
+
+		// zero arc
+		int child = states.find(weight);
+		if (child < 0)
+		{
+			Node *new_node = bdd->add_node(l + 1);
+			new_node->intState = weight;
+			child = new_node->index;
+			states.insert(weight, child);
+		}
+		node->add_out_arc(bdd->layers[l + 1][child], false, 0);
+
+		// one arc
+		weight += inst->coeffs[l];
+		if (weight <= inst->rhs)
+		{
+			child = states.find(weight);
+			if (child < 0)
+			{
+				Node *new_node = bdd->add_node(l + 1);
+				new_node->intState = weight;
+				child = new_node->index;
+				states.insert(weight, child);
+			}
+			node->add_out_arc(bdd->layers[l + 1][child], true, inst->obj_coeffs[l]);
+		}
+	}
+}
+
 //
 // Create exact BDD
 //
@@ -19,14 +82,8 @@ BDD *KnapsackBDDConstructor::generate_exact()
 	// Knapsack BDD
 	BDD *bdd = new BDD(inst->n_vars + 1);
 
-	// State maps
-	int iter = 0;
-	int next = 1;
-
 	// create root node
 	Node *root_node = bdd->add_node(0);
-	states[iter].clear();
-	states[iter][0] = root_node;
 	root_node->intState = 0;
 
 	// create terminal node
@@ -34,64 +91,7 @@ BDD *KnapsackBDDConstructor::generate_exact()
 
 	for (int l = 0; l < inst->n_vars; ++l)
 	{
-		states[next].clear();
-		BOOST_FOREACH (StateNodeMap::value_type i, states[iter])
-		{
-			int weight = i.first;
-			Node *node = i.second;
-
-			if (l < inst->n_vars - 1)
-			{
-
-				// zero arc
-				StateNodeMap::iterator it = states[next].find(weight);
-				if (it == states[next].end())
-				{
-					Node *new_node = bdd->add_node(l + 1);
-					states[next][weight] = new_node;
-					new_node->intState = weight;
-					node->add_out_arc(new_node, false, 0);
-				}
-				else
-				{
-					node->add_out_arc(it->second, false, 0);
-				}
-
-				// one arc
-				weight += inst->coeffs[l];
-				if (weight <= inst->rhs)
-				{
-					StateNodeMap::iterator it = states[next].find(weight);
-					if (it == states[next].end())
-					{
-						Node *new_node = bdd->add_node(l + 1);
-						states[next][weight] = new_node;
-						new_node->intState = weight;
-						node->add_out_arc(new_node, true, inst->obj_coeffs[l]);
-					}
-					else
-					{
-						node->add_out_arc(it->second, true, inst->obj_coeffs[l]);
-					}
-				}
-			}
-			else
-			{
-				// if last layer, just add arcs to the terminal node
-
-				// zero arc
-				node->add_out_arc(terminal_node, false, 0);
-				// one arc
-				if (weight + inst->coeffs[l] <= inst->rhs)
-				{
-					node->add_out_arc(terminal_node, true, inst->obj_coeffs[l]);
-				}
-			}
-		}
-
-		// invert iter and next
-		next = !next;
-		iter = !iter;
+		build_layer(bdd, l, terminal_node);
 	}
 
 	// reduce BDD
@@ -114,14 +114,8 @@ BDD *KnapsackBDDConstructor::generate_restricted()
 	// Knapsack BDD
 	BDD *bdd = new BDD(inst->n_vars + 1);
 
-	// State maps
-	int iter = 0;
-	int next = 1;
-
 	// create root node
 	Node *root_node = bdd->add_node(0);
-	states[iter].clear();
-	states[iter][0] = root_node;
 	root_node->intState = 0;
 
 	// create terminal node
@@ -150,9 +144,6 @@ BDD *KnapsackBDDConstructor::generate_restricted()
 					v->one_arc = NULL;
 				}
 
-				// Erase current node pointer from the list of current states
-				states[iter].erase((*it)->intState);
-
 				// Free current node memory
 				delete (*it);
 			}
@@ -160,76 +151,153 @@ BDD *KnapsackBDDConstructor::generate_restricted()
 			bdd->layers[l].resize(maxwidth);
 		}
 
-		states[next].clear();
-		BOOST_FOREACH (StateNodeMap::value_type i, states[iter])
+		build_layer(bdd, l, terminal_node);
+	}
+
+	// reduce BDD
+	cout << "\twidth = " << bdd->get_width() << endl;
+	cout << "\tremoving dangling nodes..." << endl;
+	BDDAlg::remove_dangling_nodes(bdd);
+
+	cout << "Remove dangling nodes..." << endl;
+	bdd->repair_node_indices();
+	// cout << "\twidth = " << bdd->get_width() << endl;
+	return bdd;
+};
+
+//
+// Create the nodes of layer l+1 of a compact BDD and the arcs from layer l
+//
+void KnapsackBDDConstructor::build_layer(CompactBDD *bdd, int l)
+{
+	int size = bdd->get_layer_size(l);
+	bdd->add_layer();
+
+	if (l == inst->n_vars - 1)
+	{
+		// if last layer, just add arcs to the terminal node
+		int terminal_node = bdd->add_node(-1);
+		for (int i = 0; i < size; ++i)
+		{
+			size_t p = bdd->pos(l, i);
+			bdd->zero_arc[p] = terminal_node;
+			if (bdd->state[p] + inst->coeffs[l] <= inst->rhs)
+			{
+				bdd->one_arc[p] = terminal_node;
+			}
+		}
+		return;
+	}
+
+	size_t max_nodes = min(2 * (size_t)size, (size_t)inst->rhs + 1);
+	states.reset(max_nodes);
+
+	for (int i = 0; i < size; ++i)
+	{
+		size_t p = bdd->pos(l, i);
+		int weight = bdd->state[p];
+
+		// zero arc
+		int child = states.find(weight);
+		if (child < 0)
 		{
-			int weight = i.first;
-			Node *node = i.second;
+			child = bdd->add_node(weight);
+			states.insert(weight, child);
+		}
+		bdd->zero_arc[p] = child;
 
-			if (l < inst->n_vars - 1)
+		// one arc
+		weight += inst->coeffs[l];
+		if (weight <= inst->rhs)
+		{
+			child = states.find(weight);
+			if (child < 0)
 			{
+				child = bdd->add_node(weight);
+				states.insert(weight, child);
+			}
+			bdd->one_arc[p] = child;
+		}
+	}
+}
 
-				// zero arc
-				StateNodeMap::iterator it = states[next].find(weight);
-				if (it == states[next].end())
-				{
-					Node *new_node = bdd->add_node(l + 1);
-					states[next][weight] = new_node;
-					new_node->intState = weight;
-					node->add_out_arc(new_node, false, 0);
-				}
-				else
-				{
-					node->add_out_arc(it->second, false, 0);
-				}
+//
+// Create exact BDD as a compact BDD
+//
+CompactBDD *KnapsackBDDConstructor::generate_exact_compact()
+{
+	CompactBDD *bdd = new CompactBDD(inst->n_vars + 1);
 
-				// one arc
-				weight += inst->coeffs[l];
-				if (weight <= inst->rhs)
-				{
-					StateNodeMap::iterator it = states[next].find(weight);
-					if (it == states[next].end())
-					{
-						Node *new_node = bdd->add_node(l + 1);
-						states[next][weight] = new_node;
-						new_node->intState = weight;
-						node->add_out_arc(new_node, true, inst->obj_coeffs[l]);
-					}
-					else
-					{
-						node->add_out_arc(it->second, true, inst->obj_coeffs[l]);
-					}
-				}
+	// create root node
+	bdd->add_layer();
+	bdd->add_node(0);
+
+	for (int l = 0; l < inst->n_vars; ++l)
+	{
+		build_layer(bdd, l);
+	}
+
+	BDDAlg::remove_dangling_nodes(bdd);
+	return bdd;
+}
+
+//
+// Create restricted BDD as a compact BDD
+//
+CompactBDD *KnapsackBDDConstructor::generate_restricted_compact()
+{
+	CompactBDD *bdd = new CompactBDD(inst->n_vars + 1);
+
+	// create root node
+	bdd->add_layer();
+	bdd->add_node(0);
+
+	for (int l = 0; l < inst->n_vars; ++l)
+	{
+		int size = bdd->get_layer_size(l);
+		if (size > maxwidth)
+		{
+			// Keep the nodes of smallest states, sorted by state
+			vector<int> order(size);
+			for (int i = 0; i < size; ++i)
+			{
+				order[i] = i;
 			}
-			else
+			sort(order.begin(), order.end(), [&](int a, int b)
+				 { return bdd->state[bdd->pos(l, a)] < bdd->state[bdd->pos(l, b)]; });
+
+			vector<int> index(size, -1);
+			vector<int> kept_states(maxwidth);
+			for (int k = 0; k < maxwidth; ++k)
 			{
-				// if last layer, just add arcs to the terminal node
+				index[order[k]] = k;
+				kept_states[k] = bdd->state[bdd->pos(l, order[k])];
+			}
 
-				// zero arc
-				node->add_out_arc(terminal_node, false, 0);
-				// one arc
-				if (weight + inst->coeffs[l] <= inst->rhs)
-				{
-					node->add_out_arc(terminal_node, true, inst->obj_coeffs[l]);
-				}
+			// Disconnect parents from the removed nodes
+			for (int i = 0; l > 0 && i < bdd->get_layer_size(l - 1); ++i)
+			{
+				size_t p = bdd->pos(l - 1, i);
+				if (bdd->zero_arc[p] >= 0)
+					bdd->zero_arc[p] = index[bdd->zero_arc[p]];
+				if (bdd->one_arc[p] >= 0)
+					bdd->one_arc[p] = index[bdd->one_arc[p]];
 			}
+
+			// Layer l is the last one built, so it is truncated in place
+			copy(kept_states.begin(), kept_states.end(), bdd->state.begin() + bdd->pos(l, 0));
+			bdd->start.back() = bdd->pos(l, maxwidth);
+			bdd->zero_arc.resize(bdd->start.back());
+			bdd->one_arc.resize(bdd->start.back());
+			bdd->state.resize(bdd->start.back());
 		}
 
-		// invert iter and next
-		next = !next;
-		iter = !iter;
+		build_layer(bdd, l);
 	}
 
-	// reduce BDD
-	cout << "\twidth = " << bdd->get_width() << endl;
-	cout << "\tremoving dangling nodes..." << endl;
 	BDDAlg::remove_dangling_nodes(bdd);
-
-	cout << "Remove dangling nodes..." << endl;
-	bdd->repair_node_indices();
-	// cout << "\twidth = " << bdd->get_width() << endl;
 	return bdd;
-};
+}
 
 KnapsackBDDConstructor::~KnapsackBDDConstructor()
 {
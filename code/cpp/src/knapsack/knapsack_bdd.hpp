@@ -8,6 +8,7 @@
 #include <boost/unordered_map.hpp>
 #include <boost/foreach.hpp>
 #include <cassert>
+#include <cstdint>
 #include <cstdlib>
 #include <vector>
 #include <iostream>
@@ -15,12 +16,117 @@
 #include <queue>
 
 #include "../bdd.hpp"
+#include "../compact_bdd.hpp"
 #include "../pareto_util.hpp"
 
 #include "knapsack_instance.hpp"
 
 using namespace std;
 
+//
+// States above this are indexed by a hash table instead of an array
+//
+#define KNAPSACK_DENSE_MAX_STATE (1 << 22)
+
+//
+// Log2 of the initial number of slots of the hash table
+//
+#define KNAPSACK_HASH_MIN_BITS 10
+
+//
+// Index in its layer of the node of a state, the accumulated weight. States
+// 0..max_state are indexed by an array, or by a flat open addressing hash
+// table if max_state is too large. Only the entries in use are cleared
+// between layers, so the index is reused for every layer
+//
+class KnapsackStateIndex
+{
+public:
+	KnapsackStateIndex(int max_state)
+		: dense(max_state <= KNAPSACK_DENSE_MAX_STATE), shift(64 - KNAPSACK_HASH_MIN_BITS)
+	{
+		if (dense)
+		{
+			nodes.assign(max_state + 1, -1);
+		}
+		else
+		{
+			// Valid before the first reset, which grows it for large layers
+			nodes.assign((size_t)1 << KNAPSACK_HASH_MIN_BITS, -1);
+			states.assign(nodes.size(), 0);
+		}
+	}
+
+	// Clear the index, for a layer of at most 'max_nodes' nodes
+	void reset(size_t max_nodes)
+	{
+		for (size_t i = 0; i < used.size(); ++i)
+		{
+			nodes[used[i]] = -1;
+		}
+		used.clear();
+
+		// Keep the load factor of the hash table at most 1/2
+		if (!dense && 2 * max_nodes > nodes.size())
+		{
+			size_t capacity = (size_t)1 << KNAPSACK_HASH_MIN_BITS;
+			for (shift = 64 - KNAPSACK_HASH_MIN_BITS; capacity < 2 * max_nodes; --shift)
+			{
+				capacity *= 2;
+			}
+			nodes.assign(capacity, -1);
+			states.assign(capacity, 0);
+		}
+	}
+
+	// Node of a state, -1 if none
+	int find(int state) const
+	{
+		if (dense)
+		{
+			return nodes[state];
+		}
+		for (size_t slot = hash(state);; slot = (slot + 1) & (nodes.size() - 1))
+		{
+			if (nodes[slot] < 0 || states[slot] == state)
+			{
+				return nodes[slot];
+			}
+		}
+	}
+
+	// Add the node of a state not in the index
+	void insert(int state, int node)
+	{
+		size_t slot = state;
+		if (!dense)
+		{
+			for (slot = hash(state); nodes[slot] >= 0; slot = (slot + 1) & (nodes.size() - 1))
+				;
+			states[slot] = state;
+		}
+		nodes[slot] = node;
+		used.push_back(slot);
+	}
+
+private:
+	// Indexed by an array
+	const bool dense;
+	// Node of each state (dense) or slot (hash table)
+	vector<int> nodes;
+	// State of each slot of the hash table
+	vector<int> states;
+	// Entries in use
+	vector<size_t> used;
+	// Fibonacci hashing: the top bits of the product give the slot
+	int shift;
+
+	size_t hash(int state) const
+	{
+		return (size_t)(((uint64_t)(unsigned)state * 11400714819323198485ull) >> shift);
+	}
+};
+
 //
 // Restricted BDD Knapsack constructor
 //
@@ -29,11 +135,10 @@ class KnapsackBDDConstructor
 public:
 	// State definition
 	typedef int State;
-	typedef boost::unordered_map<State, Node *> StateNodeMap;
 
 	// Constructor
 	KnapsackBDDConstructor(KnapsackInstance *_inst, int _maxwidth)
-		: inst(_inst), maxwidth(_maxwidth), MAXW(10000)
+		: inst(_inst), maxwidth(_maxwidth), MAXW(10000), states(_inst->rhs)
 	{
 	}
 
@@ -43,6 +148,12 @@ public:
 	// Generate restricted BDD
 	BDD *generate_restricted();
 
+	// Generate exact BDD as a compact BDD, with the same nodes in the same order
+	CompactBDD *generate_exact_compact();
+
+	// Generate restricted BDD as a compact BDD, with the same nodes in the same order
+	CompactBDD *generate_restricted_compact();
+
 	// Destructor
 	~KnapsackBDDConstructor();
 
@@ -54,8 +165,15 @@ private:
 	// Maximum width for memory
 	const int MAXW;
 
-	// State maps
-	StateNodeMap states[2];
+	// Nodes of the next layer by state
+	KnapsackStateIndex states;
+
+	// Create the nodes of layer l+1 and the arcs from layer l, or the arcs to the
+	// terminal node from the last layer
+	void build_layer(BDD *bdd, int l, Node *terminal_node);
+
+	// Same for a compact BDD, whose last layer built is l
+	void build_layer(CompactBDD *bdd, int l);
 };
 
 #endif /* KNAPSACK_BDD_HPP_ */
@@ -3,13 +3,16 @@
 // --------------------------------------------------
 
 #include <ctime>
+#include <iomanip>
 #include <iostream>
 #include <filesystem>
 #include <fstream>
 #include <list>
+#include <new>
 #include <random>
 #include <sstream> // for std::stringstream
 #include <vector>
+#include <sys/resource.h>
 
 #include "bdd.hpp"
 #include "bdd_util.hpp"
@@ -28,64 +31,296 @@
 
 using namespace std;
 
+// Version of the --output=json record. Increase it whenever a field changes
+// or its values are no longer comparable. 2: knapsack nodes are created in a
+// different order, which changes num_comparisons
+#define RESULT_RECORD_VERSION 2
+// Version of the --output=json record of --stats-only
+#define STATS_RECORD_VERSION 1
+
 //
-// Main function
+// Options of a run. Positional arguments keep their historical meaning,
+// optional flags are given as --name or --name=value
 //
-int main(int argc, char *argv[])
+struct RunOptions
 {
+	// Input filename
+	char *input_file;
+	// 1: knapsack, 2: set packing, 3: set covering
+	int problem_type;
+	// Minimize bandwidth (only setpack/setcover)
+	bool preprocess;
+	// 0: Exact, 1: Restricted, 2: Relaxed
+	int bdd_type;
+	// Width of restricted BDD
+	int maxwidth;
+	// Read orders from stdin and stream one result line per order
+	bool batch;
+	// Print the result as a JSON record instead of the Solved: line
+	bool json;
+	// Only compile and reduce the BDD, without generating the pareto set
+	bool stats_only;
+	// Data structure used to merge pareto sets
+	ParetoMethod pareto_method;
+	// Solutions tracked while generating the pareto set
+	SolutionMode solution_mode;
+	// Threads merging the nodes of a layer while generating the pareto set
+	int num_threads;
+	// Store the BDD as arrays (knapsack only)
+	bool compact;
+
+	RunOptions() : input_file(NULL), problem_type(0), preprocess(false), bdd_type(0), maxwidth(0), batch(false),
+				   json(false), stats_only(false), pareto_method(PARETO_LIST), solution_mode(SOLUTIONS_FULL),
+				   num_threads(1), compact(false) {}
+};
 
-	if (argc <= 4)
-	{
-		// Usage instructions
-		cout << '\n';
-		cout << "Usage: multiobj [input file] [problem type] [preprocess] [bdd_type] [max_width] [num_items] [item_1] ... [item_<num_items>]\n";
+//
+// Statistics collected while evaluating an order
+//
+struct OrderResult
+{
+	size_t num_pareto_sol;
+	size_t initial_width, initial_node_count, initial_arcs_count;
+	size_t reduced_width, reduced_node_count, reduced_arcs_count;
+	double initial_avg_in_degree, reduced_avg_in_degree;
+	size_t num_comparisons;
+	double compilation_time, reduction_time, pareto_time;
+	vector<size_t> initial_layer_nodes, reduced_layer_nodes, layer_pareto;
+	// Peak resident set size of the process so far
+	long peak_rss_kb;
+};
 
-		cout << "\n\twhere:\n";
-		cout << "\t\tproblem_type = 1: knapsack\n";
-		cout << "\t\tproblem_type = 2: set packing\n";
-		cout << "\t\tproblem_type = 3: set covering\n";
+//
+// Problem instance, read once and reordered for every evaluated order
+//
+struct ProblemInstance
+{
+	int n_vars;
+	MultiObjKnapsackInstanceOrdered *knapsack;
+	SetPackingInstance *setpack;
+	SetCoveringInstance *setcover;
 
-		cout << "\n";
-		cout << "\t\tpreprocess = 0: no preprocessing\n";
-		cout << "\t\tpreprocess = 1: minimize bandwidth (only setpack/setcover)\n";
+	ProblemInstance() : n_vars(0), knapsack(NULL), setpack(NULL), setcover(NULL) {}
 
-		cout << "\n";
-		cout << "\t\tbdd_type = 0: Generate exact BDD\n";
-		cout << "\t\tbdd_type = 1: Generate restricted BDD\n";
+	~ProblemInstance()
+	{
+		delete knapsack;
+		delete setpack;
+		delete setcover;
+	}
+};
 
-		cout << "\n";
-		cout << "\t\tmax_width : Width of restricted BDD.\n";
+//
+// Print usage instructions
+//
+void print_usage()
+{
+	cout << '\n';
+	cout << "Usage: multiobj [input file] [problem type] [preprocess] [bdd_type] [max_width] [num_items] [item_1] ... [item_<num_items>] [options]\n";
+
+	cout << "\n\twhere:\n";
+	cout << "\t\tproblem_type = 1: knapsack\n";
+	cout << "\t\tproblem_type = 2: set packing\n";
+	cout << "\t\tproblem_type = 3: set covering\n";
+
+	cout << "\n";
+	cout << "\t\tpreprocess = 0: no preprocessing\n";
+	cout << "\t\tpreprocess = 1: minimize bandwidth (only setpack/setcover)\n";
+
+	cout << "\n";
+	cout << "\t\tbdd_type = 0: Generate exact BDD\n";
+	cout << "\t\tbdd_type = 1: Generate restricted BDD\n";
+
+	cout << "\n";
+	cout << "\t\tmax_width : Width of restricted BDD.\n";
+
+	cout << "\n\toptions:\n";
+	cout << "\t\t--batch : Load the instance once and read orders from stdin, one per line\n";
+	cout << "\t\t          as [num_items] [item_1] ... [item_<num_items>]. One result line is\n";
+	cout << "\t\t          printed per order, or an Error: line if the order is invalid.\n";
+	cout << "\t\t          num_items = 0 keeps the instance order.\n";
+	cout << "\t\t--output=text|json : Print the result as the Solved: line (default) or as a\n";
+	cout << "\t\t          versioned JSON record on a single line\n";
+	cout << "\t\t--stats-only : Compile and reduce the BDD and print its size statistics as a\n";
+	cout << "\t\t          Stats: line (or a JSON record of kind stats), without generating the\n";
+	cout << "\t\t          pareto set\n";
+	cout << "\t\t--pareto=list|sorted|sweep|bbox : Data structure used to merge pareto sets: a\n";
+	cout << "\t\t          list (default), a lexicographically sorted array, a dimension sweep\n";
+	cout << "\t\t          (2-3 objectives) or a tree of bounding boxes. All give the same result\n";
+	cout << "\t\t--solutions=full|objectives|trace : Propagate the primal values of every solution\n";
+	cout << "\t\t          (default), only the objective vectors, or the objective vectors and\n";
+	cout << "\t\t          back-pointers to rebuild the solutions of the frontier. Same result\n";
+	cout << "\t\t--threads=N : Merge the nodes of a layer with N threads (default 1) while\n";
+	cout << "\t\t          generating the pareto set. Same result\n";
+	cout << "\t\t--memlimit=GB : Limit the address space of the process to GB gigabytes before\n";
+	cout << "\t\t          reading the instance. Running out of memory prints Error: out of memory\n";
+	cout << "\t\t--compact : Store the BDD as arrays of arcs and states instead of node objects\n";
+	cout << "\t\t          (knapsack only). Same BDD and frontier with less memory, and a\n";
+	cout << "\t\t          different number of comparisons. JSON records hold \"compact\": true\n";
+
+	cout << "\n";
+}
 
-		cout << "\n";
+//
+// Read problem instance
+//
+void read_instance(RunOptions &opts, ProblemInstance &problem)
+{
+	// ---- Knapsack ----
+	if (opts.problem_type == 1)
+	{
+		problem.knapsack = new MultiObjKnapsackInstanceOrdered(opts.input_file);
+		problem.n_vars = problem.knapsack->n_vars;
 	}
 
-	// -------------------------------------------------
-	// Read commnad line input(for stats)
+	// ---- Set packing ----
+	else if (opts.problem_type == 2)
+	{
+		problem.setpack = new SetPackingInstance(opts.input_file);
+		problem.n_vars = problem.setpack->n_vars;
+	}
 
-	// catch input filename
-	char *input_file = argv[1];
+	// ---- Set covering ----
+	else if (opts.problem_type == 3)
+	{
+		problem.setcover = new SetCoveringInstance(opts.input_file);
+		problem.n_vars = problem.setcover->n_vars;
+	}
 
-	// catch problem type
-	int problem_type = atoi(argv[2]);
+	// ---- Invalid problem selection ----
+	else
+	{
+		cout << "\nError: problem type not known.\n";
+		exit(1);
+	}
+}
 
-	// catch preprocess
-	bool preprocess = (atoi(argv[3]) == 1);
+//
+// Print an array as a JSON list
+//
+void print_json_array(const char *name, vector<size_t> &values)
+{
+	cout << ", \"" << name << "\": [";
+	for (size_t i = 0; i < values.size(); i++)
+	{
+		cout << (i > 0 ? ", " : "") << values[i];
+	}
+	cout << "]";
+}
 
-	// 0: Exact, 1: Restricted, 2: Relaxed
-	int bdd_type = atoi(argv[4]);
+//
+// Print the result of an order as a JSON record on a single line. Records of
+// the compact BDD are marked, as their num_comparisons differ
+//
+void print_result_json(OrderResult &result, bool compact)
+{
+	streamsize precision = cout.precision(10);
 
-	int maxwidth = atoi(argv[5]);
+	cout << "{\"version\": " << RESULT_RECORD_VERSION;
+	if (compact)
+	{
+		cout << ", \"compact\": true";
+	}
+	cout << ", \"num_pareto_sol\": " << result.num_pareto_sol;
+	cout << ", \"initial_width\": " << result.initial_width;
+	cout << ", \"reduced_width\": " << result.reduced_width;
+	cout << ", \"initial_node_count\": " << result.initial_node_count;
+	cout << ", \"reduced_node_count\": " << result.reduced_node_count;
+	cout << ", \"initial_arcs_count\": " << result.initial_arcs_count;
+	cout << ", \"reduced_arcs_count\": " << result.reduced_arcs_count;
+	cout << ", \"initial_avg_in_degree\": " << result.initial_avg_in_degree;
+	cout << ", \"reduced_avg_in_degree\": " << result.reduced_avg_in_degree;
+	cout << ", \"num_comparisons\": " << result.num_comparisons;
+	cout << ", \"compilation_time\": " << result.compilation_time;
+	cout << ", \"reduction_time\": " << result.reduction_time;
+	cout << ", \"pareto_time\": " << result.pareto_time;
+	print_json_array("initial_layer_nodes", result.initial_layer_nodes);
+	print_json_array("reduced_layer_nodes", result.reduced_layer_nodes);
+	print_json_array("layer_pareto", result.layer_pareto);
+	cout << ", \"peak_rss_kb\": " << result.peak_rss_kb;
+	cout << "}" << endl;
+
+	cout.precision(precision);
+}
 
-	// Catch number of variables
-	int num_items = atoi(argv[6]);
-	bool new_order_provided = (num_items > 0);
+//
+// Print the size statistics of an order as a JSON record on a single line
+//
+void print_stats_json(OrderResult &result, bool compact)
+{
+	streamsize precision = cout.precision(10);
 
-	// Catch order
-	vector<int> new_order;
-	for (int i = 0; i < num_items; i++)
+	cout << "{\"version\": " << STATS_RECORD_VERSION;
+	cout << ", \"kind\": \"stats\"";
+	if (compact)
 	{
-		new_order.push_back(atoi(argv[7 + i]));
+		cout << ", \"compact\": true";
 	}
+	cout << ", \"initial_width\": " << result.initial_width;
+	cout << ", \"reduced_width\": " << result.reduced_width;
+	cout << ", \"initial_node_count\": " << result.initial_node_count;
+	cout << ", \"reduced_node_count\": " << result.reduced_node_count;
+	cout << ", \"initial_arcs_count\": " << result.initial_arcs_count;
+	cout << ", \"reduced_arcs_count\": " << result.reduced_arcs_count;
+	cout << ", \"initial_avg_in_degree\": " << result.initial_avg_in_degree;
+	cout << ", \"reduced_avg_in_degree\": " << result.reduced_avg_in_degree;
+	cout << ", \"compilation_time\": " << result.compilation_time;
+	cout << ", \"reduction_time\": " << result.reduction_time;
+	print_json_array("initial_layer_nodes", result.initial_layer_nodes);
+	print_json_array("reduced_layer_nodes", result.reduced_layer_nodes);
+	cout << ", \"peak_rss_kb\": " << result.peak_rss_kb;
+	cout << "}" << endl;
+
+	cout.precision(precision);
+}
+
+//
+// Print the size statistics of an order as the Stats: line
+//
+void print_stats_text(OrderResult &result)
+{
+	cout << "Stats:";
+	cout << result.initial_width << ", ";
+	cout << result.reduced_width << ", ";
+	cout << result.initial_node_count << ", ";
+	cout << result.reduced_node_count << ", ";
+	cout << result.initial_arcs_count << ", ";
+	cout << result.reduced_arcs_count << ", ";
+	cout << result.initial_avg_in_degree << ", ";
+	cout << result.reduced_avg_in_degree << ", ";
+	cout << result.compilation_time << ", ";
+	cout << result.reduction_time << " #";
+	for (size_t l = 0; l < result.reduced_layer_nodes.size(); l++)
+	{
+		cout << " " << result.reduced_layer_nodes[l];
+	}
+	cout << endl;
+}
+
+//
+// Size statistics of a BDD or compact BDD
+//
+template <typename BDDType>
+void get_bdd_size(BDDType *bdd, size_t &width, size_t &node_count, size_t &arcs_count, double &avg_in_degree,
+				  vector<size_t> &layer_nodes)
+{
+	width = bdd->get_width();
+	node_count = bdd->get_num_nodes();
+	arcs_count = bdd->get_num_arcs();
+	avg_in_degree = bdd->get_average_in_degree();
+	for (int l = 0; l < bdd->num_layers; l++)
+	{
+		layer_nodes.push_back(bdd->get_layer_size(l));
+	}
+}
+
+//
+// Construct the BDD for an order, reduce it, generate its pareto set and
+// print the result line
+//
+void evaluate_order(RunOptions &opts, ProblemInstance &problem, vector<int> &new_order)
+{
+	bool new_order_provided = (new_order.size() > 0);
 
 	// -------------------------------------------------
 	// Initialize timers (for stats)
@@ -94,19 +329,16 @@ int main(int argc, char *argv[])
 	int bdd_reduction_time = timers.register_name("BDD reduction time");
 	int bdd_pareto_time = timers.register_name("Pareto time");
 
-	size_t initial_width, initial_node_count, initial_arcs_count;
-	size_t reduced_width, reduced_node_count, reduced_arcs_count;
-	double initial_avg_in_degree, reduced_avg_in_degree;
+	OrderResult result;
 
-	// BDD and objective function coefficients
+	// BDD (or compact BDD) and objective function coefficients
 	BDD *bdd = NULL;
+	CompactBDD *compact_bdd = NULL;
 	vector<vector<int>> obj_coefficients;
 
 	// Result object
 	MultiobjResult *mo_result = NULL;
 
-	ofstream output;
-
 	// -------------------------------------------------
 	// Read problem and construct BDDs
 
@@ -114,47 +346,63 @@ int main(int argc, char *argv[])
 	timers.start_timer(bdd_compilation_time);
 
 	// ---- Knapsack ----
-	if (problem_type == 1)
+	if (opts.problem_type == 1)
 	{
-		MultiObjKnapsackInstanceOrdered *inst = new MultiObjKnapsackInstanceOrdered(input_file);
+		MultiObjKnapsackInstanceOrdered *inst = problem.knapsack;
 		if (new_order_provided)
 		{
-			cout << "\tReordering instance based on input order...";
+			if (!opts.batch && !opts.json)
+			{
+				cout << "\tReordering instance based on input order...";
+			}
 			inst->reset_order(new_order);
 		}
+		else
+		{
+			inst->reset_order();
+		}
 
-		// Construct BDD
+		// Construct BDD. The constructor takes ownership of the single objective instance
 		KnapsackInstance *inst_so = new KnapsackInstance(inst->n_vars, inst->obj_coeffs[0], inst->coeffs, inst->rhs);
 
 		// Get BDD and objective function coefficients
-		if (bdd_type == 0)
+		if (opts.bdd_type == 0)
 		{
 			KnapsackBDDConstructor bddConstructor(inst_so, 0);
-			bdd = bddConstructor.generate_exact();
+			if (opts.compact)
+				compact_bdd = bddConstructor.generate_exact_compact();
+			else
+				bdd = bddConstructor.generate_exact();
 		}
 		else
 		{
-			KnapsackBDDConstructor bddConstructor(inst_so, maxwidth);
-			bdd = bddConstructor.generate_restricted();
+			KnapsackBDDConstructor bddConstructor(inst_so, opts.maxwidth);
+			if (opts.compact)
+				compact_bdd = bddConstructor.generate_restricted_compact();
+			else
+				bdd = bddConstructor.generate_restricted();
 		}
 		obj_coefficients = inst->obj_coeffs;
 	}
 
 	// ---- Set packing ----
-	else if (problem_type == 2)
+	else if (opts.problem_type == 2)
 	{
-		// read instance
-		SetPackingInstance setpack(argv[1]);
+		// copy instance, reordering and preprocessing modify it
+		SetPackingInstance setpack = *problem.setpack;
 
 		// Reset instances based on new order
 		if (new_order_provided)
 		{
-			cout << "\tReordering instance based on input order...";
+			if (!opts.batch && !opts.json)
+			{
+				cout << "\tReordering instance based on input order...";
+			}
 			setpack.reset_order(new_order);
 		}
 
 		// preprocess only if a new order is not provided
-		if (!new_order_provided && preprocess)
+		if (!new_order_provided && opts.preprocess)
 		{
 			setpack.minimize_bandwidth();
 		}
@@ -184,11 +432,14 @@ int main(int argc, char *argv[])
 	}
 
 	// ---- Set covering ----
-	else if (problem_type == 3)
+	else if (opts.problem_type == 3)
 	{
-		cout << "Set cover\n";
-		// read instance
-		SetCoveringInstance setcover(argv[1]);
+		if (!opts.batch && !opts.json)
+		{
+			cout << "Set cover\n";
+		}
+		// copy instance, reordering and preprocessing modify it
+		SetCoveringInstance setcover = *problem.setcover;
 
 		// Reset instances based on new order
 		if (new_order_provided)
@@ -197,7 +448,7 @@ int main(int argc, char *argv[])
 		}
 
 		// preprocess
-		if (!new_order_provided && preprocess)
+		if (!new_order_provided && opts.preprocess)
 		{
 			setcover.minimize_bandwidth();
 		}
@@ -219,19 +470,18 @@ int main(int argc, char *argv[])
 			// cout << "\n";
 		}
 	}
+	timers.end_timer(bdd_compilation_time);
 
-	// ---- Invalid problem selection ----
+	if (compact_bdd != NULL)
+	{
+		get_bdd_size(compact_bdd, result.initial_width, result.initial_node_count, result.initial_arcs_count,
+					 result.initial_avg_in_degree, result.initial_layer_nodes);
+	}
 	else
 	{
-		cout << "\nError: problem type not known.\n";
-		exit(1);
+		get_bdd_size(bdd, result.initial_width, result.initial_node_count, result.initial_arcs_count,
+					 result.initial_avg_in_degree, result.initial_layer_nodes);
 	}
-	timers.end_timer(bdd_compilation_time);
-
-	initial_width = bdd->get_width();
-	initial_node_count = bdd->get_num_nodes();
-	initial_arcs_count = bdd->get_num_arcs();
-	initial_avg_in_degree = bdd->get_average_in_degree();
 
 	// -------------------------------------------------
 	// Reduce BDD
@@ -241,46 +491,313 @@ int main(int argc, char *argv[])
 	timers.reset_timer(bdd_reduction_time);
 	timers.start_timer(bdd_reduction_time);
 
-	BDDAlg::reduce(bdd);
+	if (compact_bdd != NULL)
+	{
+		BDDAlg::reduce(compact_bdd);
+	}
+	else
+	{
+		BDDAlg::reduce(bdd);
+	}
 
 	timers.end_timer(bdd_reduction_time);
 
-	reduced_width = bdd->get_width();
-	reduced_node_count = bdd->get_num_nodes();
-	reduced_arcs_count = bdd->get_num_arcs();
-	reduced_avg_in_degree = bdd->get_average_in_degree();
+	if (compact_bdd != NULL)
+	{
+		get_bdd_size(compact_bdd, result.reduced_width, result.reduced_node_count, result.reduced_arcs_count,
+					 result.reduced_avg_in_degree, result.reduced_layer_nodes);
+	}
+	else
+	{
+		get_bdd_size(bdd, result.reduced_width, result.reduced_node_count, result.reduced_arcs_count,
+					 result.reduced_avg_in_degree, result.reduced_layer_nodes);
+	}
 
 	// bdd->print();
 
+	if (opts.stats_only)
+	{
+		result.compilation_time = timers.get_time(bdd_compilation_time);
+		result.reduction_time = timers.get_time(bdd_reduction_time);
+
+		struct rusage usage;
+		getrusage(RUSAGE_SELF, &usage);
+		result.peak_rss_kb = usage.ru_maxrss;
+
+		if (opts.json)
+		{
+			print_stats_json(result, opts.compact);
+		}
+		else
+		{
+			print_stats_text(result);
+		}
+
+		delete bdd;
+		delete compact_bdd;
+		return;
+	}
+
 	// -------------------------------------------------
 	// Generate pareto set
 	timers.reset_timer(bdd_pareto_time);
 	timers.start_timer(bdd_pareto_time);
-	mo_result = BDDAlg::pareto_set(bdd, obj_coefficients);
+	if (compact_bdd != NULL)
+	{
+		mo_result = BDDAlg::pareto_set(compact_bdd, obj_coefficients, opts.pareto_method, opts.solution_mode,
+									   opts.num_threads);
+	}
+	else
+	{
+		mo_result = BDDAlg::pareto_set(bdd, obj_coefficients, opts.pareto_method, opts.solution_mode,
+									   opts.num_threads);
+	}
 	timers.end_timer(bdd_pareto_time);
 
+	result.num_pareto_sol = mo_result->frontier_size();
+	result.num_comparisons = mo_result->num_comparisons;
+	result.compilation_time = timers.get_time(bdd_compilation_time);
+	result.reduction_time = timers.get_time(bdd_reduction_time);
+	result.pareto_time = timers.get_time(bdd_pareto_time);
+	for (int l = 0; l < mo_result->num_layers; l++)
+	{
+		result.layer_pareto.push_back(mo_result->num_pareto_sol[l]);
+	}
+
+	struct rusage usage;
+	getrusage(RUSAGE_SELF, &usage);
+	result.peak_rss_kb = usage.ru_maxrss;
+
 	// -------------------------------------------------
 	// Output
-	cout << "Solved:";
-	cout << mo_result->pareto_set->sols.size() << ", ";
-	cout << initial_width << ", ";
-	cout << reduced_width << ", ";
-	cout << initial_node_count << ", ";
-	cout << reduced_node_count << ", ";
-	cout << initial_arcs_count << ", ";
-	cout << reduced_arcs_count << ", ";
-	cout << initial_avg_in_degree << ", ";
-	cout << reduced_avg_in_degree << ", ";
-	cout << mo_result->num_comparisons << ", ";
-
-	cout << timers.get_time(bdd_compilation_time) << ", ";
-	cout << timers.get_time(bdd_reduction_time) << ", ";
-	cout << timers.get_time(bdd_pareto_time);
-	mo_result->print_num_pareto_sol();
+	if (opts.json)
+	{
+		print_result_json(result, opts.compact);
+	}
+	else
+	{
+		cout << "Solved:";
+		cout << result.num_pareto_sol << ", ";
+		cout << result.initial_width << ", ";
+		cout << result.reduced_width << ", ";
+		cout << result.initial_node_count << ", ";
+		cout << result.reduced_node_count << ", ";
+		cout << result.initial_arcs_count << ", ";
+		cout << result.reduced_arcs_count << ", ";
+		cout << result.initial_avg_in_degree << ", ";
+		cout << result.reduced_avg_in_degree << ", ";
+		cout << result.num_comparisons << ", ";
+
+		cout << result.compilation_time << ", ";
+		cout << result.reduction_time << ", ";
+		cout << result.pareto_time;
+		mo_result->print_num_pareto_sol();
+	}
 
 	// Clean memory
 	delete bdd;
+	delete compact_bdd;
 	delete mo_result;
+}
+
+//
+// Read an order given as [num_items] [item_1] ... [item_<num_items>].
+// Returns false if the order is malformed or is not a permutation of the variables
+//
+bool parse_order(istream &in, int n_vars, vector<int> &new_order)
+{
+	int num_items;
+	new_order.clear();
+	if (!(in >> num_items) || (num_items != 0 && num_items != n_vars))
+	{
+		return false;
+	}
+
+	int item;
+	vector<bool> seen(n_vars, false);
+	for (int i = 0; i < num_items; i++)
+	{
+		if (!(in >> item) || item < 0 || item >= n_vars || seen[item])
+		{
+			return false;
+		}
+		seen[item] = true;
+		new_order.push_back(item);
+	}
+
+	return true;
+}
+
+//
+// Evaluate an order. Running out of memory is reported before exiting, so
+// that it is told apart from a crash
+//
+void evaluate_order_or_exit(RunOptions &opts, ProblemInstance &problem, vector<int> &new_order)
+{
+	try
+	{
+		evaluate_order(opts, problem, new_order);
+	}
+	catch (const bad_alloc &)
+	{
+		cout << "Error: out of memory" << endl;
+		exit(3);
+	}
+}
+
+//
+// Limit the address space of the process, so that running out of memory
+// raises bad_alloc. Returns false if the limit cannot be set
+//
+bool set_memory_limit(double mem_limit_gb)
+{
+	struct rlimit limit;
+	limit.rlim_cur = limit.rlim_max = (rlim_t)(mem_limit_gb * 1024 * 1024 * 1024);
+	return setrlimit(RLIMIT_AS, &limit) == 0;
+}
+
+//
+// Main function
+//
+int main(int argc, char *argv[])
+{
+	// -------------------------------------------------
+	// Read commnad line input(for stats)
+
+	RunOptions opts;
+	double mem_limit_gb = 0;
+	vector<char *> args;
+	for (int i = 1; i < argc; i++)
+	{
+		string arg(argv[i]);
+		if (arg.compare(0, 2, "--") != 0)
+		{
+			args.push_back(argv[i]);
+		}
+		else if (arg == "--batch")
+		{
+			opts.batch = true;
+		}
+		else if (arg == "--output=json" || arg == "--output=text")
+		{
+			opts.json = (arg == "--output=json");
+		}
+		else if (arg == "--stats-only")
+		{
+			opts.stats_only = true;
+		}
+		else if (arg.compare(0, 9, "--pareto=") == 0 && parse_pareto_method(arg.substr(9), opts.pareto_method))
+		{
+			continue;
+		}
+		else if (arg.compare(0, 12, "--solutions=") == 0 && parse_solution_mode(arg.substr(12), opts.solution_mode))
+		{
+			continue;
+		}
+		else if (arg.compare(0, 10, "--threads=") == 0 && atoi(arg.c_str() + 10) > 0)
+		{
+			opts.num_threads = atoi(arg.c_str() + 10);
+		}
+		else if (arg.compare(0, 11, "--memlimit=") == 0 && atof(arg.c_str() + 11) > 0)
+		{
+			mem_limit_gb = atof(arg.c_str() + 11);
+		}
+		else if (arg == "--compact")
+		{
+			opts.compact = true;
+		}
+		else
+		{
+			cout << "\nError: unknown option " << arg << "\n";
+			print_usage();
+			exit(1);
+		}
+	}
+
+	// Set before anything large is allocated, the limit does not apply to
+	// memory already mapped
+	if (mem_limit_gb > 0 && !set_memory_limit(mem_limit_gb))
+	{
+		cout << "\nError: cannot set the memory limit\n";
+		exit(1);
+	}
+
+	if (args.size() < 5)
+	{
+		print_usage();
+		exit(1);
+	}
+
+	// catch input filename
+	opts.input_file = args[0];
+
+	// catch problem type
+	opts.problem_type = atoi(args[1]);
+
+	// catch preprocess
+	opts.preprocess = (atoi(args[2]) == 1);
+
+	// 0: Exact, 1: Restricted, 2: Relaxed
+	opts.bdd_type = atoi(args[3]);
+
+	opts.maxwidth = atoi(args[4]);
+
+	if (opts.compact && opts.problem_type != 1)
+	{
+		cout << "\nError: --compact is only available for knapsack\n";
+		exit(1);
+	}
+
+	// -------------------------------------------------
+	// Read problem
+	ProblemInstance problem;
+	read_instance(opts, problem);
+
+	vector<int> new_order;
+	if (!opts.batch)
+	{
+		// Catch number of variables and order
+		ostringstream order_args;
+		for (size_t i = 5; i < args.size(); i++)
+		{
+			order_args << args[i] << " ";
+		}
+		istringstream in(args.size() > 5 ? order_args.str() : "0");
+		if (!parse_order(in, problem.n_vars, new_order))
+		{
+			cout << "Error: invalid order" << endl;
+			exit(1);
+		}
+
+		evaluate_order_or_exit(opts, problem, new_order);
+
+		return 0;
+	}
+
+	// -------------------------------------------------
+	// Batch mode: one order per line until end of input
+	string line;
+	while (getline(cin, line))
+	{
+		if (line.find_first_not_of(" \t\r") == string::npos)
+		{
+			continue;
+		}
+
+		istringstream in(line);
+		if (!parse_order(in, problem.n_vars, new_order))
+		{
+			cout << "Error: invalid order" << endl;
+			continue;
+		}
+
+		evaluate_order_or_exit(opts, problem, new_order);
+		cout.flush();
+
+		// The memory limit holds for every order, so the nodes of this order
+		// are not kept for the next one
+		node_pool.release();
+	}
 
 	return 0;
 }
@@ -0,0 +1,698 @@
+// ----------------------------------------------------------
+// Pareto Set merge strategies
+// ----------------------------------------------------------
+
+// ParetoSet::merge scans the list of solutions for every merged solution.
+// The strategies below compute the same merge (same solutions, in the same
+// list order, and the same number of comparisons the list scan performs)
+// from dominance queries answered by a search structure:
+//
+// - Let P be the solutions of the set before the merge, in list order, and
+//   C the shifted solutions being merged, in list order. Both are antichains.
+// - A solution c of C is discarded iff some p in P dominates it and differs
+//   from it. A solution of P erased by an earlier solution of C cannot
+//   dominate c, as that solution would dominate c too, so the decision does
+//   not depend on the erasures.
+// - A solution p of P is erased by the first kept c of C that dominates (or
+//   equals) it.
+// - The list scan of a discarded c stops at the first p (in list order)
+//   dominating it, hence costs 1 + the number of solutions of P still in the
+//   list before that p. The scan of a kept c costs the number of solutions of
+//   P still in the list.
+
+#ifndef PARETO_MERGE_HPP_
+#define PARETO_MERGE_HPP_
+
+#include <algorithm>
+#include <atomic>
+#include <climits>
+#include <numeric>
+#include <string>
+#include <thread>
+#include <vector>
+
+#include "pareto_util.hpp"
+
+using namespace std;
+
+// Merges comparing fewer pairs of solutions than this are faster with the list
+#ifndef PARETO_MERGE_MIN_PAIRS
+#define PARETO_MERGE_MIN_PAIRS 4096
+#endif
+
+//
+// Data structure used to merge pareto sets
+//
+enum ParetoMethod
+{
+	PARETO_LIST,   // Linear scan of the solution list
+	PARETO_SORTED, // Lexicographically sorted array with early termination
+	PARETO_SWEEP,  // Dimension sweep (2 or 3 objectives, otherwise sorted)
+	PARETO_BBOX	   // Tree of bounding boxes
+};
+
+//
+// Parse the name of a pareto method. Returns false if unknown
+//
+inline bool parse_pareto_method(const string &name, ParetoMethod &method)
+{
+	if (name == "list")
+		method = PARETO_LIST;
+	else if (name == "sorted")
+		method = PARETO_SORTED;
+	else if (name == "sweep")
+		method = PARETO_SWEEP;
+	else if (name == "bbox")
+		method = PARETO_BBOX;
+	else
+		return false;
+	return true;
+}
+
+//
+// Points are stored row-wise in flat arrays of k coordinates
+//
+inline bool point_dominates(const int *a, const int *b, int k)
+{
+	for (int d = 0; d < k; ++d)
+	{
+		if (a[d] < b[d])
+			return false;
+	}
+	return true;
+}
+
+inline bool point_equals(const int *a, const int *b, int k)
+{
+	for (int d = 0; d < k; ++d)
+	{
+		if (a[d] != b[d])
+			return false;
+	}
+	return true;
+}
+
+// Returns true if a comes before b in decreasing lexicographic order
+inline bool point_lex_greater(const int *a, const int *b, int k)
+{
+	for (int d = 0; d < k; ++d)
+	{
+		if (a[d] != b[d])
+			return a[d] > b[d];
+	}
+	return false;
+}
+
+//
+// Fenwick tree of the number of solutions still in the list
+//
+struct AliveCounter
+{
+	vector<int> tree;
+
+	AliveCounter(int n) : tree(n + 1, 0)
+	{
+		for (int i = 1; i <= n; ++i)
+		{
+			tree[i] += 1;
+			int j = i + (i & -i);
+			if (j <= n)
+				tree[j] += tree[i];
+		}
+	}
+
+	void remove(int i)
+	{
+		for (++i; i < (int)tree.size(); i += i & -i)
+			tree[i] -= 1;
+	}
+
+	// Number of alive solutions before position i
+	int count(int i)
+	{
+		int total = 0;
+		for (; i > 0; i -= i & -i)
+			total += tree[i];
+		return total;
+	}
+};
+
+//
+// Dominance queries. For every point b of B, find the minimum key over the
+// points a of A with a >= b, skipping a == b if exclude_equal. INT_MAX if
+// there is none
+//
+
+// Lexicographically sorted array: only the points lexicographically not
+// smaller than b can dominate it
+inline void min_dominating_sorted(const vector<int> &A, const vector<int> &keys, const vector<int> &B, int k,
+								  bool exclude_equal, vector<int> &out)
+{
+	int na = keys.size(), nb = B.size() / k;
+	vector<int> order(na);
+	iota(order.begin(), order.end(), 0);
+	sort(order.begin(), order.end(), [&](int i, int j)
+		 { return point_lex_greater(&A[i * k], &A[j * k], k); });
+	vector<int> sorted(A.size()), sorted_keys(na);
+	for (int i = 0; i < na; ++i)
+	{
+		copy(A.begin() + order[i] * k, A.begin() + (order[i] + 1) * k, sorted.begin() + i * k);
+		sorted_keys[i] = keys[order[i]];
+	}
+
+	out.assign(nb, INT_MAX);
+	for (int j = 0; j < nb; ++j)
+	{
+		const int *b = &B[j * k];
+		int best = INT_MAX;
+		for (int i = 0; i < na; ++i)
+		{
+			const int *a = &sorted[i * k];
+			// Early termination: the remaining points are lexicographically smaller
+			if (point_lex_greater(b, a, k))
+				break;
+			if (sorted_keys[i] >= best || !point_dominates(a, b, k))
+				continue;
+			if (exclude_equal && point_equals(a, b, k))
+				continue;
+			best = sorted_keys[i];
+		}
+		out[j] = best;
+	}
+}
+
+// Dimension sweep over the first objective. The points of A not smaller than
+// b in the first objective are inserted in a Fenwick tree over the second
+// objective (nested with one over the third objective for k = 3) keeping
+// the minimum key. Requires A to be an antichain if exclude_equal
+inline void min_dominating_sweep(const vector<int> &A, const vector<int> &keys, const vector<int> &B, int k,
+								 bool exclude_equal, vector<int> &out)
+{
+	assert(k == 2 || k == 3);
+	int na = keys.size(), nb = B.size() / k;
+	out.assign(nb, INT_MAX);
+	if (na == 0)
+		return;
+
+	// Ranks of the second objective, in decreasing order
+	vector<int> values1(na);
+	for (int i = 0; i < na; ++i)
+		values1[i] = A[i * k + 1];
+	sort(values1.begin(), values1.end(), greater<int>());
+	values1.erase(unique(values1.begin(), values1.end()), values1.end());
+	int n1 = values1.size();
+	vector<int> rank1(na);
+	for (int i = 0; i < na; ++i)
+		rank1[i] = lower_bound(values1.begin(), values1.end(), A[i * k + 1], greater<int>()) - values1.begin();
+
+	// For k = 3, each node of the outer tree holds the third objective of the
+	// points it covers, in decreasing order, and an inner tree over them
+	vector<vector<int>> values2, inner;
+	if (k == 3)
+	{
+		values2.resize(n1 + 1);
+		for (int i = 0; i < na; ++i)
+		{
+			for (int r = rank1[i] + 1; r <= n1; r += r & -r)
+				values2[r].push_back(A[i * k + 2]);
+		}
+		inner.resize(n1 + 1);
+		for (int r = 1; r <= n1; ++r)
+		{
+			sort(values2[r].begin(), values2[r].end(), greater<int>());
+			values2[r].erase(unique(values2[r].begin(), values2[r].end()), values2[r].end());
+			inner[r].assign(values2[r].size() + 1, INT_MAX);
+		}
+	}
+	vector<int> outer(n1 + 1, INT_MAX);
+
+	vector<int> order_a(na), order_b(nb);
+	iota(order_a.begin(), order_a.end(), 0);
+	iota(order_b.begin(), order_b.end(), 0);
+	sort(order_a.begin(), order_a.end(), [&](int i, int j)
+		 { return A[i * k] > A[j * k]; });
+	sort(order_b.begin(), order_b.end(), [&](int i, int j)
+		 { return B[i * k] > B[j * k]; });
+
+	// Points of A in decreasing lexicographic order, to find the ones equal to b
+	vector<int> lex_a;
+	if (exclude_equal)
+	{
+		lex_a = order_a;
+		sort(lex_a.begin(), lex_a.end(), [&](int i, int j)
+			 { return point_lex_greater(&A[i * k], &A[j * k], k); });
+	}
+
+	int next = 0;
+	for (int j : order_b)
+	{
+		const int *b = &B[j * k];
+		for (; next < na && A[order_a[next] * k] >= b[0]; ++next)
+		{
+			int i = order_a[next];
+			for (int r = rank1[i] + 1; r <= n1; r += r & -r)
+			{
+				if (k == 2)
+				{
+					outer[r] = min(outer[r], keys[i]);
+					continue;
+				}
+				int s = lower_bound(values2[r].begin(), values2[r].end(), A[i * k + 2], greater<int>()) -
+						values2[r].begin();
+				for (++s; s < (int)inner[r].size(); s += s & -s)
+					inner[r][s] = min(inner[r][s], keys[i]);
+			}
+		}
+
+		if (exclude_equal)
+		{
+			// A is an antichain, so no other point dominates a point of A
+			vector<int>::iterator it = lower_bound(lex_a.begin(), lex_a.end(), j, [&](int i, int jb)
+												   { return point_lex_greater(&A[i * k], &B[jb * k], k); });
+			if (it != lex_a.end() && point_equals(&A[*it * k], b, k))
+				continue;
+		}
+
+		// Number of values of the second objective not smaller than b's
+		int r = upper_bound(values1.begin(), values1.end(), b[1], greater<int>()) - values1.begin();
+		int best = INT_MAX;
+		for (; r > 0; r -= r & -r)
+		{
+			if (k == 2)
+			{
+				best = min(best, outer[r]);
+				continue;
+			}
+			int s = upper_bound(values2[r].begin(), values2[r].end(), b[2], greater<int>()) - values2[r].begin();
+			for (; s > 0; s -= s & -s)
+				best = min(best, inner[r][s]);
+		}
+		out[j] = best;
+	}
+}
+
+// Tree of bounding boxes over the points of A. A subtree is skipped when its
+// upper corner does not dominate b or its minimum key is not smaller than the
+// best found, and taken whole when its lower corner dominates b
+struct BoxTree
+{
+	static const int LEAF_SIZE = 8;
+
+	const vector<int> &A;
+	const vector<int> &keys;
+	int k;
+	vector<int> points;
+	// Per node: lower and upper corners, minimum key, children and range of points
+	vector<int> lower, upper, min_key, left, right, lo, hi;
+
+	BoxTree(const vector<int> &_A, const vector<int> &_keys, int _k) : A(_A), keys(_keys), k(_k)
+	{
+		points.resize(keys.size());
+		iota(points.begin(), points.end(), 0);
+		if (points.size() > 0)
+			build(0, points.size());
+	}
+
+	int build(int from, int to)
+	{
+		int node = min_key.size();
+		lower.resize(lower.size() + k, INT_MAX);
+		upper.resize(upper.size() + k, INT_MIN);
+		min_key.push_back(INT_MAX);
+		left.push_back(-1);
+		right.push_back(-1);
+		lo.push_back(from);
+		hi.push_back(to);
+		for (int p = from; p < to; ++p)
+		{
+			const int *a = &A[points[p] * k];
+			for (int d = 0; d < k; ++d)
+			{
+				lower[node * k + d] = min(lower[node * k + d], a[d]);
+				upper[node * k + d] = max(upper[node * k + d], a[d]);
+			}
+			min_key[node] = min(min_key[node], keys[points[p]]);
+		}
+		if (to - from <= LEAF_SIZE)
+			return node;
+
+		// Split at the median of the widest dimension
+		int dim = 0;
+		for (int d = 1; d < k; ++d)
+		{
+			if (upper[node * k + d] - lower[node * k + d] > upper[node * k + dim] - lower[node * k + dim])
+				dim = d;
+		}
+		int mid = (from + to) / 2;
+		nth_element(points.begin() + from, points.begin() + mid, points.begin() + to, [&](int i, int j)
+					{ return A[i * k + dim] < A[j * k + dim]; });
+		int l = build(from, mid);
+		int r = build(mid, to);
+		left[node] = l;
+		right[node] = r;
+		return node;
+	}
+
+	int query(const int *b, bool exclude_equal)
+	{
+		int best = INT_MAX;
+		if (min_key.size() == 0)
+			return best;
+		vector<int> stack(1, 0);
+		while (stack.size() > 0)
+		{
+			int node = stack.back();
+			stack.pop_back();
+			if (min_key[node] >= best || !point_dominates(&upper[node * k], b, k))
+				continue;
+			// Every point of the box dominates b, and none equals b if the lower corner differs
+			if (point_dominates(&lower[node * k], b, k) && (!exclude_equal || !point_equals(&lower[node * k], b, k)))
+			{
+				best = min_key[node];
+				continue;
+			}
+			if (left[node] < 0)
+			{
+				for (int p = lo[node]; p < hi[node]; ++p)
+				{
+					int i = points[p];
+					const int *a = &A[i * k];
+					if (keys[i] < best && point_dominates(a, b, k) && !(exclude_equal && point_equals(a, b, k)))
+						best = keys[i];
+				}
+				continue;
+			}
+			// Visit first the child with the smallest key
+			int first = left[node], second = right[node];
+			if (min_key[second] < min_key[first])
+				swap(first, second);
+			stack.push_back(second);
+			stack.push_back(first);
+		}
+		return best;
+	}
+};
+
+inline void min_dominating_bbox(const vector<int> &A, const vector<int> &keys, const vector<int> &B, int k,
+								bool exclude_equal, vector<int> &out)
+{
+	BoxTree tree(A, keys, k);
+	int nb = B.size() / k;
+	out.resize(nb);
+	for (int j = 0; j < nb; ++j)
+	{
+		out[j] = tree.query(&B[j * k], exclude_equal);
+	}
+}
+
+inline void min_dominating(ParetoMethod method, const vector<int> &A, const vector<int> &keys, const vector<int> &B,
+						   int k, bool exclude_equal, vector<int> &out)
+{
+	if (method == PARETO_SWEEP && (k == 2 || k == 3))
+		min_dominating_sweep(A, keys, B, k, exclude_equal, out);
+	else if (method == PARETO_BBOX)
+		min_dominating_bbox(A, keys, B, k, exclude_equal, out);
+	else
+		min_dominating_sorted(A, keys, B, k, exclude_equal, out);
+}
+
+//
+// Plan a merge with the list scan. P holds the m solutions of the set before
+// the merge and C the n shifted solutions to merge
+//
+inline size_t plan_merge_scan(const vector<int> &P, const vector<int> &C, int k, vector<int> &first_dominating,
+							  vector<int> &erased_by)
+{
+	int m = P.size() / k, n = C.size() / k;
+	size_t num_comparisons = 0;
+	for (int j = 0; j < n; ++j)
+	{
+		const int *c = &C[j * k];
+		for (int p = 0; p < m; ++p)
+		{
+			if (erased_by[p] != INT_MAX)
+				continue;
+			num_comparisons += 1;
+			const int *a = &P[p * k];
+			bool dominates = true, dominated = true;
+			for (int d = 0; d < k && (dominates || dominated); ++d)
+			{
+				dominates &= (c[d] >= a[d]);
+				dominated &= (c[d] <= a[d]);
+			}
+			if (dominates)
+			{
+				erased_by[p] = j;
+			}
+			else if (dominated)
+			{
+				first_dominating[j] = p;
+				break;
+			}
+		}
+	}
+	return num_comparisons;
+}
+
+//
+// Plan a merge: set first_dominating[j] to the first solution of P dominating
+// the j-th solution of C (INT_MAX if kept) and erased_by[p] to the solution of
+// C erasing the p-th solution of P (INT_MAX if it stays). Returns the number
+// of comparisons of the list scan
+//
+inline size_t plan_merge(const vector<int> &P, const vector<int> &C, int k, ParetoMethod method,
+						 vector<int> &first_dominating, vector<int> &erased_by)
+{
+	int m = P.size() / k, n = C.size() / k;
+	first_dominating.assign(n, INT_MAX);
+	erased_by.assign(m, INT_MAX);
+	if (m == 0 || n == 0)
+	{
+		return 0;
+	}
+	if (method == PARETO_LIST || (size_t)m * n < PARETO_MERGE_MIN_PAIRS)
+	{
+		return plan_merge_scan(P, C, k, first_dominating, erased_by);
+	}
+
+	// First solution of P (in list order) dominating each solution of C
+	vector<int> positions(m);
+	iota(positions.begin(), positions.end(), 0);
+	min_dominating(method, P, positions, C, k, true, first_dominating);
+
+	// First kept solution of C dominating each solution of P
+	vector<int> kept, kept_objs;
+	for (int j = 0; j < n; ++j)
+	{
+		if (first_dominating[j] == INT_MAX)
+		{
+			kept.push_back(j);
+			kept_objs.insert(kept_objs.end(), C.begin() + j * k, C.begin() + (j + 1) * k);
+		}
+	}
+	if (kept.size() > 0)
+		min_dominating(method, kept_objs, kept, P, k, false, erased_by);
+
+	// Replay the list scans
+	size_t num_comparisons = 0;
+	vector<vector<int>> erasures(n);
+	for (int p = 0; p < m; ++p)
+	{
+		if (erased_by[p] != INT_MAX)
+			erasures[erased_by[p]].push_back(p);
+	}
+	AliveCounter alive(m);
+	int num_alive = m;
+	for (int j = 0; j < n; ++j)
+	{
+		if (first_dominating[j] != INT_MAX)
+		{
+			num_comparisons += alive.count(first_dominating[j]) + 1;
+			continue;
+		}
+		num_comparisons += num_alive;
+		for (int p : erasures[j])
+		{
+			alive.remove(p);
+		}
+		num_alive -= erasures[j].size();
+	}
+
+	return num_comparisons;
+}
+
+//
+// Merge 'set' into 'pset', appending the primal value 'val' and adding the
+// objective function coefficients 'obj' to its solutions. Same result and
+// number of comparisons as pset.merge(set, val, obj)
+//
+inline size_t merge_pareto_sets(ParetoSet &pset, ParetoSet &set, int val, vector<int> &obj, ParetoMethod method)
+{
+	if (method == PARETO_LIST || (size_t)pset.sols.size() * set.sols.size() < PARETO_MERGE_MIN_PAIRS)
+	{
+		return pset.merge(set, val, obj);
+	}
+
+	const int k = pset.num_objs;
+
+	// Solutions of the set before the merge, P, and shifted solutions to merge, C
+	vector<int> P, C;
+	P.reserve(pset.sols.size() * k);
+	C.reserve(set.sols.size() * k);
+	for (SolutionList::iterator it = pset.sols.begin(); it != pset.sols.end(); ++it)
+	{
+		P.insert(P.end(), it->obj.begin(), it->obj.end());
+	}
+	for (SolutionList::iterator it = set.sols.begin(); it != set.sols.end(); ++it)
+	{
+		for (int d = 0; d < k; ++d)
+			C.push_back(it->obj[d] + obj[d]);
+	}
+
+	vector<int> first_dominating, erased_by;
+	size_t num_comparisons = plan_merge(P, C, k, method, first_dominating, erased_by);
+
+	// Remove erased solutions and append the kept ones, in list order
+	int i = 0;
+	for (SolutionList::iterator it = pset.sols.begin(); it != pset.sols.end(); ++i)
+	{
+		if (erased_by[i] != INT_MAX)
+			it = pset.sols.erase(it);
+		else
+			++it;
+	}
+	i = 0;
+	for (SolutionList::iterator it = set.sols.begin(); it != set.sols.end(); ++it, ++i)
+	{
+		if (first_dominating[i] != INT_MAX)
+			continue;
+		Solution new_sol(it->x, it->obj);
+		new_sol.x.push_back(val);
+		for (int d = 0; d < k; ++d)
+		{
+			new_sol.obj[d] += obj[d];
+		}
+		pset.sols.insert(pset.sols.end(), new_sol);
+	}
+
+	return num_comparisons;
+}
+
+//
+// Merge objective vectors only. Same result and number of comparisons as
+// merge_pareto_sets. If 'trace' is given, the kept solutions get a label
+// pointing to the one they extend with the primal value 'val'
+//
+inline size_t merge_objective_sets(ObjectiveParetoSet &pset, ObjectiveParetoSet &set, int val, vector<int> &obj,
+								   ParetoMethod method, SolutionTrace *trace = NULL)
+{
+	const int k = pset.num_objs;
+	const int n = set.size();
+	if (n == 0)
+	{
+		return 0;
+	}
+
+	vector<int> C(set.objs);
+	for (int j = 0; j < n; ++j)
+	{
+		for (int d = 0; d < k; ++d)
+			C[j * k + d] += obj[d];
+	}
+
+	vector<int> first_dominating, erased_by;
+	size_t num_comparisons = plan_merge(pset.objs, C, k, method, first_dominating, erased_by);
+
+	// Remove erased solutions in place and append the kept ones, in list order
+	int m = pset.size(), size = 0;
+	for (int p = 0; p < m; ++p)
+	{
+		if (erased_by[p] != INT_MAX)
+			continue;
+		if (size != p)
+		{
+			copy(pset.objs.begin() + p * k, pset.objs.begin() + (p + 1) * k, pset.objs.begin() + size * k);
+			if (trace != NULL)
+				pset.labels[size] = pset.labels[p];
+		}
+		size += 1;
+	}
+	pset.objs.resize(size * k);
+	if (trace != NULL)
+		pset.labels.resize(size);
+
+	for (int j = 0; j < n; ++j)
+	{
+		if (first_dominating[j] == INT_MAX)
+			pset.objs.insert(pset.objs.end(), C.begin() + j * k, C.begin() + (j + 1) * k);
+	}
+	if (trace != NULL)
+	{
+		lock_guard<mutex> guard(trace->lock);
+		for (int j = 0; j < n; ++j)
+		{
+			if (first_dominating[j] == INT_MAX)
+				pset.labels.push_back(trace->add(set.labels[j], val));
+		}
+	}
+
+	return num_comparisons;
+}
+
+//
+// Layers with fewer nodes than this are merged by the calling thread only
+//
+#define PARETO_PARALLEL_MIN_NODES 64
+
+//
+// Call 'merge_node' on the nodes 0..num_nodes-1 of a layer using up to
+// 'num_threads' threads, and return the sum of its results. The nodes only
+// read the pareto sets of the previous layer, so they can be merged in any
+// order. They are handed out one at a time, as their merges differ widely in
+// cost
+//
+template <typename MergeNode>
+inline size_t merge_layer(size_t num_nodes, int num_threads, MergeNode merge_node)
+{
+	if (num_threads <= 1 || num_nodes < PARETO_PARALLEL_MIN_NODES)
+	{
+		size_t total = 0;
+		for (size_t i = 0; i < num_nodes; ++i)
+		{
+			total += merge_node(i);
+		}
+		return total;
+	}
+
+	atomic<size_t> next(0);
+	vector<size_t> totals(num_threads, 0);
+	auto work = [&](int t)
+	{
+		size_t total = 0;
+		for (size_t i = next++; i < num_nodes; i = next++)
+		{
+			total += merge_node(i);
+		}
+		totals[t] = total;
+	};
+
+	vector<thread> workers;
+	for (int t = 1; t < num_threads; ++t)
+	{
+		workers.push_back(thread(work, t));
+	}
+	work(0);
+	for (size_t t = 0; t < workers.size(); ++t)
+	{
+		workers[t].join();
+	}
+
+	size_t total = 0;
+	for (int t = 0; t < num_threads; ++t)
+	{
+		total += totals[t];
+	}
+	return total;
+}
+
+#endif
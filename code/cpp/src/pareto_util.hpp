@@ -9,6 +9,7 @@
 #include <iostream>
 #include <fstream>
 #include <limits>
+#include <mutex>
 
 using namespace std;
 
@@ -443,4 +444,88 @@ struct ParetoSet
 	}
 };
 
+//
+// Solutions tracked while generating a pareto set
+//
+enum SolutionMode
+{
+	SOLUTIONS_FULL,		  // Objectives and primal values of every solution
+	SOLUTIONS_OBJECTIVES, // Objectives only
+	SOLUTIONS_TRACE		  // Objectives and a back-pointer to rebuild the primal values
+};
+
+//
+// Parse the name of a solution mode. Returns false if unknown
+//
+inline bool parse_solution_mode(const string &name, SolutionMode &mode)
+{
+	if (name == "full")
+		mode = SOLUTIONS_FULL;
+	else if (name == "objectives")
+		mode = SOLUTIONS_OBJECTIVES;
+	else if (name == "trace")
+		mode = SOLUTIONS_TRACE;
+	else
+		return false;
+	return true;
+}
+
+//
+// Back-pointers of the solutions generated by a pareto set computation. A
+// label is the primal value appended to the solution of its parent label.
+// Labels are added under 'lock' when nodes are merged by several threads
+//
+struct SolutionTrace
+{
+	vector<int> parent;
+	vector<char> value;
+	mutex lock;
+
+	// Root label, the empty solution
+	SolutionTrace() : parent(1, -1), value(1, 0) {}
+
+	int add(int _parent, int _value)
+	{
+		parent.push_back(_parent);
+		value.push_back(_value);
+		return parent.size() - 1;
+	}
+
+	// Primal values of the solution of a label
+	vector<int> solution(int label)
+	{
+		vector<int> x;
+		for (; parent[label] >= 0; label = parent[label])
+		{
+			x.push_back(value[label]);
+		}
+		reverse(x.begin(), x.end());
+		return x;
+	}
+};
+
+//
+// Pareto set storing only the objective vectors, contiguously, in the same
+// order as the list of ParetoSet. Labels are kept if solutions are traced
+//
+struct ObjectiveParetoSet
+{
+	const int num_objs;
+	vector<int> objs;	// num_objs objectives per solution
+	vector<int> labels; // SolutionTrace label per solution
+
+	ObjectiveParetoSet(const int _num_objs) : num_objs(_num_objs) {}
+
+	size_t size() const
+	{
+		return objs.size() / num_objs;
+	}
+
+	void clear()
+	{
+		objs.clear();
+		labels.clear();
+	}
+};
+
 #endif
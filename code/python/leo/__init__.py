@@ -1,20 +1,34 @@
 from pathlib import Path
 
-from omegaconf import OmegaConf
-
 res_path = Path(__file__).parent.parent.parent.parent / 'resources'
 
-path = OmegaConf.create({
-    'module': Path(__file__).parent.parent,
-    'resources': res_path,
-    'instances': res_path / 'instances',
-    'bin': res_path / 'bin',
-    'SmacI': res_path / 'SmacI_out',
-    'SmacD': res_path / 'SmacD_out',
-    'label': res_path / 'labels',
-    'dataset': res_path / 'datasets',
-    'model_cfg': res_path / 'model_cfg',
-    'prediction': res_path / 'predictions',
-    'pretrained': res_path / 'pretrained',
-    'eval_order': res_path / 'eval_order',
-    'model_summary': res_path / 'model_summary'})
+
+def _make_path():
+    # OmegaConf is only needed by the scripts that use `path`. Building it lazily
+    # keeps `import leo.utils.*` cheap for the SMAC worker, which is spawned once
+    # per configuration evaluation.
+    from omegaconf import OmegaConf
+
+    return OmegaConf.create({
+        'module': Path(__file__).parent.parent,
+        'resources': res_path,
+        'instances': res_path / 'instances',
+        'bin': res_path / 'bin',
+        'cache': res_path / 'cache',
+        'SmacI': res_path / 'SmacI_out',
+        'SmacD': res_path / 'SmacD_out',
+        'label': res_path / 'labels',
+        'dataset': res_path / 'datasets',
+        'model_cfg': res_path / 'model_cfg',
+        'prediction': res_path / 'predictions',
+        'pretrained': res_path / 'pretrained',
+        'eval_order': res_path / 'eval_order',
+        'model_summary': res_path / 'model_summary'})
+
+
+def __getattr__(name):
+    if name == 'path':
+        globals()['path'] = _make_path()
+        return globals()['path']
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
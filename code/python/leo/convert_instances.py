@@ -0,0 +1,23 @@
+import hydra
+from omegaconf import DictConfig
+
+from leo import path
+from leo.utils.instance import write_instance_store
+
+
+@hydra.main(version_base='1.2', config_path='./config', config_name='convert_instances.yaml')
+def main(cfg: DictConfig):
+    """Pack the .dat instances of each size and split into a memory-mapped instance store"""
+    for size in cfg.size:
+        for split in cfg.split:
+            split_path = path.instances / cfg.problem.name / size / split
+            if not split_path.exists():
+                print(f'Skipping missing split {split_path}')
+                continue
+
+            store_path = write_instance_store(cfg.problem.acronym, split_path)
+            print(f'Size: {size}, Split: {split}, Store: {store_path}')
+
+
+if __name__ == '__main__':
+    main()
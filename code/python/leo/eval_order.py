@@ -1,19 +1,115 @@
+import fcntl
+import json
 import logging
+import os
 import pickle as pkl
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import hydra
-import numpy as np
 import pandas as pd
 from omegaconf import DictConfig
 
 from leo import path
+from leo.utils.bdd import get_n_workers
+from leo.utils.bdd import get_record_version
+from leo.utils.bdd import result2runtime
 from leo.utils.bdd import run_bdd_builder
+from leo.utils.cache import BDDResultCache
 from leo.utils.data import get_dataset_name
-from leo.utils.order import make_result_column
 
 # A logger for this file
 log = logging.getLogger(__name__)
 
+# Column names of the scalar fields of the result record
+RESULT_COLUMNS = {'num_pareto_sol': 'nnds',
+                  'initial_width': 'iw',
+                  'reduced_width': 'rw',
+                  'initial_node_count': 'inc',
+                  'reduced_node_count': 'rnc',
+                  'initial_arcs_count': 'iac',
+                  'reduced_arcs_count': 'rac',
+                  'initial_avg_in_degree': 'iid',
+                  'reduced_avg_in_degree': 'rid',
+                  'num_comparisons': 'comp',
+                  'compilation_time': 'comp_time',
+                  'reduction_time': 'red_time',
+                  'pareto_time': 'pareto_time',
+                  'peak_rss_kb': 'peak_rss_kb'}
+# Column prefixes of the per-layer fields of the result record
+RESULT_LAYER_COLUMNS = {'layer_pareto': 'nnds',
+                        'initial_layer_nodes': 'inn',
+                        'reduced_layer_nodes': 'rnn'}
+
+
+def make_result_row(problem, size, split, pid, task, order_type, record, run_id=0):
+    row = {'problem': problem, 'size': size, 'split': split, 'pid': pid, 'task': task, 'order_type': order_type,
+           'run_id': run_id, 'version': record['version'], 'compact': record.get('compact', False)}
+    # Records of the stats kind have no Pareto set fields
+    row.update({col: record[field] for field, col in RESULT_COLUMNS.items() if field in record})
+    for field, prefix in RESULT_LAYER_COLUMNS.items():
+        if field in record:
+            row.update({f'{prefix}_l{layer}': v for layer, v in enumerate(record[field])})
+    if len(record.get('layer_pareto', [])):
+        # Column of the text output, kept for the readers of older summaries
+        row['nnds_per_layer'] = ', '.join(map(str, record['layer_pareto']))
+
+    return row
+
+
+def get_log_key(record):
+    """(model_id, split, size, pid) of an evaluation of the log. Pids repeat across sizes"""
+    return record['model_id'], record['split'], record['row']['size'], record['pid']
+
+
+def read_log(log_path, version, compact=False):
+    """Evaluations of the log whose result record has the given version and representation. Others are
+    not comparable"""
+    if not log_path.exists():
+        return
+
+    with open(log_path, 'r') as fp:
+        for line in fp:
+            # Skip a partially written last line
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            # Rows logged before the version was recorded are of version 1
+            if record['row'].get('version', 1) == version and record['row'].get('compact', False) == compact:
+                yield record
+
+
+def get_done_keys(log_path, version, compact=False):
+    """Keys of the evaluations of the given record version and representation already in the log, see
+    get_log_key"""
+    return {get_log_key(record) for record in read_log(log_path, version, compact)}
+
+
+def append_to_log(log_path, record):
+    """Durably append one evaluation to the log. Safe for concurrent writers."""
+    line = (json.dumps(record) + '\n').encode('utf-8')
+    fd = os.open(log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        os.write(fd, line)
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def write_summary(log_path, csv_path, version, compact=False):
+    """Write the evaluations of the given record version and representation in the log as a CSV, keeping
+    the last one of each (model_id, split, size, pid)"""
+    records = {get_log_key(record): record['row'] for record in read_log(log_path, version, compact)}
+    if not len(records):
+        log.info(f'No evaluations in {log_path}, skipping the summary')
+        return
+
+    df = pd.DataFrame(list(records.values()))
+    tmp_path = csv_path.with_suffix(f'.{os.getpid()}.tmp')
+    df.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, csv_path)
+
 
 @hydra.main(version_base='1.2', config_path='./config', config_name='eval_order.yaml')
 def main(cfg: DictConfig):
@@ -34,43 +130,83 @@ def main(cfg: DictConfig):
         row = df_summary[(df_summary.model_name == cfg.model_name) & (df_summary.task == cfg.task)]
     else:
         raise ValueError('Invalid mode!')
+    if cfg.bdd.threads < 1:
+        raise ValueError(f'Invalid number of threads: {cfg.bdd.threads}')
+    if cfg.bdd.compact and cfg.problem.name != 'knapsack':
+        raise ValueError(f'The compact BDD is only available for knapsack, not {cfg.problem.name}')
+
+    cache = None
+    if cfg.bdd.cache.enabled:
+        cache = BDDResultCache(path.cache / f'{cfg.problem.name}.sqlite', max_entries=cfg.bdd.cache.max_entries)
 
-    results = []
-    prediction_path = pred_path / f"prediction_{row.iloc[0]['model_id']}.pkl"
+    eval_order_path = path.eval_order / dataset_name
+    eval_order_path.mkdir(parents=True, exist_ok=True)
+    # Size statistics are kept apart from the Pareto frontier evaluations
+    prefix = 'pred' if cfg.bdd.kind == 'pareto' else cfg.bdd.kind
+    log_path = eval_order_path / f'{prefix}_{cfg.split}.jsonl'
+    model_id = row.iloc[0]['model_id']
+    version = get_record_version(cfg.bdd.kind)
+    done = get_done_keys(log_path, version, cfg.bdd.compact)
+
+    prediction_path = pred_path / f"prediction_{model_id}.pkl"
     preds = pkl.load(open(str(prediction_path), 'rb'))
     names, n_items, order = preds[cfg.split]['names'], preds[cfg.split]['n_items'], preds[cfg.split]['order']
+    tasks = []
     for _name, _n_item, _order in zip(names, n_items, order):
         _, _, n_objs, n_vars, pid = _name.split('_')
         size = f'{n_objs}_{n_vars}'
         pid = int(pid)
-        if pid < cfg.from_pid or pid >= cfg.to_pid:
+        if cfg.from_pid is not None and pid < cfg.from_pid:
+            continue
+        if cfg.to_pid is not None and pid >= cfg.to_pid:
+            continue
+        if (model_id, cfg.split, size, pid) in done:
             continue
 
-        log.info(f'Processing {_name}')
         dat_path = path.instances / cfg.problem.name / size / f'{cfg.split}/{_name}.dat'
-        status, result = run_bdd_builder(str(dat_path), _order[:_n_item], bin_path=str(path.bin),
+        tasks.append((size, pid, dat_path, _order[:_n_item]))
+
+    n_workers = get_n_workers(cfg.n_jobs, mem_limit=cfg.bdd.memlimit, mem_budget=cfg.mem_budget,
+                              threads=cfg.bdd.threads)
+    log.info(f'Evaluating {len(tasks)} instances with {n_workers} workers, skipping {len(done)} done')
+
+    def evaluate(task):
+        size, pid, dat_path, _order = task
+        log.info(f'Processing {dat_path.stem}')
+        status, result = run_bdd_builder(str(dat_path), _order, bin_path=str(path.bin),
                                          prob_id=str(cfg.problem.id), preprocess=str(cfg.problem.preprocess),
-                                         time_limit=cfg.bdd.timelimit, mem_limit=cfg.bdd.memlimit)
-        log.info(f'Time : {np.sum(result[-4: -1])}')
-        results.append(make_result_column(cfg.problem.name,
-                                          size,
-                                          cfg.split,
-                                          pid,
-                                          cfg.task,
-                                          f'pred_{row.model_name.values[0]}',
-                                          result))
-
-    df = pd.DataFrame(results, columns=['problem', 'size', 'split', 'pid', 'task', 'order_type', 'run_id',
-                                        'nnds', 'iw', 'rw', 'inc', 'rnc', 'iac', 'rac', 'iid', 'rid',
-                                        'comp', 'comp_time', 'red_time', 'pareto_time', 'nnds_per_layer'])
+                                         time_limit=cfg.bdd.timelimit, mem_limit=cfg.bdd.memlimit,
+                                         cache=cache, kind=cfg.bdd.kind, threads=cfg.bdd.threads,
+                                         compact=cfg.bdd.compact)
+        log.info(f'Time : {result2runtime(status, result)}')
 
-    eval_order_path = path.eval_order / dataset_name
-    eval_order_path.mkdir(parents=True, exist_ok=True)
-    eval_order_path = eval_order_path / f'pred_{cfg.split}_{cfg.from_pid}_{cfg.to_pid}.csv'
-    if eval_order_path.exists():
-        df_old = pd.read_csv(eval_order_path)
-        df = pd.concat([df, df_old], ignore_index=True)
-    df.to_csv(eval_order_path, index=False)
+        return status, make_result_row(cfg.problem.name,
+                                       size,
+                                       cfg.split,
+                                       pid,
+                                       cfg.task,
+                                       f'pred_{row.model_name.values[0]}',
+                                       result)
+
+    with ThreadPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(evaluate, task): task for task in tasks}
+        for future in as_completed(futures):
+            try:
+                status, result_row = future.result()
+            except Exception:
+                # Keep logging the other evaluations, the failed one is retried on restart
+                log.exception(f'Evaluation of {futures[future][2].stem} failed')
+                continue
+            append_to_log(log_path, {'model_id': model_id, 'split': cfg.split, 'pid': result_row['pid'],
+                                     'status': status, 'row': result_row})
+
+    if cache is not None:
+        log.info(f'Cache: {cache.stats()}')
+        cache.close()
+
+    # Rows of the compact BDD have other numbers of comparisons and are summarized apart
+    summary_name = f'{prefix}_compact_{cfg.split}.csv' if cfg.bdd.compact else f'{prefix}_{cfg.split}.csv'
+    write_summary(log_path, eval_order_path / summary_name, version, cfg.bdd.compact)
 
 
 if __name__ == '__main__':
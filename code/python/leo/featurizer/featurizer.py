@@ -4,3 +4,6 @@ class Featurizer:
 
     def get(self, *args, **kwargs):
         raise NotImplementedError
+
+    def get_batch(self, *args, **kwargs):
+        raise NotImplementedError
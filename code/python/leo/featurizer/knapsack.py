@@ -1,9 +1,8 @@
-from operator import itemgetter
-
 import numpy as np
 
 from leo.utils.const import KnapsackStaticOrderings
 from leo.utils.data import feat_names
+from leo.utils.order import static_ranks_batch
 from .featurizer import Featurizer
 
 
@@ -41,72 +40,11 @@ class KnapsackFeaturizer(Featurizer):
 
     def _get_heuristic_variable_rank_features(self):
         self.n_vars = len(self.data['weight'])
+        ranks = static_ranks_batch(np.asarray(self.data['weight'])[np.newaxis],
+                                   np.asarray(self.data['value'])[np.newaxis],
+                                   names=[o.name for o in KnapsackStaticOrderings])[:, 0]
 
-        ranks = []
-        for o in KnapsackStaticOrderings:
-            if o.name == 'max_weight':
-                idx_weight = [(i, w) for i, w in enumerate(self.data['weight'])]
-                idx_weight.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_weight)
-
-            elif o.name == 'min_weight':
-                idx_weight = [(i, w) for i, w in enumerate(self.data['weight'])]
-                idx_weight.sort(key=itemgetter(1))
-                idx_rank = self._get_rank(idx_weight)
-
-            elif o.name == 'max_avg_value':
-                mean_profit = np.mean(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(mean_profit)]
-                idx_profit.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'min_avg_value':
-                mean_profit = np.mean(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(mean_profit)]
-                idx_profit.sort(key=itemgetter(1))
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'max_max_value':
-                max_profit = np.max(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(max_profit)]
-                idx_profit.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'min_max_value':
-                max_profit = np.max(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(max_profit)]
-                idx_profit.sort(key=itemgetter(1))
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'max_min_value':
-                min_profit = np.min(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(min_profit)]
-                idx_profit.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'min_min_value':
-                min_profit = np.min(self.data['value'], 0)
-                idx_profit = [(i, mp) for i, mp in enumerate(min_profit)]
-                idx_profit.sort(key=itemgetter(1))
-                idx_rank = self._get_rank(idx_profit)
-
-            elif o.name == 'max_avg_value_by_weight':
-                mean_profit = np.mean(self.data['value'], 0)
-                profit_by_weight = [v / w for v, w in zip(mean_profit, self.data['weight'])]
-                idx_profit_by_weight = [(i, f) for i, f in enumerate(profit_by_weight)]
-                idx_profit_by_weight.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_profit_by_weight)
-
-            elif o.name == 'max_max_value_by_weight':
-                max_profit = np.max(self.data['value'], 0)
-                profit_by_weight = [v / w for v, w in zip(max_profit, self.data['weight'])]
-                idx_profit_by_weight = [(i, f) for i, f in enumerate(profit_by_weight)]
-                idx_profit_by_weight.sort(key=itemgetter(1), reverse=True)
-                idx_rank = self._get_rank(idx_profit_by_weight)
-
-            ranks.append([idx_rank[i] for i in range(self.n_vars)])
-
-        ranks = (1 / self.n_vars) * np.asarray(ranks)
+        ranks = (1 / self.n_vars) * ranks
         return ranks
 
     def _get_variable_features(self):
@@ -123,13 +61,57 @@ class KnapsackFeaturizer(Featurizer):
         #     item_features = np.vstack([item_features,
         #                                idx_rank_array])
 
-    @staticmethod
-    def _get_rank(sorted_data):
-        idx_rank = {}
-        for rank, item in enumerate(sorted_data):
-            idx_rank[item[0]] = rank
+    def get_batch(self, weight=None, value=None, capacity=None):
+        """Features of a stack of instances with the same number of objectives and variables.
+
+        Takes the weight (instances x variables), value (instances x objectives x variables) and
+        capacity (instances) arrays and returns the same feature blocks as `get`, stacked along a
+        leading instance axis as contiguous arrays. Each slice is identical to the output of `get`.
+        """
+        norm_value = (1 / self.norm_const) * np.asarray(value)
+        norm_weight = (1 / self.norm_const) * np.asarray(weight)
+        n_insts, n_objs, n_vars = norm_value.shape
+
+        feat = {'raw': None, 'inst': None, 'var': None, 'vrank': None}
+        if self.cfg.raw:
+            capacity = np.repeat((np.asarray(capacity) / self.norm_const).reshape(-1, 1), n_vars, axis=1)
+            raw_feat = np.concatenate((norm_value, norm_weight[:, np.newaxis], capacity[:, np.newaxis]), axis=1)
+            feat['raw'] = np.ascontiguousarray(raw_feat.transpose(0, 2, 1))
+            assert feat['raw'].shape[2] == n_objs + 2
+
+        if self.cfg.context:
+            value_mean = norm_value.mean(axis=2)
+            value_min = norm_value.min(axis=2)
+            value_max = norm_value.max(axis=2)
+            inst_feat = [np.full(n_insts, n_objs / 7),
+                         np.full(n_insts, n_vars / 100),
+                         (np.ceil(norm_weight.sum(axis=1)) / 2) / n_vars,  # Normalized capacity
+                         norm_weight.mean(axis=1), norm_weight.min(axis=1), norm_weight.max(axis=1),
+                         norm_weight.std(axis=1)]  # Weight aggregate stats
+            # Value double-aggregate stats
+            for agg in [value_mean, value_min, value_max]:
+                inst_feat.extend([agg.mean(axis=1), agg.min(axis=1), agg.max(axis=1), agg.std(axis=1)])
+
+            inst_feat = np.stack(inst_feat, axis=1)
+            feat['inst'] = np.repeat(inst_feat[:, np.newaxis], n_vars, axis=1)
+            assert feat['inst'].shape[2] == len(feat_names['inst'])
+
+        var_feat = np.stack([norm_weight,
+                             norm_value.mean(axis=1),
+                             norm_value.min(axis=1),
+                             norm_value.max(axis=1),
+                             norm_value.std(axis=1),
+                             norm_value.mean(axis=1) / norm_weight,
+                             norm_value.max(axis=1) / norm_weight,
+                             norm_value.min(axis=1) / norm_weight], axis=2)
+        feat['var'] = var_feat
+        assert feat['var'].shape[2] == len(feat_names['var'])
+
+        ranks = static_ranks_batch(weight, value, names=[o.name for o in KnapsackStaticOrderings])
+        feat['vrank'] = np.ascontiguousarray(((1 / n_vars) * ranks).transpose(1, 2, 0))
+        assert feat['vrank'].shape[2] == len(feat_names['vrank'])
 
-        return idx_rank
+        return feat
 
     def get(self, data=None):
         self._set_data(data)
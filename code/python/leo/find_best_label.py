@@ -4,11 +4,12 @@ import hydra
 import pandas as pd
 
 from leo import path
+from leo.utils.label import MIN_WEIGHT_INCUMBENT
+from leo.utils.label import write_label_store
 
 case = 1
 
-min_weight_dict = {'avg_value': 0.0, 'avg_value_by_weight': 0.0, 'max_value': 0.0, 'max_value_by_weight': 0.0,
-                   'min_value': 0.0, 'min_value_by_weight': 0.0, 'weight': -1.0}
+min_weight_dict = MIN_WEIGHT_INCUMBENT
 
 
 def create_table_line(case=1, problem='knapsack', n_objs=3, n_vars=60, bin_name='multiobj', mode='SmacI', seed=777,
@@ -39,6 +40,9 @@ def find_best_run_and_save(cfg, df, split=None):
         name = path.label / cfg.problem.name / cfg.problem.size / name
 
         result_best_run.to_csv(name, index=False)
+        # Typed columns indexed by pid, read by LabelStore
+        write_label_store(name, result_best_run['pid'].values, result_best_run['seed'].values,
+                          result_best_run['cost'].values, list(result_best_run['incb'].values))
 
 
 def create_table(cfg, missing_traj, table_str=''):
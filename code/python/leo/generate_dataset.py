@@ -1,15 +1,23 @@
-import ast
+import json
 import pickle as pkl
+import shutil
 import time
 
 import hydra
+import numpy as np
 import pandas as pd
 from omegaconf import DictConfig
 
 from leo import path
 from leo.featurizer.factory import featurizer_factory
+from leo.utils.data import BINARY_DATASET_VERSION
+from leo.utils.data import get_binary_dataset_path
 from leo.utils.data import get_dataset_name
-from leo.utils.data import read_data_from_file
+from leo.utils.data import get_dataset_source
+from leo.utils.instance import open_instance_store
+from leo.utils.instance import read_data_from_file
+from leo.utils.label import LabelStore
+from leo.utils.label import MIN_WEIGHT_INCUMBENT
 from leo.utils.order import get_variable_rank
 
 
@@ -21,13 +29,100 @@ def save_dataset_point_regress(root_path, dataset_name, task, split, dataset, ti
     time_df.to_csv(root_path / f'{dataset_name}_time_{task}_{split}.csv', index=False)
 
 
-def save_dataset_pair_rank(root_path, dataset_name, task, split, split_str, n_items_str, inst_names_str, time_dataset):
-    root_path.joinpath(f'{dataset_name}_dataset_{task}_{split}.dat').write_text(split_str)
-    root_path.joinpath(f'{dataset_name}_n_items_{task}_{split}.dat').write_text(n_items_str)
-    root_path.joinpath(f'{dataset_name}_names_{task}_{split}.dat').write_text(inst_names_str)
+class PairRankWriter:
+    """Stream a pair_rank dataset to its SVMlight dataset, n_items and names files, one instance at a time.
 
-    time_df = pd.DataFrame(time_dataset, columns=['size', 'pid', 'best_seed', 'split', 'time'])
-    time_df.to_csv(root_path / f'{dataset_name}_time_{task}_{split}.csv', index=False)
+    The features and labels are also written in binary form (see `get_binary_dataset_path`), which
+    `load_dataset` prefers over parsing the text. The files are written under temporary names and
+    moved in place by `close`, so that an interrupted run does not leave a truncated dataset behind.
+    """
+
+    def __init__(self, root_path, dataset_name, task, split):
+        self.paths = {kind: root_path / f'{dataset_name}_{kind}_{task}_{split}.dat'
+                      for kind in ['dataset', 'n_items', 'names']}
+        self.time_path = root_path / f'{dataset_name}_time_{task}_{split}.csv'
+        self.fps = {kind: open(file_path.with_suffix('.dat.tmp'), 'w') for kind, file_path in self.paths.items()}
+        self.qid = 1
+        self.time_dataset = []
+        self.prefixes = []
+
+        self.bin_path = get_binary_dataset_path(self.paths['dataset'])
+        self.bin_tmp_path = self.bin_path.with_suffix('.bin.tmp')
+        shutil.rmtree(self.bin_tmp_path, ignore_errors=True)
+        self.bin_tmp_path.mkdir(parents=True)
+        self.fp_x = open(self.bin_tmp_path / 'X.f32', 'wb')
+        self.labels, self.group_offsets, self.n_features = [], [0], 0
+
+    def write(self, name, labels, features):
+        """Write the rows of an instance. `features` is an (items x features) array."""
+        n_items, n_features = features.shape
+        if len(self.prefixes) < n_features:
+            self.prefixes = [f'{fid}:' for fid in range(1, n_features + 1)]
+        prefixes = self.prefixes[:n_features]
+
+        # Same formatting as f'{fid}:{f} ' on the numpy scalars, which match repr on Python floats
+        rows = [f'{label} qid:{self.qid} ' + ' '.join([p + repr(f) for p, f in zip(prefixes, row)]) + ' \n'
+                for label, row in zip(labels, features.tolist())]
+        self.fps['dataset'].write(''.join(rows))
+        self.fps['n_items'].write(f'{int(n_items)}\n')
+        self.fps['names'].write(f'{name}\n')
+
+        np.ascontiguousarray(features, dtype=np.float32).tofile(self.fp_x)
+        self.labels.extend(labels)
+        self.group_offsets.append(self.group_offsets[-1] + n_items)
+        self.n_features = n_features
+
+        # Update qid after processing one instance
+        self.qid += 1
+
+    def close(self):
+        for kind, fp in self.fps.items():
+            fp.close()
+            fp_path = self.paths[kind].with_suffix('.dat.tmp')
+            fp_path.replace(self.paths[kind])
+
+        self.fp_x.close()
+        np.save(self.bin_tmp_path / 'y.npy', np.asarray(self.labels, dtype=np.int32))
+        np.save(self.bin_tmp_path / 'group_offsets.npy', np.asarray(self.group_offsets, dtype=np.int64))
+        meta = {'version': BINARY_DATASET_VERSION,
+                'n_rows': self.group_offsets[-1],
+                'n_features': self.n_features,
+                'source': get_dataset_source(self.paths['dataset'])}
+        (self.bin_tmp_path / 'meta.json').write_text(json.dumps(meta))
+        shutil.rmtree(self.bin_path, ignore_errors=True)
+        self.bin_tmp_path.replace(self.bin_path)
+
+        time_df = pd.DataFrame(self.time_dataset, columns=['size', 'pid', 'best_seed', 'split', 'time'])
+        time_df.to_csv(self.time_path, index=False)
+
+
+def featurize_instances(cfg, featurizer, inst_path):
+    """Read all the instances of a size bucket and featurize them in a single batch. Returns the
+    instance paths, their data, their features and the featurization time per instance.
+
+    The instances are taken from the instance store of the split when it is up to date, otherwise
+    their .dat files are parsed."""
+    insts = [inst for inst in inst_path.iterdir() if inst.suffix == '.dat']
+    if not len(insts):
+        return insts, [], [], 0.0
+
+    store = open_instance_store(inst_path)
+    if store is not None:
+        idx = [store.index[inst.stem] for inst in insts]
+        data_lst = [store.get(name=inst.stem) for inst in insts]
+        weight, value, capacity = store.weight[idx], store.value[idx], store.capacity[idx]
+    else:
+        data_lst = [read_data_from_file(cfg.problem.acronym, inst) for inst in insts]
+        weight = np.asarray([data['weight'] for data in data_lst])
+        value = np.asarray([data['value'] for data in data_lst])
+        capacity = np.asarray([data['capacity'] for data in data_lst])
+
+    start_time = time.time()
+    batch = featurizer.get_batch(weight=weight, value=value, capacity=capacity)
+    features = [{k: None if v is None else v[i] for k, v in batch.items()} for i in range(len(insts))]
+    feat_time = (time.time() - start_time) / len(insts)
+
+    return insts, data_lst, features, feat_time
 
 
 def generate_dataset_point_regress(cfg):
@@ -49,45 +144,41 @@ def generate_dataset_point_regress(cfg):
             if not cfg.fused:
                 dataset_name = get_dataset_name(cfg)
 
-            df_label = None
+            labels = None
             if split != 'test':
-                df_label = pd.read_csv(path.label / cfg.problem.name / size / f'label_{size}_{split}.csv')
-                print(f'\t\tLabels shape: {df_label.shape}')
+                labels = LabelStore.load(path.label / cfg.problem.name / size / f'label_{size}_{split}.csv')
+                print(f'\t\tLabels: {len(labels)}')
 
             inst_path = inst_root_path / size / split
-            for inst in inst_path.iterdir():
+            insts, data_lst, features_lst, feat_time = featurize_instances(cfg, featurizer, inst_path)
+            for inst, data, features in zip(insts, data_lst, features_lst):
                 pid = int(inst.stem.split('.')[0].split('_')[-1])
                 sample = {'name': inst.stem, 'pid': pid, 'seed': None, 'x': {}, 'y': []}
 
                 # Prepare x
-                data = read_data_from_file(cfg.problem.acronym, inst)
                 start_time = time.time()
-                features = featurizer.get(data=data)
                 sample['x'] = features
 
                 # Prepare y
                 # Get best seed for the pid
                 best_seed = None
-                if df_label is not None:
-                    label_row = df_label[df_label['pid'] == pid]
+                if labels is not None:
                     # Use min_weight if label not found
-                    incb_dict = {'avg_value': 0.0, 'avg_value_by_weight': 0.0, 'max_value': 0.0,
-                                 'max_value_by_weight': 0.0,
-                                 'min_value': 0.0, 'min_value_by_weight': 0.0, 'weight': -1.0}
+                    incb_dict = MIN_WEIGHT_INCUMBENT
                     best_seed = '-1'
                     sample['seed'] = '-1'
-                    if label_row.shape[0]:
-                        best_seed = label_row['seed'].values[0]
+                    if pid in labels:
+                        best_seed = labels.get_seed(pid)
                         sample['seed'] = best_seed
                         # Save the incumbent
-                        incb_dict = ast.literal_eval(label_row['incb'].values[0])
+                        incb_dict = labels.get_weights(pid)
                     else:
                         print(f'Missing incumbent. Using min_weight for {str(inst)}')
                     # Top variables get a lower rank. For example, first variable is ranked 0
                     sample['y'] = get_variable_rank(data=data, property_weights=incb_dict, reverse=True,
                                                     normalized=bool(cfg.normalize_rank))[0]
 
-                end_time = time.time() - start_time
+                end_time = time.time() - start_time + feat_time
                 time_dataset.append([size, pid, best_seed, split, end_time])
 
                 # Append sample to dataset
@@ -116,9 +207,7 @@ def generate_dataset_pair_rank(cfg):
     for split in cfg.split:
         print(f'Split: {split}')
         print(f'Fused: {cfg.fused}')
-        dataset_name = get_dataset_name(cfg) if cfg.fused else None
-        split_str, n_items_str, inst_names_str, qid = '', '', '', 1
-        time_dataset = []
+        writer = PairRankWriter(dataset_root_path, get_dataset_name(cfg), cfg.task, split) if cfg.fused else None
 
         # For each size
         for size in cfg.size:
@@ -126,35 +215,29 @@ def generate_dataset_pair_rank(cfg):
             n_objs, n_vars = list(map(int, size.split('_')))
             cfg.problem.n_objs = n_objs
             cfg.problem.n_vars = n_vars
+            # Separate dataset for each size
             if not cfg.fused:
-                dataset_name = get_dataset_name(cfg)
+                writer = PairRankWriter(dataset_root_path, get_dataset_name(cfg), cfg.task, split)
 
-            df_label = None
+            labels = None
             if split != 'test':
                 # TODO: Check if the label file exists before loading. Continue gracefully if it doesn't.
-                df_label = pd.read_csv(path.label / cfg.problem.name / size / f'label_{size}_{split}.csv')
-                print(f'\t\tLabels shape: {df_label.shape}')
+                labels = LabelStore.load(path.label / cfg.problem.name / size / f'label_{size}_{split}.csv')
+                print(f'\t\tLabels: {len(labels)}')
 
             inst_path = inst_root_path / size / split
-            for inst in inst_path.iterdir():
+            insts, data_lst, features_lst, feat_time = featurize_instances(cfg, featurizer, inst_path)
+            for inst, data, features in zip(insts, data_lst, features_lst):
                 pid = int(inst.stem.split('.')[0].split('_')[-1])
-                inst_names_str += f'{inst.stem}\n'
-                n_items_str += f'{int(n_vars)}\n'
-
-                # Get features
-                data = read_data_from_file(cfg.problem.acronym, inst)
-
                 start_time = time.time()
-                features = featurizer.get(data=data)
 
                 # Get best seed for the pid
                 ranks, best_seed = None, None
-                if df_label is not None:
-                    label_row = df_label[df_label['pid'] == pid]
-                    best_seed = label_row['seed'].values[0]
+                if labels is not None:
+                    best_seed = labels.get_seed(pid)
 
                     # Get variable order
-                    incb_dict = ast.literal_eval(label_row['incb'].values[0])
+                    incb_dict = labels.get_weights(pid)
                     # A lower ranks means the variable is used higher up in the DD construction
                     # However, SVMRank needs rank to be higher for the variable to be used higher in DD construction
                     # Hence, modified_rank = n_items - original_rank
@@ -162,45 +245,23 @@ def generate_dataset_pair_rank(cfg):
                                               normalized=bool(cfg.normalize_rank))[0]
                 # For the test set
                 ranks = [n_vars] * n_vars if ranks is None else ranks
-                for item_id, r in enumerate(ranks):
-                    fid = 1
-                    features_str = ''
-
-                    for f in features['var'][item_id]:
-                        features_str += f"{fid}:{f} "
-                        fid += 1
-
-                    for f in features['vrank'][item_id]:
-                        features_str += f"{fid}:{f} "
-                        fid += 1
+                # Rank modified to be consistent with the convention of SVMRank
+                modified_ranks = [int(n_vars - r) for r in ranks]
 
-                    if cfg.context:
-                        for f in features['inst'][item_id]:
-                            features_str += f"{fid}:{f} "
-                            fid += 1
+                blocks = [features['var'], features['vrank']]
+                if cfg.context:
+                    blocks.append(features['inst'])
+                writer.write(inst.stem, modified_ranks, np.hstack(blocks))
 
-                    # Rank modified to be consistent with the convention of SVMRank
-                    modified_rank = int(n_vars - r)
-                    split_str += f'{modified_rank} qid:{qid} {features_str}\n'
+                end_time = time.time() - start_time + feat_time
+                writer.time_dataset.append([size, pid, best_seed, split, end_time])
 
-                # Update qid after processing one instance
-                qid += 1
-
-                end_time = time.time() - start_time
-                time_dataset.append([size, pid, best_seed, split, end_time])
-
-            # Separate dataset for each size
             if not cfg.fused:
-                save_dataset_pair_rank(dataset_root_path, dataset_name, cfg.task, split, split_str, n_items_str,
-                                       inst_names_str, time_dataset)
-                # Reset
-                split_str, n_items_str, inst_names_str, qid = '', '', '', 1
-                time_dataset = []
+                writer.close()
 
         # Single dataset for all sizes
         if cfg.fused:
-            save_dataset_pair_rank(dataset_root_path, dataset_name, cfg.task, split, split_str, n_items_str,
-                                   inst_names_str, time_dataset)
+            writer.close()
 
 
 @hydra.main(version_base='1.2', config_path='./config', config_name='generate_dataset.yaml')
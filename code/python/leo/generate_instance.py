@@ -3,6 +3,7 @@ import numpy as np
 from omegaconf import DictConfig
 
 from leo import path
+from leo.utils.instance import write_instance_store
 
 
 def generate_instance(rng, n_vars, n_objs, max_obj=1000):
@@ -62,6 +63,13 @@ def main(cfg: DictConfig):
                 path.instances / f'{cfg.name}/{n_objs}_{n_vars}/test/kp_{cfg.seed}_{n_objs}_{n_vars}_{id}.dat',
                 generate_instance(rng, n_vars, n_objs, max_obj=cfg.max_obj))
 
+        # Keep the instance stores in sync with the .dat files
+        if cfg.store:
+            for split in ['train', 'val', 'test']:
+                split_path = path.instances / f'{cfg.name}/{n_objs}_{n_vars}/{split}'
+                if split_path.exists():
+                    write_instance_store('kp', split_path)
+
 
 if __name__ == '__main__':
     main()
@@ -326,8 +326,9 @@ def get_eval_order_cmd(split='test', n_items=10):
 
     for i in range(start, end, n_items):
         for s in sizes:
-            table_str += f'{case} python -m leo.eval_order problem=knapsack problem.n_objs={s[0]} problem.n_vars={s[1]} ' \
-                         f'mode=best task=pair_rank model=GradientBoostingRanker fused=0 context=0\n'
+            table_str += f'{case} python -m leo.eval_order problem=knapsack problem.n_objs={s[0]} ' \
+                         f'problem.n_vars={s[1]} split={split} from_pid={i} to_pid={i + n_items} ' \
+                         f'mode=best task=pair_rank model_name=GradientBoostingRanker fused=0 context=0\n'
             case += 1
 
             table_str += f'{case} python -m leo.eval_order problem=knapsack problem.n_objs={s[0]} ' \
@@ -335,12 +336,14 @@ def get_eval_order_cmd(split='test', n_items=10):
                          f'mode=best task=pair_rank model_name=GradientBoostingRanker fused=0 context=1\n'
             case += 1
 
-        table_str += f'{case} python -m leo.eval_order problem=knapsack mode=best task=pair_rank ' \
-                     f'model=GradientBoostingRanker fused=1 context=0\n'
+        table_str += f'{case} python -m leo.eval_order problem=knapsack split={split} from_pid={i} ' \
+                     f'to_pid={i + n_items} mode=best task=pair_rank model_name=GradientBoostingRanker fused=1 ' \
+                     f'context=0\n'
         case += 1
 
-        table_str += f'{case} python -m leo.eval_order problem=knapsack mode=best task=pair_rank ' \
-                     f'model=GradientBoostingRanker fused=1 context=1\n'
+        table_str += f'{case} python -m leo.eval_order problem=knapsack split={split} from_pid={i} ' \
+                     f'to_pid={i + n_items} mode=best task=pair_rank model_name=GradientBoostingRanker fused=1 ' \
+                     f'context=1\n'
         case += 1
 
     return table_str
@@ -1,4 +1,5 @@
 import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 import hydra
@@ -6,9 +7,14 @@ import numpy as np
 from ConfigSpace.hyperparameters import UniformFloatHyperparameter
 from smac.configspace import ConfigurationSpace
 from smac.facade.smac_ac_facade import SMAC4AC
+from smac.intensification.simple_intensifier import SimpleIntensifier
+from smac.intensification.successive_halving import SuccessiveHalving
 from smac.scenario.scenario import Scenario
 
 from leo import path
+from leo.utils.bdd import get_n_workers
+from leo.utils.cache import BDDResultCache
+from leo.utils.tae import BDDTargetRunner
 
 
 def get_config_space(width=None):
@@ -38,6 +44,13 @@ def get_logger(verbosity):
     return logger
 
 
+def get_cache(opts):
+    if not opts.cache.enabled:
+        return None
+
+    return BDDResultCache(path.cache / f'{opts.problem.name}.sqlite', max_entries=opts.cache.max_entries)
+
+
 def run_smac(instances, base_scenario_dict, opts):
     assert len(instances)
 
@@ -45,24 +58,82 @@ def run_smac(instances, base_scenario_dict, opts):
     scenario_dict = base_scenario_dict.copy()
     scenario_dict['instances'] = instances
     scenario_dict['output_dir'] = path[opts.mode] / opts.problem.name / opts.problem.size
-    scenario_dict['output_dir'] /= opts.split / str(Path(instances[0][0]).stem)
+    scenario_dict['output_dir'] = scenario_dict['output_dir'] / opts.split / str(Path(instances[0][0]).stem)
     scenario = Scenario(scenario_dict)
 
     # Create SMAC object
+    tae_kwargs = {}
+    if opts.tae == 'func':
+        tae_kwargs = {
+            'tae_runner': BDDTargetRunner,
+            'tae_runner_kwargs': {'prob_id': opts.problem.id,
+                                  'preprocess': opts.problem.preprocess,
+                                  'bin_path': str(path.bin),
+                                  'bin_name': opts.bin_name,
+                                  'mem_limit': opts.mem_limit,
+                                  'batch_worker': opts.batch_worker,
+                                  'cache': get_cache(opts),
+                                  'screen_width': opts.screen.width,
+                                  'screen_eta': opts.screen.eta,
+                                  'screen_warmup': opts.screen.warmup,
+                                  'compact': opts.compact,
+                                  # Trials and deduplicated trials per instance, next to the SMAC output
+                                  'stats_path': str(scenario_dict['output_dir'] / f'run_{opts.seed}' /
+                                                    'tae_stats.json')}}
+    if opts.trial_workers > 1:
+        # SMAC evaluates the trials in a local Dask cluster of trial_workers processes, sharing one run
+        # history. Its default intensifier only supports one worker.
+        tae_kwargs['n_jobs'] = opts.trial_workers
+        tae_kwargs['intensifier'] = SimpleIntensifier if len(instances) == 1 else SuccessiveHalving
     smac = SMAC4AC(
         scenario=scenario,
         rng=np.random.RandomState(opts.seed),
-        run_id=opts.seed)
+        run_id=opts.seed,
+        **tae_kwargs)
 
     # Start optimization
     try:
         incumbent = smac.optimize()
     finally:
         incumbent = smac.solver.incumbent
+        # Stop the batch workers of the runner. With parallel trials, those of the Dask workers end with them
+        runner = smac.get_tae_runner()
+        runner = getattr(runner, 'single_worker', runner)
+        if isinstance(runner, BDDTargetRunner):
+            runner.close()
 
     print('Optimized configuration %s' % str(incumbent))
 
 
+def run_smac_parallel(dataset, base_scenario_dict, opts, n_workers):
+    """Label the instances of `dataset` concurrently, one SMAC run per instance, each with its own output
+    directory and seed. All runs share the same memory limit, mem_limit per binary they can keep alive (see
+    get_procs_per_run), so bounding the number of workers by mem_budget // (mem_limit * procs_per_run) keeps
+    the sum of the memory limits of the running jobs within the budget."""
+    failed = []
+    with ProcessPoolExecutor(max_workers=n_workers) as executor:
+        futures = {executor.submit(run_smac, [instance], base_scenario_dict, opts): instance
+                   for instance in dataset}
+        for future in as_completed(futures):
+            instance = futures[future]
+            try:
+                future.result()
+            except Exception as e:
+                print(f'SMAC failed on {instance[0]}: {e!r}')
+                failed.append(instance[0])
+
+    if len(failed):
+        raise RuntimeError(f'SMAC failed on {len(failed)} of {len(dataset)} instances')
+
+
+def get_procs_per_run(opts):
+    """Number of binaries a SMAC run can keep alive at once. With batch workers and screening, every trial
+    worker holds one batch worker for the restricted BDD and one for the exact BDD"""
+    procs_per_trial = 2 if opts.tae == 'func' and opts.batch_worker and opts.screen.width is not None else 1
+
+    return opts.trial_workers * procs_per_trial
+
+
 @hydra.main(version_base='1.2', config_path='./config', config_name='label_instance.yaml')
 def main(cfg):
     logger = get_logger(cfg.verbose) if cfg.verbose else None
@@ -74,6 +145,12 @@ def main(cfg):
     os.environ['prob_id'] = str(cfg.problem.id)
     os.environ['preprocess'] = str(cfg.problem.preprocess)
     os.environ['mem_limit'] = str(cfg.mem_limit)
+    os.environ['compact'] = str(int(cfg.compact))
+
+    if cfg.trial_workers < 1:
+        raise ValueError(f'Invalid number of trial workers: {cfg.trial_workers}')
+    if cfg.compact and cfg.problem.name != 'knapsack':
+        raise ValueError(f'The compact BDD is only available for knapsack, not {cfg.problem.name}')
 
     # Create configuration space
     cs = get_config_space(width=cfg.width)
@@ -82,10 +159,13 @@ def main(cfg):
         'cs': cs,
         'deterministic': 'true',
         'run_obj': 'runtime',
-        'algo': f'python {Path(__file__).parent}/smac_worker.py',
         'cutoff_time': cfg.cutoff_time,
         'wallclock_limit': cfg.wallclock_limit
     }
+    if cfg.tae == 'script':
+        base_scenario_dict['algo'] = f'python {Path(__file__).parent}/smac_worker.py'
+    elif cfg.tae != 'func':
+        raise ValueError(f'Invalid target algorithm evaluator: {cfg.tae}')
 
     print(path.module)
     # Check paths
@@ -98,9 +178,17 @@ def main(cfg):
     if cfg.mode == 'SmacI':
         # Hack to provide one instance dataset to smac
         dataset = [[files[i]] for i in range(cfg.num_instances)]
-        for instance in dataset:
-            # [[instance]]
-            run_smac([instance], base_scenario_dict, cfg)
+        # Each SMAC run evaluates up to trial_workers trials at a time
+        n_workers = get_n_workers(cfg.n_jobs, mem_limit=cfg.mem_limit * get_procs_per_run(cfg),
+                                  mem_budget=cfg.mem_budget)
+        n_workers = max(1, min(n_workers, os.cpu_count() // cfg.trial_workers, len(dataset)))
+        if n_workers > 1:
+            print(f'Labeling {len(dataset)} instances with {n_workers} workers')
+            run_smac_parallel(dataset, base_scenario_dict, cfg, n_workers)
+        else:
+            for instance in dataset:
+                # [[instance]]
+                run_smac([instance], base_scenario_dict, cfg)
     elif cfg.mode == 'SmacD':
         dataset = [[file] for file in files]
         # [[instance_1], [instance_2]]
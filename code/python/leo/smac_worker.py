@@ -6,7 +6,7 @@ import sys
 
 sys.path.insert(0, os.environ.get('module_path'))
 from leo.utils.bdd import run_bdd_builder
-from leo.utils.data import read_data_from_file
+from leo.utils.instance import load_instance
 from leo.utils.order import get_variable_order
 
 
@@ -19,7 +19,7 @@ def run_target_algorithm(instance, cutoff, property_weights, log=True):
 
     inst_path = pathlib.Path(instance)
     acronym = inst_path.stem.split('_')[0]
-    data = read_data_from_file(acronym, instance)
+    data = load_instance(acronym, instance)
     order = get_variable_order(data=data, property_weights=property_weights, reverse=True)[0]
 
     # Prepare the call string to bin_path
@@ -28,12 +28,13 @@ def run_target_algorithm(instance, cutoff, property_weights, log=True):
     bin_path = os.environ.get('bin_path')
     bin_name = os.environ.get('bin_name')
     mem_limit = float(os.environ.get('mem_limit'))
+    compact = os.environ.get('compact', '0') == '1'
 
     status, runtime = run_bdd_builder(instance, order,
                                       prob_id=prob_id, preprocess=preprocess,
                                       bin_path=bin_path, bin_name=bin_name,
                                       time_limit=cutoff, get_runtime=True,
-                                      mem_limit=mem_limit)
+                                      mem_limit=mem_limit, compact=compact)
 
     print(f"Result for SMAC: {status}, {runtime}, 0, 0, 0")
 
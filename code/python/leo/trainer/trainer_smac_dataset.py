@@ -4,13 +4,13 @@ import logging
 import pandas as pd
 
 from leo import path
-from leo.utils.data import read_data_from_file
+from leo.utils.instance import load_instance
 from leo.utils.metrics import eval_learning_metrics
 from leo.utils.metrics import eval_order_metrics
 from leo.utils.metrics import eval_rank_metrics
 from leo.utils.order import get_variable_order
 from leo.utils.order import get_variable_rank
-from leo.utils.order import get_variable_score_from_weights
+from leo.utils.order import get_variable_scores
 from .trainer import Trainer
 
 log = logging.getLogger(__name__)
@@ -104,7 +104,7 @@ class SmacDTrainer(Trainer):
         self._save_results()
 
     def _get_split_scores(self, split='train'):
-        scores = []
+        data_lst = []
 
         for name in self.ps[split]['names']:
             acronym, _, a, b, pid = name.split("_")
@@ -112,7 +112,7 @@ class SmacDTrainer(Trainer):
                 size = f'{a}_{b}'
 
                 inst = self.inst_root_path / size / split / f'{name}.dat'
-                data = read_data_from_file(acronym, inst)
-                scores.append(get_variable_score_from_weights(data, self.incb))
+                data_lst.append(load_instance(acronym, inst))
 
-        return scores
+        # Score the whole split under the SmacD incumbent at once
+        return get_variable_scores(data_lst, self.incb)
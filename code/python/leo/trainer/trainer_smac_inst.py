@@ -1,12 +1,10 @@
-import ast
-
-import pandas as pd
-
 from leo import path
-from leo.utils.data import read_data_from_file
+from leo.utils.instance import load_instance
+from leo.utils.label import LabelStore
+from leo.utils.label import MIN_WEIGHT_INCUMBENT
 from leo.utils.order import get_variable_order
 from leo.utils.order import get_variable_rank
-from leo.utils.order import get_variable_score_from_weights
+from leo.utils.order import get_variable_scores
 from .trainer import Trainer
 
 
@@ -17,13 +15,7 @@ class SmacITrainer(Trainer):
         self.inst_root_path = path.instances / cfg.problem.name
         self.label_path = path.label / cfg.problem.name / cfg.problem.size
         self.label_path = self.label_path / f'label_{cfg.problem.size}.csv'
-        self.min_weight_incb = {'avg_value': 0.0,
-                                'avg_value_by_weight': 0.0,
-                                'max_value': 0.0,
-                                'max_value_by_weight': 0.0,
-                                'min_value': 0.0,
-                                'min_value_by_weight': 0.0,
-                                'weight': -1.0}
+        self.min_weight_incb = MIN_WEIGHT_INCUMBENT
         if self.rs is None:
             self.rs = self._get_results_store()
             self.rs['task'] = self.cfg.task
@@ -78,22 +70,16 @@ class SmacITrainer(Trainer):
         return names, n_items, sample_weights
 
     def _get_split_scores(self, split='train'):
-        scores = []
-        df = pd.read_csv(self.label_path)
+        data_lst, incbs = [], []
+        labels = LabelStore.load(self.label_path)
         for name in self.ps[split]['names']:
             acronym, _, a, b, pid = name.split("_")
             if acronym == 'kp':
                 size = f'{a}_{b}'
 
                 inst = self.inst_root_path / size / split / f'{name}.dat'
-                data = read_data_from_file(acronym, inst)
-
-                df1 = df.query(f"pid == '{pid}'")
-                if df1.shape[0]:
-                    incb = ast.literal_eval(df1.iloc[0]['incb'])
-                else:
-                    incb = self.min_weight_incb
-
-                scores.append(get_variable_score_from_weights(data, incb))
+                data_lst.append(load_instance(acronym, inst))
+                incbs.append(labels.get_weights(pid, default=self.min_weight_incb))
 
-        return scores
+        # Score each instance under its own label at once
+        return get_variable_scores(data_lst, incbs)
@@ -1,15 +1,31 @@
 import hashlib
+import importlib
 import random
 from operator import itemgetter
 
 import numpy as np
-import torch
 
-from .const import numpy_dataset_paths
-from .data import read_data_from_file
-from .metrics import eval_learning_metrics, eval_order_metrics
-from .order import get_variable_rank
-from .order import property_weight_dict2array
+# Heavy submodules (torch, sklearn, scipy, pandas) are only imported when one of
+# their members is first accessed, so that light users such as the SMAC worker
+# only pay for numpy.
+_lazy_members = {
+    'numpy_dataset_paths': '.const',
+    'load_instance': '.instance',
+    'read_data_from_file': '.instance',
+    'eval_learning_metrics': '.metrics',
+    'eval_order_metrics': '.metrics',
+    'get_variable_rank': '.order',
+    'property_weight_dict2array': '.order',
+}
+
+
+def __getattr__(name):
+    if name in _lazy_members:
+        member = getattr(importlib.import_module(_lazy_members[name], __name__), name)
+        globals()[name] = member
+        return member
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
 
 
 class Factory:
@@ -32,6 +48,8 @@ def hashit(x):
 
 
 def set_seed(seed):
+    import torch
+
     np.random.seed(seed)
     torch.manual_seed(seed)
     torch.cuda.manual_seed(seed)
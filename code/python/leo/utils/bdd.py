@@ -1,7 +1,12 @@
+import json
 import logging
 import os
-import resource
-from subprocess import Popen, PIPE, TimeoutExpired
+import select
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from subprocess import Popen, PIPE, DEVNULL, TimeoutExpired
 
 import numpy as np
 
@@ -9,70 +14,411 @@ log = logging.getLogger(__name__)
 
 NUM_TOKENS = 13
 
+# Version of the record printed by the binary with --output=json. The num_comparisons of version 1
+# records are not comparable with those of version 2
+RESULT_RECORD_VERSION = 2
+# Scalar fields of the record, in the order of the Solved: line
+RESULT_FIELDS = ['num_pareto_sol', 'initial_width', 'reduced_width', 'initial_node_count', 'reduced_node_count',
+                 'initial_arcs_count', 'reduced_arcs_count', 'initial_avg_in_degree', 'reduced_avg_in_degree',
+                 'num_comparisons', 'compilation_time', 'reduction_time', 'pareto_time']
+# Per-layer fields of the record
+RESULT_LAYER_FIELDS = ['initial_layer_nodes', 'reduced_layer_nodes', 'layer_pareto']
 
-def limit_virtual_memory():
-    # Maximal virtual memory for subprocesses (in bytes).
-    # MAX_VIRTUAL_MEMORY = 1 * 1024 * 1024 * 1024  # 1 GB
-    mvm = int(os.environ.get('MAX_VIRTUAL_MEMORY'))
-    # The tuple below is of the form (soft limit, hard limit). Limit only
-    # the soft part so that the limit can be increased later (setting also
-    # the hard limit would prevent that).
-    # When the limit cannot be changed, setrlimit() raises ValueError.
-    resource.setrlimit(resource.RLIMIT_AS, (mvm, mvm))
+# Version of the record printed by the binary with --stats-only --output=json
+STATS_RECORD_VERSION = 1
+# Scalar fields of the stats record, which has no pareto set fields
+STATS_FIELDS = ['initial_width', 'reduced_width', 'initial_node_count', 'reduced_node_count', 'initial_arcs_count',
+                'reduced_arcs_count', 'initial_avg_in_degree', 'reduced_avg_in_degree', 'compilation_time',
+                'reduction_time']
+# Per-layer fields of the stats record
+STATS_LAYER_FIELDS = ['initial_layer_nodes', 'reduced_layer_nodes']
+
+# Evaluation kinds. pareto: enumerate the Pareto frontier, stats: only compile and reduce the BDD
+EVAL_KINDS = ['pareto', 'stats']
+
+
+def get_n_workers(n_jobs=0, mem_limit=16, mem_budget=None, threads=1):
+    """Number of BDD processes that fit the core and memory budget.
+    n_jobs <= 0 uses all cores. mem_budget (in GB) defaults to the physical memory.
+    Each process uses `threads` cores."""
+    n_cpus = max(1, os.cpu_count() // max(1, threads))
+    n_jobs = n_cpus if n_jobs is None or n_jobs <= 0 else min(n_jobs, n_cpus)
+    if mem_budget is None:
+        mem_budget = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') / (1024 ** 3)
+    if mem_limit is not None and mem_limit > 0:
+        n_jobs = min(n_jobs, int(mem_budget // mem_limit))
+
+    return max(1, n_jobs)
+
+
+def get_failure_record(value, kind='pareto', compact=False):
+    """Record of a failed run. As in the text output, all scalar fields hold the time limit or -1"""
+    if kind == 'stats':
+        record = {'version': STATS_RECORD_VERSION, 'kind': kind}
+        record.update({field: value for field in STATS_FIELDS})
+        record.update({field: [] for field in STATS_LAYER_FIELDS})
+    else:
+        record = {'version': RESULT_RECORD_VERSION}
+        record.update({field: value for field in RESULT_FIELDS})
+        record.update({field: [] for field in RESULT_LAYER_FIELDS})
+    if compact:
+        record['compact'] = True
+    record['peak_rss_kb'] = -1
+
+    return record
+
+
+def get_record_version(kind='pareto'):
+    """Version of the record printed by the binary for an evaluation kind"""
+    return STATS_RECORD_VERSION if kind == 'stats' else RESULT_RECORD_VERSION
+
+
+def check_kind(kind, output):
+    if kind not in EVAL_KINDS:
+        raise ValueError(f'Invalid evaluation kind: {kind}')
+    # The stats kind only has a JSON schema
+    if kind == 'stats' and output != 'json':
+        raise ValueError(f'Invalid output for the stats kind: {output}')
+
+
+def parse_bdd_output(stdout, get_runtime=False, output='json', kind='pareto', compact=False):
+    """Parse the result printed by the binary into (status, result).
+    With output='json' the result is the record printed by the binary, otherwise the
+    values of the `Solved:` line followed by the Pareto set size per layer. With kind='stats'
+    the record holds the BDD size statistics and the runtime excludes the Pareto set. With
+    compact=True the record must be one of the compact BDD."""
+    record = None
+    if output == 'json':
+        for line in stdout.split('\n'):
+            if line.startswith('{'):
+                record = json.loads(line)
+        if record is not None:
+            version = get_record_version(kind)
+            if record.get('kind', 'pareto') != kind:
+                raise ValueError(f"Invalid result record kind: {record.get('kind', 'pareto')}")
+            if record['version'] != version:
+                raise ValueError(f"Invalid result record version: {record['version']}")
+            if record.get('compact', False) != compact:
+                raise ValueError(f"Invalid result record representation: compact={record.get('compact', False)}")
+
+    if record is not None:
+        runtime = record['compilation_time'] + record['reduction_time'] + record.get('pareto_time', 0)
+        result = runtime if get_runtime else record
+        log.info(f'Run time: {runtime}')
+
+        return 'SUCCESS', result
+
+    if output != 'json' and len(stdout) and 'Solved' in stdout:
+        # Sum the last three floating points to calculate the total time
+        # This is binary dependent and can change
+        blobs = stdout.strip().split('Solved:')[1].split('#')
+
+        # blob = stdout[7:].split("#")
+        result = list(map(float, blobs[0].strip().split(',')))
+        runtime = np.sum(result[-3:])
+        if get_runtime:
+            result = runtime
+        else:
+            result.append(blobs[1].strip())
+        log.info(f'Run time: {runtime}')
+
+        return 'SUCCESS', result
+
+    # The binary reports when it runs out of memory. Any other failure (crash,
+    # killed process, invalid order) stops the parameter optimization process
+    # using the ABORT signal
+    status = 'MEMOUT' if 'Error: out of memory' in stdout else 'ABORT'
+    log.info(status)
+    if get_runtime:
+        return status, -1
+
+    if output != 'json':
+        return status, [-1] * NUM_TOKENS
+
+    return status, get_failure_record(-1, kind=kind, compact=compact)
+
+
+def get_timeout_result(time_limit, get_runtime=False, output='json', kind='pareto', compact=False):
+    log.info('TIMEOUT')
+    if get_runtime:
+        return 'TIMEOUT', time_limit
+    if output != 'json':
+        return 'TIMEOUT', [time_limit] * NUM_TOKENS
+
+    return 'TIMEOUT', get_failure_record(time_limit, kind=kind, compact=compact)
+
+
+def result2runtime(status, result):
+    """Runtime of a full result, as returned with get_runtime=True"""
+    if type(result) == dict:
+        # Failure records hold the time limit or -1 in every field
+        if status != 'SUCCESS':
+            return result['compilation_time']
+
+        return result['compilation_time'] + result['reduction_time'] + result.get('pareto_time', 0)
+
+    if status == 'SUCCESS':
+        return np.sum(result[-4:-1])
+
+    # Time limit for TIMEOUT, -1 for MEMOUT and ABORT
+    return result[0]
+
+
+def get_fidelity_key(bdd_type=0, max_width=0, kind='pareto', threads=1, compact=False):
+    """Cache key fields of the BDD type and evaluation kind. Pareto frontiers also hold the record
+    version, so that results of an older version are not reused. Results of the compact BDD have
+    other runtimes and numbers of comparisons, and are kept apart"""
+    key = {} if bdd_type == 0 else {'bdd_type': bdd_type, 'max_width': max_width}
+    if compact:
+        key['compact'] = True
+    if kind != 'pareto':
+        key['kind'] = kind
+    else:
+        key['version'] = RESULT_RECORD_VERSION
+        if threads > 1:
+            # Same result, but not the same runtime
+            key['threads'] = threads
+
+    return key
+
+
+def run_cached(cache, key, evaluate, time_limit, mem_limit, get_runtime=False):
+    """Look up `key` in the cache and call `evaluate` to get the full (status, result) on a miss"""
+    cached = cache.get(key, time_limit, mem_limit)
+    if cached is None:
+        status, result = evaluate()
+        cache.put(key, status, result, time_limit, mem_limit)
+    else:
+        log.info(f'Cache hit: {cached[0]}')
+        status, result = cached
+
+    return status, result2runtime(status, result) if get_runtime else result
 
 
 def run_bdd_builder(instance, order, prob_id=None, preprocess=None, bin_path=None,
-                    bin_name='multiobj', time_limit=60, get_runtime=False, mem_limit=16):
+                    bin_name='multiobj', time_limit=60, get_runtime=False, mem_limit=16, cache=None,
+                    output='json', bdd_type=0, max_width=0, kind='pareto', threads=1, compact=False):
+    """Build the BDD of `instance` using `order` and enumerate its Pareto frontier.
+    bdd_type=0 builds the exact BDD, bdd_type=1 the BDD restricted to `max_width` nodes per layer,
+    a cheap approximation used to screen orders. kind='stats' skips the Pareto frontier and returns
+    the size statistics of the BDD, see STATS_FIELDS. With `threads` > 1, the nodes of every layer
+    are merged in parallel by the binary, with the same result. With `compact` (knapsack only), the
+    binary stores the BDD as arrays, which takes less memory and gives another number of comparisons."""
+    check_kind(kind, output)
     # Set default mem limit to 16GB
     if type(mem_limit) != int:
         mem_limit = 16
 
+    if cache is not None:
+        key = cache.get_key(instance, order, prob_id, preprocess, f'{bin_path}/{bin_name}', output=output,
+                            **get_fidelity_key(bdd_type, max_width, kind, threads, compact))
+        evaluate = partial(run_bdd_builder, instance, order, prob_id=prob_id, preprocess=preprocess,
+                           bin_path=bin_path, bin_name=bin_name, time_limit=time_limit, mem_limit=mem_limit,
+                           output=output, bdd_type=bdd_type, max_width=max_width, kind=kind, threads=threads,
+                           compact=compact)
+
+        return run_cached(cache, key, evaluate, time_limit, mem_limit, get_runtime=get_runtime)
+
     order_string = ' '.join(map(str, order))
     binary = f'{bin_path}/{bin_name}'
-    cmd = f'{binary} {instance} {prob_id} {preprocess} {len(order)} {order_string}'
-    # Maximal virtual memory for subprocesses (in bytes).
-    os.environ['MAX_VIRTUAL_MEMORY'] = str(int(mem_limit) * (1024 ** 3))
+    cmd = f'{binary} {instance} {prob_id} {preprocess} {bdd_type} {max_width} {len(order)} {order_string} ' \
+          f'--output={output}'
+    # The frontier itself is never read, only its size and statistics
+    cmd += ' --stats-only' if kind == 'stats' else ' --solutions=objectives'
+    if kind == 'pareto' and threads > 1:
+        cmd += f' --threads={threads}'
+    if compact:
+        cmd += ' --compact'
+    # The binary limits its own address space (in GB) before reading the instance. Unlike preexec_fn,
+    # this is safe when the subprocess is started from a thread
+    cmd += f' --memlimit={mem_limit}'
     log.info(f'Executing: {cmd}')
-    log.info(f"Memory limit: {os.environ.get('MAX_VIRTUAL_MEMORY')}")
 
-    status = 'SUCCESS'
     try:
-        preexec_fn = None if mem_limit is None else limit_virtual_memory
-        io = Popen(cmd.split(' '), stdout=PIPE, stderr=PIPE, preexec_fn=preexec_fn)
+        io = Popen(cmd.split(' '), stdout=PIPE, stderr=PIPE)
 
         # Call target algorithm with cutoff time
         (stdout_, stderr_) = io.communicate(timeout=time_limit)
 
         # Decode and parse output
         stdout, stderr = stdout_.decode('utf-8'), stderr_.decode('utf-8')
-        if len(stdout) and 'Solved' in stdout:
-            # Sum the last three floating points to calculate the total time
-            # This is binary dependent and can change
-            blobs = stdout.strip().split('Solved:')[1].split('#')
-
-            # blob = stdout[7:].split("#")
-            result = list(map(float, blobs[0].strip().split(',')))
-            runtime = np.sum(result[-3:])
-            if get_runtime:
-                result = runtime
+        status, result = parse_bdd_output(stdout, get_runtime=get_runtime, output=output, kind=kind,
+                                          compact=compact)
+
+    except TimeoutExpired:
+        # Do not leave the binary running in the background
+        io.kill()
+        io.communicate()
+        status, result = get_timeout_result(time_limit, get_runtime=get_runtime, output=output, kind=kind,
+                                            compact=compact)
+
+    return status, result
+
+
+class BDDWorker:
+    """A multiobj process in batch mode, bound to the instance it was started with"""
+
+    def __init__(self, instance, prob_id=None, preprocess=None, bin_path=None, bin_name='multiobj', mem_limit=16,
+                 output='json', bdd_type=0, max_width=0, kind='pareto', threads=1, compact=False):
+        self.instance = instance
+        cmd = [f'{bin_path}/{bin_name}', str(instance), str(prob_id), str(preprocess), str(bdd_type), str(max_width),
+               '--batch', f'--output={output}']
+        cmd.append('--stats-only' if kind == 'stats' else '--solutions=objectives')
+        if kind == 'pareto' and threads > 1:
+            cmd.append(f'--threads={threads}')
+        if compact:
+            cmd.append('--compact')
+        if mem_limit is not None:
+            # The limit holds for every order of the worker
+            cmd.append(f'--memlimit={mem_limit}')
+        log.info(f"Starting worker: {' '.join(cmd)}")
+        self.io = Popen(cmd, stdin=PIPE, stdout=PIPE, stderr=DEVNULL)
+        self.buffer = b''
+
+    def is_alive(self):
+        return self.io.poll() is None
+
+    def evaluate(self, order, time_limit):
+        """Send one order and wait for its result line.
+        Returns None if the time limit is hit and raises EOFError if the process died."""
+        try:
+            self.io.stdin.write(f"{len(order)} {' '.join(map(str, order))}\n".encode('utf-8'))
+            self.io.stdin.flush()
+        except BrokenPipeError:
+            raise EOFError
+
+        fd = self.io.stdout.fileno()
+        deadline = time.monotonic() + time_limit
+        while True:
+            while b'\n' not in self.buffer:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not len(select.select([fd], [], [], remaining)[0]):
+                    return None
+
+                chunk = os.read(fd, 1 << 16)
+                if not len(chunk):
+                    raise EOFError
+                self.buffer += chunk
+
+            line, self.buffer = self.buffer.split(b'\n', 1)
+            line = line.decode('utf-8')
+            # Skip the messages printed while reading the instance
+            if 'Solved:' in line or 'Stats:' in line or line.startswith('{') or line.startswith('Error'):
+                return line
+
+    def close(self):
+        if self.is_alive():
+            self.io.kill()
+        self.io.communicate()
+
+
+class BDDWorkerPool:
+    """Keep `n_workers` multiobj processes in batch mode warm.
+
+    Each worker reads the instance once and then evaluates orders sent over stdin. A worker is
+    restarted when it dies (e.g. memory limit), when it hits the time limit of a request (the binary
+    cannot be interrupted) or when it is needed for another instance. `run` has the same signature
+    and return value as `run_bdd_builder` and can be called from several threads. Results are looked
+    up in and stored to `cache`, a BDDResultCache, if given. All workers build the same BDD type.
+    """
+
+    def __init__(self, prob_id=None, preprocess=None, bin_path=None, bin_name='multiobj', n_workers=1,
+                 mem_limit=16, cache=None, output='json', bdd_type=0, max_width=0, kind='pareto', threads=1,
+                 compact=False):
+        check_kind(kind, output)
+        self.worker_kwargs = {'prob_id': prob_id, 'preprocess': preprocess, 'bin_path': bin_path,
+                              'bin_name': bin_name, 'mem_limit': mem_limit, 'output': output,
+                              'bdd_type': bdd_type, 'max_width': max_width, 'kind': kind, 'threads': threads,
+                              'compact': compact}
+        self.n_workers = n_workers
+        self.cache = cache
+        # Idle slots, holding either a started worker or None
+        self.idle = [None] * n_workers
+        self.lock = threading.Condition()
+
+    def acquire(self, instance):
+        with self.lock:
+            while not len(self.idle):
+                self.lock.wait()
+
+            # Prefer a worker that already read the instance, then an empty slot
+            idx = 0
+            for i, worker in enumerate(self.idle):
+                if worker is not None and worker.instance == instance:
+                    idx = i
+                    break
+                if worker is None:
+                    idx = i
+
+            return self.idle.pop(idx)
+
+    def release(self, worker):
+        with self.lock:
+            self.idle.append(worker)
+            self.lock.notify()
+
+    def run(self, instance, order, time_limit=60, get_runtime=False):
+        instance = str(instance)
+        if self.cache is not None:
+            kw = self.worker_kwargs
+            key = self.cache.get_key(instance, order, kw['prob_id'], kw['preprocess'],
+                                     f"{kw['bin_path']}/{kw['bin_name']}", output=kw['output'],
+                                     **get_fidelity_key(kw['bdd_type'], kw['max_width'], kw['kind'], kw['threads'],
+                                                        kw['compact']))
+            evaluate = partial(self.evaluate, instance, order, time_limit)
+
+            return run_cached(self.cache, key, evaluate, time_limit, kw['mem_limit'], get_runtime=get_runtime)
+
+        status, result = self.evaluate(instance, order, time_limit)
+
+        return status, result2runtime(status, result) if get_runtime else result
+
+    def evaluate(self, instance, order, time_limit):
+        """Evaluate the order on a worker and return the full (status, result)"""
+        worker = self.acquire(instance)
+        try:
+            if worker is not None and (worker.instance != instance or not worker.is_alive()):
+                worker.close()
+                worker = None
+            if worker is None:
+                worker = BDDWorker(instance, **self.worker_kwargs)
+
+            try:
+                stdout = worker.evaluate(order, time_limit)
+            except EOFError:
+                stdout = ''
+                worker.close()
+                worker = None
+
+            if stdout is None:
+                worker.close()
+                worker = None
+                status, result = get_timeout_result(time_limit, output=self.worker_kwargs['output'],
+                                                    kind=self.worker_kwargs['kind'],
+                                                    compact=self.worker_kwargs['compact'])
             else:
-                result.append(blobs[1].strip())
-            log.info(f'Run time: {runtime}')
+                status, result = parse_bdd_output(stdout, output=self.worker_kwargs['output'],
+                                                  kind=self.worker_kwargs['kind'],
+                                                  compact=self.worker_kwargs['compact'])
+        finally:
+            self.release(worker)
 
-        else:
-            # If the instance is not solved successfully on the cluster, we either hit the
-            # runtime limit or memory limit. In either of the two cases, we will not be
-            # allowed to run more instances. Hence, we stop the parameter optimization
-            # process using the ABORT signal
-            log.info('MEMOUT/ABORT')
+        return status, result
 
-            status = 'ABORT'
-            result = -1 if get_runtime else [-1] * NUM_TOKENS
+    def map(self, instance, orders, time_limit=60, get_runtime=False):
+        with ThreadPoolExecutor(max_workers=self.n_workers) as executor:
+            return list(executor.map(lambda order: self.run(instance, order, time_limit=time_limit,
+                                                            get_runtime=get_runtime), orders))
 
-    except TimeoutExpired:
-        log.info('TIMEOUT')
+    def close(self):
+        with self.lock:
+            for worker in self.idle:
+                if worker is not None:
+                    worker.close()
+            self.idle = [None] * self.n_workers
 
-        status = 'TIMEOUT'
-        result = time_limit if get_runtime else [time_limit] * NUM_TOKENS
+    def __enter__(self):
+        return self
 
-    return status, result
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
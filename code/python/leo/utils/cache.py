@@ -0,0 +1,221 @@
+import hashlib
+import json
+import logging
+import os
+import platform
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+from .bdd import get_timeout_result
+from .bdd import result2runtime
+
+log = logging.getLogger(__name__)
+
+# Statuses stored in the cache. The other failures may not happen again
+CACHED_STATUSES = ['SUCCESS', 'TIMEOUT', 'MEMOUT']
+
+# Content hashes of instance and binary files, keyed by (path, size, mtime)
+_file_hashes = {}
+
+
+@lru_cache(maxsize=None)
+def get_host_id():
+    """Host name and CPU model. Runtimes measured on another machine are not reused"""
+    cpu = platform.processor()
+    try:
+        with open('/proc/cpuinfo') as fp:
+            for line in fp:
+                if line.startswith('model name'):
+                    cpu = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+
+    return f'{platform.node()}/{cpu}'
+
+
+def hash_file(file_path):
+    st = os.stat(file_path)
+    file_key = (str(file_path), st.st_size, st.st_mtime_ns)
+    if file_key not in _file_hashes:
+        h = hashlib.blake2s(digest_size=32)
+        with open(file_path, 'rb') as fp:
+            for chunk in iter(lambda: fp.read(1 << 20), b''):
+                h.update(chunk)
+        _file_hashes[file_key] = h.hexdigest()
+
+    return _file_hashes[file_key]
+
+
+class BDDResultCache:
+    """Persistent cache of BDD evaluations stored in an SQLite database.
+
+    Entries are keyed by the content hash of the instance, the order, the problem id, the preprocess
+    flag, the content hash of the binary and the host and CPU model. The load of the machine is not
+    part of the key, so runtimes measured under another load are reused. SUCCESS results are always reused, TIMEOUT entries only
+    if the requested time limit is not larger than the one they were obtained with, and MEMOUT
+    entries only if the requested memory limit is not larger. Other failures (ABORT: crash, killed
+    binary) are not stored, so they are evaluated again. The database runs in WAL
+    mode, so many worker processes can read and write it concurrently. When `max_entries` is set, the
+    least recently used entries are evicted.
+
+    Lookups do not write to the database. The hit and miss counters and the access times of the hits
+    are kept in memory and written in one transaction by `flush`, which `stats` and `close` call.
+    """
+
+    def __init__(self, db_path, max_entries=None, busy_timeout=60):
+        self.db_path = str(db_path)
+        self.max_entries = max_entries
+        self.busy_timeout = busy_timeout
+        self.hits, self.misses = 0, 0
+        # Counts and accessed keys not written to the database yet
+        self.pending = {'hits': 0, 'misses': 0}
+        self.accessed = set()
+
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.connect()
+
+    def __getstate__(self):
+        # Connections are opened again on first use in the unpickled copy
+        state = self.__dict__.copy()
+        del state['local'], state['lock']
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        # The pending counts are flushed by the original
+        self.pending = {'hits': 0, 'misses': 0}
+        self.accessed = set()
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def connect(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, status TEXT, result TEXT, '
+                         'time_limit REAL, mem_limit REAL, last_access REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS results_last_access ON results (last_access)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0), ('misses', 0)")
+            self.local.conn = conn
+
+        return conn
+
+    @staticmethod
+    def get_key(instance, order, prob_id, preprocess, binary, **kwargs):
+        key = {'instance': hash_file(instance),
+               'order': list(map(int, order)),
+               'prob_id': str(prob_id),
+               'preprocess': str(preprocess),
+               'binary': hash_file(binary),
+               'host': get_host_id()}
+        key.update({k: str(v) for k, v in kwargs.items()})
+
+        return hashlib.blake2s(json.dumps(key, sort_keys=True).encode('utf-8'), digest_size=32).hexdigest()
+
+    def count(self, name, key=None):
+        with self.lock:
+            if name == 'hits':
+                self.hits += 1
+                self.accessed.add(key)
+            else:
+                self.misses += 1
+            self.pending[name] += 1
+
+    def flush(self):
+        """Write the pending counts and the access times of the hits in one transaction"""
+        with self.lock:
+            pending, accessed = self.pending, self.accessed
+            self.pending, self.accessed = {'hits': 0, 'misses': 0}, set()
+        if not any(pending.values()) and not len(accessed):
+            return
+
+        conn = self.connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany('UPDATE counters SET value = value + ? WHERE name = ?',
+                             [(value, name) for name, value in pending.items()])
+            conn.executemany('UPDATE results SET last_access = ? WHERE key = ?', [(now, key) for key in accessed])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+
+    def get(self, key, time_limit, mem_limit=None):
+        """Returns the cached (status, result) valid under the given limits, or None"""
+        conn = self.connect()
+        row = conn.execute('SELECT status, result, time_limit, mem_limit FROM results WHERE key = ?',
+                           (key,)).fetchone()
+
+        mem_limit = float('inf') if mem_limit is None else mem_limit
+        hit = None
+        if row is not None:
+            status, result, cached_time_limit, cached_mem_limit = row
+            result = json.loads(result)
+            output = 'json' if type(result) == dict else 'text'
+            kind = result.get('kind', 'pareto') if output == 'json' else 'pareto'
+            compact = result.get('compact', False) if output == 'json' else False
+            if status == 'SUCCESS':
+                # Solved, but not within the requested time limit
+                if result2runtime(status, result) > time_limit:
+                    hit = get_timeout_result(time_limit, output=output, kind=kind, compact=compact)
+                else:
+                    hit = status, result
+            elif status == 'TIMEOUT' and time_limit <= cached_time_limit:
+                hit = get_timeout_result(time_limit, output=output, kind=kind, compact=compact)
+            elif status == 'MEMOUT' and mem_limit <= cached_mem_limit:
+                hit = status, result
+
+        if hit is None:
+            self.count('misses')
+        else:
+            self.count('hits', key)
+
+        return hit
+
+    def put(self, key, status, result, time_limit, mem_limit=None):
+        if status not in CACHED_STATUSES:
+            return
+
+        mem_limit = float('inf') if mem_limit is None else mem_limit
+        conn = self.connect()
+        # A solved entry is never replaced by a failure obtained with tighter limits
+        conn.execute('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT(key) DO UPDATE SET '
+                     'status = excluded.status, result = excluded.result, time_limit = excluded.time_limit, '
+                     'mem_limit = excluded.mem_limit, last_access = excluded.last_access '
+                     "WHERE results.status != 'SUCCESS'",
+                     (key, status, json.dumps(result), time_limit, mem_limit, time.time()))
+
+        if self.max_entries is not None:
+            n_entries = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+            if n_entries > self.max_entries:
+                # Evict down to 90% of the cap so that eviction does not run on every insert
+                n_evict = n_entries - int(0.9 * self.max_entries)
+                conn.execute('DELETE FROM results WHERE key IN '
+                             '(SELECT key FROM results ORDER BY last_access LIMIT ?)', (n_evict,))
+                log.info(f'Evicted {n_evict} entries from {self.db_path}')
+
+    def stats(self):
+        self.flush()
+        conn = self.connect()
+        stats = dict(conn.execute('SELECT name, value FROM counters').fetchall())
+        stats['entries'] = conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+        stats['session_hits'], stats['session_misses'] = self.hits, self.misses
+
+        return stats
+
+    def close(self):
+        self.flush()
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
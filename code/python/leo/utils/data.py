@@ -1,3 +1,6 @@
+import json
+import logging
+import os
 import pickle as pkl
 from pathlib import Path
 
@@ -8,65 +11,68 @@ from sklearn.datasets import load_svmlight_file
 from torch.utils.data.dataset import Dataset
 
 from leo import path
+from .cache import hash_file
+from .instance import read_data_from_file  # noqa: F401
+
+log = logging.getLogger(__name__)
 
 ROOT_PATH = Path(__file__).parent.parent
 
+BINARY_DATASET_VERSION = 1
 
-def read_data_from_file(problem_acronym, file_path):
-    data = {'value': [], 'n_vars': 0, 'n_cons': 1, 'n_objs': 3}
-    raw_data = open(file_path, 'r')
 
-    def parse_knapsack():
-        data['weight'], data['capacity'] = [], 0
+def get_binary_dataset_path(dataset_path):
+    """Binary form of an SVMlight ranking dataset: X.f32 holds the float32 (rows x features) matrix,
+    y.npy the labels, group_offsets.npy the first row of each query and meta.json the shape and the
+    size, mtime and content hash of the text file it was written with."""
+    dataset_path = Path(dataset_path)
 
-        data['n_vars'] = int(raw_data.readline())
-        data['n_objs'] = int(raw_data.readline())
-        for _ in range(data['n_objs']):
-            data['value'].append(list(map(int, raw_data.readline().split())))
-        data['weight'].extend(list(map(int, raw_data.readline().split())))
-        data['capacity'] = int(raw_data.readline().split()[0])
+    return dataset_path.parent / f'{dataset_path.stem}.bin'
 
-    def parse_binproblem():
-        data['cons'], data['cons_mat'] = [], []
 
-        data['n_vars'], data['n_cons'] = list(map(int, raw_data.readline().strip().split()))
-        data['n_objs'] = int(raw_data.readline())
-        for _ in range(data['n_objs']):
-            data['value'].append(list(map(int, raw_data.readline().split())))
-        for _ in range(data['n_cons']):
-            n_vars_per_con = raw_data.readline()
+def get_dataset_source(dataset_path):
+    st = os.stat(dataset_path)
 
-            non_zero_vars_lst = list(map(int, raw_data.readline().strip().split()))
-            data['cons'].append(non_zero_vars_lst)
-            non_zero_vars_lst = np.array(non_zero_vars_lst)
+    return {'size': st.st_size, 'mtime_ns': st.st_mtime_ns, 'blake2s': hash_file(dataset_path)}
 
-            non_zero_vars_lst -= 1
-            cons_mat = np.zeros(data['n_vars'])
-            cons_mat[non_zero_vars_lst] = 1
 
-            data['cons_mat'].append(cons_mat)
-        data['cons_mat'] = np.asarray(data['cons_mat'])
-        data['weight'] = np.sum(data['cons_mat'], axis=0)
-        # Remove cons as we only use cons_mat
-        del data['cons']
+def load_binary_dataset(dataset_path):
+    """Memory-mapped (X, y, group_offsets) of a ranking dataset, or None if there is no binary form
+    or it was not written from the current text file"""
+    bin_path = get_binary_dataset_path(dataset_path)
+    if not bin_path.joinpath('meta.json').exists():
+        return None
 
-        # Remove variables which do not participate in any constraint
-        active_vars = data['weight'] != 0
-        data['n_vars'] = sum(active_vars)
-        data['weight'] = data['weight'][active_vars]
-        data['value'] = np.array(data['value'])[:, active_vars]
-        data['cons_mat'] = data['cons_mat'][:, active_vars]
+    meta = json.loads(bin_path.joinpath('meta.json').read_text())
+    if meta['version'] != BINARY_DATASET_VERSION:
+        log.warning(f'Ignoring binary dataset {bin_path} of version {meta["version"]}')
+        return None
 
-    if problem_acronym == 'kp':
-        parse_knapsack()
+    # Only hash the text file if it was touched since the binary form was written
+    st = os.stat(dataset_path)
+    source = meta['source']
+    if (st.st_size, st.st_mtime_ns) != (source['size'], source['mtime_ns']) and \
+            hash_file(dataset_path) != source['blake2s']:
+        log.warning(f'Ignoring stale binary dataset {bin_path}')
+        return None
 
-    elif problem_acronym == 'bp':
-        parse_binproblem()
+    shape = (meta['n_rows'], meta['n_features'])
+    x = np.memmap(bin_path / 'X.f32', dtype=np.float32, mode='r', shape=shape) if meta['n_rows'] \
+        else np.zeros(shape, dtype=np.float32)
+    y = np.load(bin_path / 'y.npy', mmap_mode='r')
+    group_offsets = np.load(bin_path / 'group_offsets.npy')
 
-    else:
-        raise ValueError('Invalid problem!')
+    return x, y, group_offsets
 
-    return data
+
+def load_ranking_dataset(dataset_path):
+    """(X, y) of an SVMlight ranking dataset, from its binary form when it is up to date. All the
+    features are written explicitly, so the dense matrix holds the same entries as the sparse one."""
+    data = load_binary_dataset(dataset_path)
+    if data is not None:
+        return data[0], data[1]
+
+    return load_svmlight_file(str(dataset_path))
 
 
 def load_svmlight_data_for_xgb(files, split_types, file_types):
@@ -75,7 +81,7 @@ def load_svmlight_data_for_xgb(files, split_types, file_types):
     for st in split_types:
         for ft in file_types:
             if ft == 'dataset':
-                data[st, ft] = load_svmlight_file(str(files[i])) if files[i].exists() else None
+                data[st, ft] = load_ranking_dataset(files[i]) if files[i].exists() else None
             elif ft == 'n_items':
                 data[st, ft] = list(map(int, files[i].read_text().strip().split('\n'))) \
                     if files[i].exists() else None
@@ -109,7 +115,7 @@ def load_dataset(cfg):
                     data[st, ft] = data[st, ft] if data[st, ft].exists() else None
                     if data[st, ft] is not None:
                         if ft == 'dataset':
-                            data[st, ft] = load_svmlight_file(str(data[st, ft]))
+                            data[st, ft] = load_ranking_dataset(data[st, ft])
                         elif ft == 'n_items':
                             data[st, ft] = list(map(int, data[st, ft].read_text().strip().split('\n')))
                         elif ft == 'names':
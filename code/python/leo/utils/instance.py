@@ -0,0 +1,259 @@
+import json
+import logging
+import os
+import shutil
+from pathlib import Path
+
+import numpy as np
+
+log = logging.getLogger(__name__)
+
+INSTANCE_STORE_VERSION = 1
+
+# Opened instance stores, keyed by split directory. None if a split has no store.
+_stores = {}
+
+
+def read_data_from_file(problem_acronym, file_path):
+    data = {'value': [], 'n_vars': 0, 'n_cons': 1, 'n_objs': 3}
+    raw_data = open(file_path, 'r')
+
+    def parse_knapsack():
+        data['weight'], data['capacity'] = [], 0
+
+        data['n_vars'] = int(raw_data.readline())
+        data['n_objs'] = int(raw_data.readline())
+        for _ in range(data['n_objs']):
+            data['value'].append(list(map(int, raw_data.readline().split())))
+        data['weight'].extend(list(map(int, raw_data.readline().split())))
+        data['capacity'] = int(raw_data.readline().split()[0])
+
+    def parse_binproblem():
+        n_vars, value, indptr, indices = read_binproblem(file_path)
+        data.update(get_binproblem_data(n_vars, value, indptr, indices))
+
+    if problem_acronym == 'kp':
+        parse_knapsack()
+
+    elif problem_acronym == 'bp':
+        parse_binproblem()
+
+    else:
+        raise ValueError('Invalid problem!')
+
+    raw_data.close()
+
+    return data
+
+
+def read_binproblem(file_path):
+    """Raw bin-problem instance: the number of variables, the values (objectives x variables) and the
+    constraints in CSR form, i.e. the 0-based variable ids of constraint i are indices[indptr[i]:indptr[i + 1]]"""
+    with open(file_path, 'r') as fp:
+        n_vars, n_cons = list(map(int, fp.readline().strip().split()))
+        n_objs = int(fp.readline())
+        value = [list(map(int, fp.readline().split())) for _ in range(n_objs)]
+
+        indptr, indices = [0], []
+        for _ in range(n_cons):
+            # Number of variables in the constraint
+            fp.readline()
+            indices.extend([v - 1 for v in map(int, fp.readline().strip().split())])
+            indptr.append(len(indices))
+
+    return n_vars, value, np.asarray(indptr), np.asarray(indices, dtype=int)
+
+
+def get_binproblem_data(n_vars, value, indptr, indices):
+    """Bin-problem data from the raw CSR constraints. The weight of a variable is the number of
+    constraints it participates in, counted once per constraint, and the variables which do not
+    participate in any constraint are removed."""
+    n_cons = len(indptr) - 1
+    # A variable listed twice in a constraint still has a unit coefficient
+    rows = np.repeat(np.arange(n_cons), np.diff(indptr))
+    cons_vars = np.unique(rows * n_vars + np.asarray(indices)) % n_vars
+    weight = np.bincount(cons_vars, minlength=n_vars).astype(float)
+
+    # Remove variables which do not participate in any constraint
+    active_vars = weight != 0
+    data = {'n_vars': int(active_vars.sum()),
+            'n_cons': n_cons,
+            'n_objs': len(value),
+            'weight': weight[active_vars],
+            'value': np.asarray(value)[:, active_vars]}
+
+    return data
+
+
+def get_store_path(split_path):
+    """Store of the instances of a split directory, e.g. instances/knapsack/3_60/train.store"""
+    split_path = Path(split_path)
+
+    return split_path.parent / f'{split_path.name}.store'
+
+
+def get_file_stat(file_path):
+    st = os.stat(file_path)
+
+    return [st.st_size, st.st_mtime_ns]
+
+
+def write_instance_store(problem_acronym, split_path):
+    """Pack the .dat instances of a split directory into memory-mappable arrays.
+
+    Knapsack instances are stored as value (instances x objectives x variables), weight (instances x
+    variables) and capacity (instances) arrays. Bin-problem instances are stored as the value array and
+    the constraints in CSR form: cons_offsets gives the constraint rows of each instance in cons_indptr,
+    which points into the 0-based variable ids of cons_indices. The manifest indexes the instances by
+    name and pid and records the size and modification time of each file, to detect stale stores.
+    """
+    split_path = Path(split_path)
+    inst_paths = sorted(split_path.glob('*.dat'))
+    if not len(inst_paths):
+        raise ValueError(f'Invalid split path: no instances in {split_path}')
+
+    arrays = {'value': []}
+    if problem_acronym == 'kp':
+        arrays.update({'weight': [], 'capacity': []})
+        for inst_path in inst_paths:
+            data = read_data_from_file(problem_acronym, inst_path)
+            arrays['value'].append(data['value'])
+            arrays['weight'].append(data['weight'])
+            arrays['capacity'].append(data['capacity'])
+
+    elif problem_acronym == 'bp':
+        arrays.update({'cons_offsets': [0], 'cons_indptr': [0], 'cons_indices': []})
+        for inst_path in inst_paths:
+            _, value, indptr, indices = read_binproblem(inst_path)
+            arrays['value'].append(value)
+            arrays['cons_indptr'].extend(indptr[1:] + len(arrays['cons_indices']))
+            arrays['cons_indices'].extend(indices)
+            arrays['cons_offsets'].append(arrays['cons_offsets'][-1] + len(indptr) - 1)
+
+    else:
+        raise ValueError('Invalid problem!')
+
+    shapes = set(np.shape(value) for value in arrays['value'])
+    if len(shapes) > 1:
+        raise ValueError(f'Invalid split path: instances of different sizes {shapes} in {split_path}')
+    n_objs, n_vars = shapes.pop()
+
+    store_path = get_store_path(split_path)
+    tmp_path = store_path.parent / f'.{store_path.name}.{os.getpid()}'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    tmp_path.mkdir(parents=True)
+    for name, array in arrays.items():
+        np.save(tmp_path / f'{name}.npy', np.asarray(array, dtype=np.int64))
+
+    manifest = {'version': INSTANCE_STORE_VERSION,
+                'acronym': problem_acronym,
+                'n_objs': n_objs,
+                'n_vars': n_vars,
+                'names': [inst_path.stem for inst_path in inst_paths],
+                'pids': [int(inst_path.stem.split('_')[-1]) for inst_path in inst_paths],
+                'files': [get_file_stat(inst_path) for inst_path in inst_paths]}
+    (tmp_path / 'manifest.json').write_text(json.dumps(manifest))
+
+    # Swap the complete store in place of the old one
+    shutil.rmtree(store_path, ignore_errors=True)
+    os.replace(tmp_path, store_path)
+    _stores.pop(str(split_path), None)
+    log.info(f'Wrote {len(inst_paths)} instances to {store_path}')
+
+    return store_path
+
+
+class InstanceStore:
+    """Read-only view of the instances of a split packed by `write_instance_store`.
+
+    The arrays are memory-mapped, so opening a store and getting an instance do not parse or copy
+    anything. Instances are looked up by name (file stem) or pid.
+    """
+
+    def __init__(self, split_path):
+        self.split_path = Path(split_path)
+        self.store_path = get_store_path(split_path)
+
+        manifest = json.loads((self.store_path / 'manifest.json').read_text())
+        if manifest['version'] != INSTANCE_STORE_VERSION:
+            raise ValueError(f'Invalid instance store version {manifest["version"]} in {self.store_path}')
+        self.acronym = manifest['acronym']
+        self.n_objs, self.n_vars = manifest['n_objs'], manifest['n_vars']
+        self.names = manifest['names']
+        self.pids = manifest['pids']
+        self.files = manifest['files']
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.pid_index = {pid: i for i, pid in enumerate(self.pids)}
+
+        self.arrays = {npy_path.stem: np.load(npy_path, mmap_mode='r')
+                       for npy_path in self.store_path.glob('*.npy')}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getattr__(self, name):
+        arrays = self.__dict__.get('arrays', {})
+        if name in arrays:
+            return arrays[name]
+
+        raise AttributeError(f'{type(self).__name__!r} object has no attribute {name!r}')
+
+    def is_stale(self, name=None):
+        """Check the instance files of the split (or only instance `name`) against the manifest"""
+        if name is not None:
+            inst_path = self.split_path / f'{name}.dat'
+            return inst_path.exists() and get_file_stat(inst_path) != self.files[self.index[name]]
+
+        inst_paths = sorted(self.split_path.glob('*.dat'))
+        if [inst_path.stem for inst_path in inst_paths] != self.names:
+            return True
+
+        return any(get_file_stat(inst_path) != stat for inst_path, stat in zip(inst_paths, self.files))
+
+    def get(self, name=None, pid=None):
+        """Instance data in the format of `read_data_from_file`, with array views for the values"""
+        i = self.index[name] if name is not None else self.pid_index[pid]
+        data = {'value': self.value[i], 'n_vars': self.n_vars, 'n_cons': 1, 'n_objs': self.n_objs}
+
+        if self.acronym == 'kp':
+            data['weight'] = self.weight[i]
+            data['capacity'] = int(self.capacity[i])
+
+        elif self.acronym == 'bp':
+            start, end = self.cons_offsets[i], self.cons_offsets[i + 1]
+            indptr = self.cons_indptr[start:end + 1]
+            data = get_binproblem_data(self.n_vars, self.value[i], indptr - indptr[0],
+                                       self.cons_indices[indptr[0]:indptr[-1]])
+
+        return data
+
+
+def get_instance_store(split_path):
+    """Instance store of a split directory, or None if it has none. Stores are opened once per process."""
+    key = str(split_path)
+    if key not in _stores:
+        manifest_exists = get_store_path(split_path).joinpath('manifest.json').exists()
+        _stores[key] = InstanceStore(split_path) if manifest_exists else None
+
+    return _stores[key]
+
+
+def open_instance_store(split_path):
+    """Instance store of a split directory, or None if it does not exist or is stale"""
+    store = get_instance_store(split_path)
+    if store is not None and store.is_stale():
+        log.warning(f'Ignoring stale instance store {store.store_path}')
+        return None
+
+    return store
+
+
+def load_instance(problem_acronym, file_path):
+    """Read an instance from the store of its split if there is one, else parse its .dat file.
+    Only the requested instance file is checked against the store."""
+    file_path = Path(file_path)
+    store = get_instance_store(file_path.parent)
+    if store is not None and file_path.stem in store.index and not store.is_stale(file_path.stem):
+        return store.get(name=file_path.stem)
+
+    return read_data_from_file(problem_acronym, file_path)
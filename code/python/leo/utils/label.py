@@ -0,0 +1,125 @@
+import ast
+import os
+from pathlib import Path
+
+import numpy as np
+
+from .const import KnapsackPropertyWeights
+
+# Incumbent used when an instance has no label, equivalent to the min_weight ordering
+MIN_WEIGHT_INCUMBENT = {'avg_value': 0.0, 'avg_value_by_weight': 0.0, 'max_value': 0.0, 'max_value_by_weight': 0.0,
+                        'min_value': 0.0, 'min_value_by_weight': 0.0, 'weight': -1.0}
+
+# Loaded label stores, keyed by label CSV path
+_label_stores = {}
+
+
+def write_label_store(label_path, pids, seeds, costs, incumbents):
+    """Save labels as typed columns: pid, seed, cost and one float column per property weight. The key
+    order of the incumbents is kept, as the variable scores are accumulated in that order."""
+    names = list(incumbents[0].keys()) if len(incumbents) else [pw.name for pw in KnapsackPropertyWeights]
+    columns = {name: np.asarray([incb[name] for incb in incumbents], dtype=float) for name in names}
+
+    label_path = Path(label_path).with_suffix('.npz')
+    tmp_path = label_path.with_suffix('.tmp.npz')
+    np.savez(tmp_path,
+             pid=np.asarray(pids, dtype=np.int64),
+             seed=np.asarray(seeds, dtype=np.int64),
+             cost=np.asarray(costs, dtype=float),
+             names=np.asarray(names),
+             **{f'weight_{name}': column for name, column in columns.items()})
+    os.replace(tmp_path, label_path)
+
+    return label_path
+
+
+class LabelStore:
+    """Labels (best SMAC incumbent per instance) indexed by pid.
+
+    Reads the typed columns written by `write_label_store` next to the label CSV when they are up to
+    date, and otherwise parses the CSV once. Lookups do not scan or parse anything.
+    """
+
+    def __init__(self, pids, seeds, costs, names, weights):
+        self.pids = np.asarray(pids, dtype=np.int64)
+        self.seeds = np.asarray(seeds, dtype=np.int64)
+        self.costs = np.asarray(costs, dtype=float)
+        self.names = list(names)
+        # Property weights of each label, columns in the order of `names`
+        self.weights = np.asarray(weights, dtype=float).reshape(len(self.pids), len(self.names))
+        self.index = {pid: i for i, pid in enumerate(self.pids.tolist())}
+
+        # Columns in the order of KnapsackPropertyWeights
+        self.columns = [self.names.index(pw.name) for pw in KnapsackPropertyWeights]
+
+    @classmethod
+    def load(cls, csv_path):
+        csv_path = Path(csv_path)
+        npz_path = csv_path.with_suffix('.npz')
+        if npz_path.exists() and (not csv_path.exists() or
+                                  os.stat(npz_path).st_mtime_ns >= os.stat(csv_path).st_mtime_ns):
+            with np.load(npz_path) as npz:
+                names = npz['names'].tolist()
+                weights = np.stack([npz[f'weight_{name}'] for name in names], axis=1) if len(npz['pid']) \
+                    else np.zeros((0, len(names)))
+                return cls(npz['pid'], npz['seed'], npz['cost'], names, weights)
+
+        return cls.from_csv(csv_path)
+
+    @classmethod
+    def from_csv(cls, csv_path):
+        import pandas as pd
+
+        df = pd.read_csv(csv_path)
+        incumbents = [ast.literal_eval(incb) for incb in df['incb'].values]
+        names = list(incumbents[0].keys()) if len(incumbents) else [pw.name for pw in KnapsackPropertyWeights]
+        weights = [[incb[name] for name in names] for incb in incumbents]
+
+        return cls(df['pid'].values, df['seed'].values, df['cost'].values, names, weights)
+
+    def __len__(self):
+        return len(self.pids)
+
+    def __contains__(self, pid):
+        return int(pid) in self.index
+
+    def get_seed(self, pid):
+        return self.seeds[self.index[int(pid)]]
+
+    def get_weights(self, pid, default=None):
+        """Property weights of the label of `pid` as a dict, `default` if it has no label"""
+        i = self.index.get(int(pid))
+        if i is None:
+            if default is None:
+                raise KeyError(f'Missing label for pid {pid}')
+            return default
+
+        return dict(zip(self.names, self.weights[i].tolist()))
+
+    def get_vector(self, pid):
+        """Property weights of the label of `pid` in the order of KnapsackPropertyWeights"""
+        return self.weights[self.index[int(pid)], self.columns]
+
+    def get_matrix(self, pids, default=None):
+        """Property weights of many labels, one row per pid in the order of KnapsackPropertyWeights.
+        Rows of pids without a label are taken from the `default` weights dict, or raise a KeyError."""
+        rows = np.asarray([self.index.get(int(pid), -1) for pid in pids], dtype=int)
+        missing = rows < 0
+        matrix = np.zeros((len(rows), len(self.columns)))
+        matrix[~missing] = self.weights[rows[~missing]][:, self.columns]
+
+        if missing.any():
+            if default is None:
+                raise KeyError(f'Missing labels for pids {np.asarray(pids)[missing].tolist()}')
+            matrix[missing] = [default[pw.name] for pw in KnapsackPropertyWeights]
+
+        return matrix
+
+
+def get_label_store(csv_path):
+    """LabelStore of a label CSV, loaded once per process"""
+    key = str(csv_path)
+    if key not in _label_stores:
+        _label_stores[key] = LabelStore.load(csv_path)
+
+    return _label_stores[key]
@@ -1,12 +1,11 @@
-import ast
 import json
 import random
-from operator import itemgetter
+from functools import reduce
 
 import numpy as np
-import pandas as pd
 
 from .const import KnapsackPropertyWeights
+from .label import get_label_store
 
 
 def property_weight_dict2array(pw_dict, cast_to_numpy=False):
@@ -20,6 +19,101 @@ def property_weight_dict2array(pw_dict, cast_to_numpy=False):
     return lst
 
 
+def pad_scores(scores):
+    """Stack score vectors, possibly of different lengths, into a 2D array padded with zeros.
+    Returns the padded array and the number of items of each row."""
+    if isinstance(scores, np.ndarray) and scores.ndim == 2:
+        return scores, np.full(scores.shape[0], scores.shape[1])
+
+    rows = [np.asarray(_scores) for _scores in scores]
+    n_items = np.array([row.shape[0] for row in rows], dtype=int)
+    dtype = reduce(np.promote_types, [row.dtype for row in rows])
+    padded = np.zeros((len(rows), n_items.max() if len(rows) else 0), dtype=dtype)
+    for i, row in enumerate(rows):
+        padded[i, :n_items[i]] = row
+
+    return padded, n_items
+
+
+def score2order_batch(scores, n_items=None, reverse=False):
+    """
+    Order the variables of many instances at once.
+
+    Same semantics as `_score2order`, including ties, which keep the original variable order.
+
+    Parameters
+    ----------
+    scores : np.ndarray
+        A 2D array of shape (instances, max items) containing the scores of the variables,
+        padded after the first `n_items[i]` entries of row i
+    n_items : np.ndarray or None
+        Number of items of each instance. If None, no row is padded
+    reverse : bool, default is False
+        Flag to select sorting mechanism; False -> Ascending; True -> Descending
+
+    Returns
+    -------
+    A 2D integer array of the same shape as `scores` containing the order of the variables of each
+    instance, padded with -1.
+    """
+    scores = np.asarray(scores)
+    keys = -scores if reverse else scores
+    if n_items is None:
+        return np.argsort(keys, axis=1, kind='stable')
+
+    # Sort the padded entries last
+    pad = np.arange(scores.shape[1])[np.newaxis, :] >= np.asarray(n_items)[:, np.newaxis]
+    orders = np.lexsort((keys, pad), axis=-1)
+    orders[pad] = -1
+
+    return orders
+
+
+def score2rank_batch(scores, n_items=None, reverse=False, high_to_low=False, normalized=False):
+    """
+    Rank the variables of many instances at once.
+
+    Same semantics as `_score2rank`, including ties, which keep the original variable order.
+
+    Parameters
+    ----------
+    scores : np.ndarray
+        A 2D array of shape (instances, max items) containing the scores of the variables,
+        padded after the first `n_items[i]` entries of row i
+    n_items : np.ndarray or None
+        Number of items of each instance. If None, no row is padded
+    reverse : bool, default is False
+        Flag to select sorting mechanism; False -> Ascending; True -> Descending
+    high_to_low : bool, default is False
+        Flag to select ranking mechanism; False -> First element gets rank 0; True -> First element get rank N
+    normalized : bool, default is False
+        Flag to select normalization; False -> Do not normalize; True -> Normalize
+
+    Returns
+    -------
+    A 2D array of the same shape as `scores` containing the rank of the variables of each instance,
+    padded with -1. The array is of floats if `normalized` is True and of integers otherwise.
+    """
+    orders = score2order_batch(scores, n_items=n_items, reverse=reverse)
+
+    return order2rank_batch(orders, n_items=n_items, high_to_low=high_to_low, normalized=normalized)
+
+
+def order2rank_batch(orders, n_items=None, high_to_low=False, normalized=False):
+    """Invert the orders, padded with -1, of many instances into ranks. See `score2rank_batch`."""
+    orders = np.asarray(orders)
+    n_items = np.full(orders.shape[0], orders.shape[1]) if n_items is None else np.asarray(n_items)
+
+    rows, positions = np.nonzero(orders >= 0)
+    ranks = np.full(orders.shape, -1, dtype=int)
+    ranks[rows, orders[rows, positions]] = positions if high_to_low is False else n_items[rows] - positions
+
+    if normalized:
+        ranks = np.where(ranks >= 0, ranks / n_items[:, np.newaxis], -1)
+
+    return ranks
+
+
 def _score2order(scores, reverse=False):
     """
     Order variables based on its score
@@ -31,17 +125,13 @@ def _score2order(scores, reverse=False):
     [80, -10, 50, 100], reverse=False ==> [1, 2, 0, 3]
     [80, -10, 50, 100], reverse=True ==> [3, 0, 2, 1]
     """
-    orders = []
-    for _scores in scores:
-        var_rank_score = []
-        for var, score in enumerate(_scores):
-            var_rank_score.append((var, score))
+    if not len(scores):
+        return []
 
-        var_rank_score.sort(key=itemgetter(1), reverse=reverse)
-        order = [int(var) for (var, _) in var_rank_score]
-        orders.append(order)
+    padded, n_items = pad_scores(scores)
+    orders = score2order_batch(padded, n_items=n_items, reverse=reverse)
 
-    return orders
+    return [order[:n].tolist() for order, n in zip(orders, n_items)]
 
 
 def _score2rank(scores, reverse=False, high_to_low=False, normalized=False):
@@ -53,41 +143,118 @@ def _score2rank(scores, reverse=False, high_to_low=False, normalized=False):
     [80, -10, 50, 100], reverse=False ==> [2, 0, 1, 3]
     [80, -10, 50, 100], reverse=True ==> [1, 3, 2, 0]
     """
-    ranks = []
-    for _scores in scores:
-        var_rank_score = []
-        for var, score in enumerate(_scores):
-            var_rank_score.append((var, score))
-
-        var_rank_score.sort(key=itemgetter(1), reverse=reverse)
+    if not len(scores):
+        return []
 
-        n_items = len(_scores)
-        _ranks = [0] * n_items
-        for rank, (var, _) in enumerate(var_rank_score):
-            _ranks[int(var)] = rank if high_to_low is False else n_items - rank
+    padded, n_items = pad_scores(scores)
+    all_ranks = score2rank_batch(padded, n_items=n_items, reverse=reverse, high_to_low=high_to_low)
 
+    ranks = []
+    for _ranks, n in zip(all_ranks, n_items):
+        _ranks = _ranks[:n].tolist()
         if normalized:
-            _ranks = np.array(_ranks) / n_items
+            _ranks = np.array(_ranks) / n
 
         ranks.append(_ranks)
 
     return ranks
 
 
+# Static orderings: name -> (variable property used as key, descending)
+STATIC_ORDERINGS = {
+    'max_weight': ('weight', True),
+    'min_weight': ('weight', False),
+    'max_avg_value': ('avg_value', True),
+    'min_avg_value': ('avg_value', False),
+    'max_max_value': ('max_value', True),
+    'min_max_value': ('max_value', False),
+    'max_min_value': ('min_value', True),
+    'min_min_value': ('min_value', False),
+    'max_avg_value_by_weight': ('avg_value_by_weight', True),
+    'max_max_value_by_weight': ('max_value_by_weight', True),
+    'max_min_value_by_weight': ('min_value_by_weight', True),
+}
+
+# Static orderings used by get_static_orders when no order type is given
+DEFAULT_STATIC_ORDERS = ['max_weight', 'min_weight', 'max_avg_profit', 'min_avg_profit', 'max_max_profit',
+                         'min_max_profit', 'max_min_profit', 'min_min_profit', 'max_avg_profit_by_weight',
+                         'max_max_profit_by_weight']
+
+
+def get_static_properties(weight, value):
+    """Variable properties the static orderings sort on, for one instance (weight of shape (n_vars,)
+    and value of shape (n_objs, n_vars)) or many at once (an extra leading instance axis)"""
+    weight, value = np.asarray(weight), np.asarray(value)
+    props = {'weight': weight,
+             'avg_value': np.mean(value, axis=-2),
+             'max_value': np.max(value, axis=-2),
+             'min_value': np.min(value, axis=-2)}
+    # Padded variables have a null weight
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for agg in ['avg', 'max', 'min']:
+            props[f'{agg}_value_by_weight'] = props[f'{agg}_value'] / weight
+
+    return props
+
+
+def static_orders_batch(weight, value, names=None, n_items=None):
+    """
+    Compute static orderings of many instances with a single argsort.
+
+    The value aggregates are computed once and the keys of all the orderings are stacked, negated
+    for the descending ones. Ties keep the original variable order, as in `get_static_orders`.
+
+    Parameters
+    ----------
+    weight : np.ndarray
+        A 2D array of shape (instances, max items) containing the weights of the variables
+    value : np.ndarray
+        A 3D array of shape (instances, objectives, max items) containing the values of the variables
+    names : list or None
+        Names of the orderings, keys of STATIC_ORDERINGS. If None, all of them
+    n_items : np.ndarray or None
+        Number of items of each instance. If None, no instance is padded
+
+    Returns
+    -------
+    A 3D integer array of shape (orderings, instances, max items) containing the order of the
+    variables of each instance under each ordering, padded with -1.
+    """
+    names = list(STATIC_ORDERINGS.keys()) if names is None else names
+    props = get_static_properties(weight, value)
+
+    keys = []
+    for name in names:
+        if name not in STATIC_ORDERINGS:
+            raise ValueError(f'Invalid static ordering {name}')
+        prop, descending = STATIC_ORDERINGS[name]
+        keys.append(-props[prop] if descending else props[prop])
+    keys = np.stack(keys).astype(float)
+
+    n_orderings, n_instances, n_vars = keys.shape
+    if n_items is not None:
+        n_items = np.tile(np.asarray(n_items), n_orderings)
+    orders = score2order_batch(keys.reshape(-1, n_vars), n_items=n_items)
+
+    return orders.reshape(n_orderings, n_instances, n_vars)
+
+
+def static_ranks_batch(weight, value, names=None, n_items=None):
+    """Ranks of the variables under the static orderings, of shape (orderings, instances, max items).
+    See `static_orders_batch`."""
+    orders = static_orders_batch(weight, value, names=names, n_items=n_items)
+
+    n_orderings, n_instances, n_vars = orders.shape
+    if n_items is not None:
+        n_items = np.tile(np.asarray(n_items), n_orderings)
+    ranks = order2rank_batch(orders.reshape(-1, n_vars), n_items=n_items)
+
+    return ranks.reshape(n_orderings, n_instances, n_vars)
+
+
 def get_static_orders(data, order_type=None, property_weights=None):
     if order_type is None:
-        order = {
-            'max_weight': None,
-            'min_weight': None,
-            'max_avg_profit': None,
-            'min_avg_profit': None,
-            'max_max_profit': None,
-            'min_max_profit': None,
-            'max_min_profit': None,
-            'min_min_profit': None,
-            'max_avg_profit_by_weight': None,
-            'max_max_profit_by_weight': None,
-        }
+        order = {ot: None for ot in DEFAULT_STATIC_ORDERS}
     elif type(order_type) == str:
         order = {order_type: None}
     elif type(order_type) == list:
@@ -95,79 +262,17 @@ def get_static_orders(data, order_type=None, property_weights=None):
     else:
         raise ValueError('Invalid type(order_type)...')
 
+    # get_static_orders refers to values as profits
+    static = [o for o in order.keys() if o.replace('profit', 'value') in STATIC_ORDERINGS]
+    if len(static):
+        orders = static_orders_batch(np.asarray(data['weight'])[np.newaxis],
+                                     np.asarray(data['value'])[np.newaxis],
+                                     names=[o.replace('profit', 'value') for o in static])
+        for o, _order in zip(static, orders[:, 0]):
+            order[o] = _order.tolist()
+
     for o in order.keys():
-        if o == 'max_weight':
-            idx_weight = [(i, w) for i, w in enumerate(data['weight'])]
-            # print(o, idx_weight)
-            idx_weight.sort(key=itemgetter(1), reverse=True)
-            order[o] = [i[0] for i in idx_weight]
-
-        elif o == 'min_weight':
-            idx_weight = [(i, w) for i, w in enumerate(data['weight'])]
-            idx_weight.sort(key=itemgetter(1))
-            order[o] = [i[0] for i in idx_weight]
-
-        elif o == 'max_avg_profit':
-            mean_profit = np.mean(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(mean_profit)]
-            idx_profit.sort(key=itemgetter(1), reverse=True)
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'min_avg_profit':
-            mean_profit = np.mean(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(mean_profit)]
-            idx_profit.sort(key=itemgetter(1))
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'max_max_profit':
-            max_profit = np.max(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(max_profit)]
-            idx_profit.sort(key=itemgetter(1), reverse=True)
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'min_max_profit':
-            max_profit = np.max(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(max_profit)]
-            idx_profit.sort(key=itemgetter(1))
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'max_min_profit':
-            min_profit = np.min(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(min_profit)]
-            idx_profit.sort(key=itemgetter(1), reverse=True)
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'min_min_profit':
-            min_profit = np.min(data['value'], 0)
-            idx_profit = [(i, mp) for i, mp in enumerate(min_profit)]
-            idx_profit.sort(key=itemgetter(1))
-            order[o] = [i[0] for i in idx_profit]
-
-        elif o == 'max_avg_profit_by_weight':
-            mean_profit = np.mean(data['value'], 0)
-            profit_by_weight = [v / w for v, w in zip(mean_profit, data['weight'])]
-            idx_profit_by_weight = [(i, f) for i, f in enumerate(profit_by_weight)]
-            idx_profit_by_weight.sort(key=itemgetter(1), reverse=True)
-            # print(idx_profit_by_weight)
-            order[o] = [i[0] for i in idx_profit_by_weight]
-
-        elif o == 'max_max_profit_by_weight':
-            max_profit = np.max(data['value'], 0)
-            profit_by_weight = [v / w for v, w in zip(max_profit, data['weight'])]
-            idx_profit_by_weight = [(i, f) for i, f in enumerate(profit_by_weight)]
-            idx_profit_by_weight.sort(key=itemgetter(1), reverse=True)
-            # print(idx_profit_by_weight)
-            order[o] = [i[0] for i in idx_profit_by_weight]
-
-        elif o == 'max_min_profit_by_weight':
-            min_profit = np.min(data['value'], 0)
-            profit_by_weight = [v / w for v, w in zip(min_profit, data['weight'])]
-            idx_profit_by_weight = [(i, f) for i, f in enumerate(profit_by_weight)]
-            idx_profit_by_weight.sort(key=itemgetter(1), reverse=True)
-            # print(idx_profit_by_weight)
-            order[o] = [i[0] for i in idx_profit_by_weight]
-
-        elif o == 'smac_instance' or o == 'smac_dataset':
+        if o == 'smac_instance' or o == 'smac_dataset':
             assert property_weights is not None
             order[o] = get_variable_order(data=data, property_weights=property_weights, reverse=True)[0]
 
@@ -175,71 +280,102 @@ def get_static_orders(data, order_type=None, property_weights=None):
 
 
 def get_weighted_order(opts, data, weighted_ordering_dict):
-    orders = get_static_orders(data)
     num_items = opts.n
+    names = [o.replace('profit', 'value') for o in DEFAULT_STATIC_ORDERS]
+    ranks = static_ranks_batch(np.asarray(data['weight'])[np.newaxis],
+                               np.asarray(data['value'])[np.newaxis], names=names)[:, 0]
 
-    # for o in ordering_lst:
-    #     print(orders[o])
-    #     print()
+    # The item at rank r scores num_items - r under each ordering
+    scores = np.zeros(num_items)
+    for o, _ranks in zip(DEFAULT_STATIC_ORDERS, ranks):
+        scores += weighted_ordering_dict[o] * (num_items - _ranks)
 
-    scores = [0] * num_items
-    for o in orders.keys():
-        for rank, item_id in enumerate(orders[o]):
-            item_score = num_items - rank
-            scores[item_id] += weighted_ordering_dict[o] * item_score
+    return score2order_batch(scores[np.newaxis], reverse=True)[0].tolist()
 
-    # for i, s in enumerate(scores):
-    #     print(i, np.round(s, 4))
 
-    new_order = []
-    for item_id, score in enumerate(scores):
-        new_order.append((item_id, score))
-    new_order.sort(key=itemgetter(1), reverse=True)
-    new_order = [k for k, v in new_order]
+def get_normalized_property_matrix(weight, value, keys=None):
+    """Normalized variable properties stacked in the order of `keys`, of shape (properties, variables) for
+    one instance or (instances, properties, variables) for a stack of instances of the same size"""
+    weight, value = np.asarray(weight), np.asarray(value)
+    n_items = weight.shape[-1]
+    properties = get_static_properties(weight, value)
+    properties['label'] = np.broadcast_to(np.arange(1, n_items + 1)[::-1], weight.shape)
+    keys = [pw.name for pw in KnapsackPropertyWeights] if keys is None else keys
 
-    return new_order
+    norm_properties = np.stack([properties[fk] / np.sum(properties[fk], axis=-1, keepdims=True) for fk in keys],
+                               axis=-2)
+    assert (np.round(norm_properties.sum(axis=-1)) == 1).all()
 
+    return norm_properties
 
-def get_variable_score_from_weights(data, property_weights):
-    """Given variables score based on property weights"""
-    weight, value = np.asarray(data['weight']), np.asarray(data['value'])
-    n_items = weight.shape[0]
-    value_mean = np.mean(value, axis=0)
-    value_max = np.max(value, axis=0)
-    value_min = np.min(value, axis=0)
 
-    # Normalized variable score computation
+def get_normalized_properties(data, keys=None):
+    """Normalized variable properties, keyed by property name, used to score variables"""
+    keys = [pw.name for pw in KnapsackPropertyWeights] if keys is None else list(keys)
+    norm_properties = get_normalized_property_matrix(data['weight'], data['value'], keys=keys)
+
+    return dict(zip(keys, norm_properties))
+
+
+def get_variable_score_from_properties(norm_properties, property_weights):
+    """Given variables score based on precomputed normalized properties"""
+    n_items = next(iter(norm_properties.values())).shape[0]
+
     scores = np.zeros(n_items)
     for fk, fv in property_weights.items():
-        _norm_scores = np.zeros(n_items)
-        if fk == 'weight':
-            _norm_scores = weight
+        scores += fv * norm_properties[fk]
 
-        elif fk == 'avg_value':
-            _norm_scores = value_mean
+    return scores
 
-        elif fk == 'max_value':
-            _norm_scores = value_max
 
-        elif fk == 'min_value':
-            _norm_scores = value_min
+def get_variable_score_from_weights(data, property_weights):
+    """Given variables score based on property weights"""
+    norm_properties = get_normalized_properties(data, keys=property_weights.keys())
 
-        elif fk == 'avg_value_by_weight':
-            _norm_scores = (value_mean / weight)
+    return get_variable_score_from_properties(norm_properties, property_weights)
 
-        elif fk == 'max_value_by_weight':
-            _norm_scores = (value_max / weight)
 
-        elif fk == 'min_value_by_weight':
-            _norm_scores = (value_min / weight)
+def get_variable_score_batch(norm_properties, weights):
+    """
+    Score variables under many property-weight vectors and/or for many instances in one call.
 
-        elif fk == 'label':
-            _norm_scores = np.arange(1, n_items + 1)[::-1]
+    `norm_properties` (..., properties, variables) and `weights` (..., properties) broadcast against
+    each other, e.g. (properties, variables) with (configurations, properties) scores one instance
+    under many configurations, (instances, properties, variables) with (properties,) scores a whole
+    split under one incumbent and (instances, properties, variables) with (instances, properties)
+    scores each instance under its own label. The products are accumulated in property order, as in
+    `get_variable_score_from_properties`, so that the scores (and the ties in the orders) are the same.
 
-        _norm_scores = _norm_scores / np.sum(_norm_scores)
-        assert _norm_scores.shape[0] == n_items
-        assert np.round(_norm_scores.sum()) == 1
-        scores += fv * _norm_scores
+    Returns
+    -------
+    An array of shape broadcast(weights[..., 0], norm_properties[..., 0, 0]) + (variables,)
+    """
+    norm_properties, weights = np.asarray(norm_properties), np.asarray(weights, dtype=float)
+    shape = np.broadcast_shapes(weights.shape[:-1], norm_properties.shape[:-2]) + norm_properties.shape[-1:]
+
+    scores = np.zeros(shape)
+    for k in range(weights.shape[-1]):
+        scores += weights[..., k, np.newaxis] * norm_properties[..., k, :]
+
+    return scores
+
+
+def get_variable_scores(data_lst, property_weights):
+    """Scores of many instances, under one property weights dict or a list with one dict per instance.
+    Instances of the same size are scored together with `get_variable_score_batch`."""
+    pw_lst = [property_weights] * len(data_lst) if isinstance(property_weights, dict) else property_weights
+
+    groups = {}
+    for i, (data, pw) in enumerate(zip(data_lst, pw_lst)):
+        groups.setdefault((np.shape(data['value']), tuple(pw.keys())), []).append(i)
+
+    scores = [None] * len(data_lst)
+    for (_, keys), idx in groups.items():
+        norm_properties = get_normalized_property_matrix([data_lst[i]['weight'] for i in idx],
+                                                         [data_lst[i]['value'] for i in idx], keys=keys)
+        weights = [[pw_lst[i][fk] for fk in keys] for i in idx]
+        for i, _scores in zip(idx, get_variable_score_batch(norm_properties, weights)):
+            scores[i] = _scores
 
     return scores
 
@@ -383,8 +519,7 @@ def get_baseline_order(data, cfg, resource_path, pid):
 
     elif cfg.order_type == 'smac':
         label_path = resource_path / 'labels' / cfg.problem.name / cfg.problem.size / f'label_{cfg.problem.size}.csv'
-        df = pd.read_csv(label_path)
-        incb = ast.literal_eval(df[df['pid'] == pid].iloc[0, 'incb'])
+        incb = get_label_store(label_path).get_weights(pid)
         order = get_variable_order(data=data, property_weights=incb, reverse=True)[0]
         orders.append(order)
 
@@ -400,10 +535,3 @@ def get_baseline_order(data, cfg, resource_path, pid):
             orders.append(order)
 
     return orders
-
-
-def make_result_column(problem, size, split, pid, task, order_type, result, run_id=0):
-    col = [problem, size, split, pid, task, order_type, run_id]
-    col.extend(result)
-
-    return col
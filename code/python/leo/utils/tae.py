@@ -0,0 +1,237 @@
+import json
+import logging
+import os
+import time
+import uuid
+
+import numpy as np
+from smac.tae import StatusType
+from smac.tae.serial_runner import SerialRunner
+
+from .bdd import BDDWorkerPool
+from .bdd import result2runtime
+from .bdd import run_bdd_builder
+from .instance import load_instance
+from .order import get_normalized_properties
+from .order import get_variable_order
+from .order import get_variable_score_from_properties
+
+log = logging.getLogger(__name__)
+
+# State of the runners living in this process, keyed by runner id. SMAC ships a pickled copy of the
+# runner with every trial to its Dask workers, and the copies reattach to the state of their process.
+_runner_states = {}
+
+
+class BDDTargetRunner(SerialRunner):
+    """Evaluate a property-weight configuration inside the SMAC process.
+
+    Same contract as `smac_worker.py`: the configuration induces a variable order, the BDD is built
+    using that order and the runtime reported by the binary is the cost. The parsed instance and
+    its normalized properties are cached, so a trial only pays for scoring the variables and
+    building the BDD. With `batch_worker`, the binary itself is kept alive in batch mode for the
+    instance being labeled, which also saves its start-up and instance parsing. Evaluations are
+    looked up in and stored to `cache`, a BDDResultCache, if given. With `compact` (knapsack only), the
+    binary stores the BDD as arrays, which fits larger instances in `mem_limit`.
+
+    Many configurations induce the same order. Every trial is canonicalized to its order and an order
+    already evaluated on the instance is answered with the recorded result, under the same reuse rules
+    as the cache. The number of trials and of deduplicated trials per instance is written to `stats_path`
+    at most every `stats_interval` seconds, and by `close`.
+
+    With `screen_width`, every new order is first screened on the BDD restricted to `screen_width` nodes
+    per layer, scored by the number of Pareto comparisons it takes. After `screen_warmup` orders, only the
+    orders whose score is within the best 1 / `screen_eta` of the successful screens on the instance are
+    built exactly, as in successive halving. The others, and the orders whose screen failed, are reported
+    as TIMEOUT at the cutoff, the cost SMAC gives an order that is not built within the cutoff.
+
+    With parallel trials, the parsed instances, the binary and the recorded results are kept per worker
+    process, and every worker writes its statistics to `stats_path` suffixed with its process id.
+    `close` stops the binaries and releases this state in the calling process.
+    """
+
+    def __init__(self, prob_id=None, preprocess=None, bin_path=None, bin_name='multiobj', mem_limit=16,
+                 batch_worker=False, cache=None, stats_path=None, screen_width=None, screen_eta=3,
+                 screen_warmup=5, compact=False, stats_interval=60, **kwargs):
+        super().__init__(**kwargs)
+        self.prob_id = prob_id
+        self.preprocess = preprocess
+        self.bin_path = bin_path
+        self.bin_name = bin_name
+        self.mem_limit = mem_limit
+        self.batch_worker = batch_worker
+        self.cache = cache
+        self.stats_path = stats_path
+        self.stats_interval = stats_interval
+        self.screen_width = screen_width
+        self.screen_eta = screen_eta
+        self.screen_warmup = screen_warmup
+        self.compact = compact
+
+        self.runner_id = uuid.uuid4().hex
+        self.owner_pid = os.getpid()
+        self.attach()
+
+    def attach(self):
+        state = _runner_states.setdefault(self.runner_id, {'properties': {}, 'pools': {}, 'results': {},
+                                                           'screened': {}, 'trial_stats': {},
+                                                           'stats_time': None})
+        self.runner_state = state
+        self.properties = state['properties']
+        # Batch worker pools, keyed by (bdd_type, max_width)
+        self.pools = state['pools']
+        # Results of the orders evaluated on each instance: order -> (status, runtime, time_limit)
+        self.results = state['results']
+        # Screening of the orders on each instance: order -> (score, runtime)
+        self.screened = state['screened']
+        # Not `stats`, which holds the SMAC Stats of the runner
+        self.trial_stats = state['trial_stats']
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for key in ('runner_state', 'properties', 'pools', 'results', 'screened', 'trial_stats'):
+            del state[key]
+
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.stats_path is not None and os.getpid() != self.owner_pid:
+            root, ext = os.path.splitext(self.stats_path)
+            self.stats_path = f'{root}_{os.getpid()}{ext}'
+        self.attach()
+
+    def close(self):
+        """Stop the batch workers, write the statistics and the cache counters and drop the state of the
+        runner in this process"""
+        self.write_stats()
+        for pool in self.pools.values():
+            pool.close()
+        self.pools.clear()
+        if self.cache is not None:
+            self.cache.close()
+        _runner_states.pop(self.runner_id, None)
+
+    def get_properties(self, instance):
+        if instance not in self.properties:
+            acronym = instance.split('/')[-1].split('_')[0]
+            data = load_instance(acronym, instance)
+            self.properties[instance] = get_normalized_properties(data)
+
+        return self.properties[instance]
+
+    def get_order(self, config, instance):
+        scores = get_variable_score_from_properties(self.get_properties(instance), config.get_dictionary())
+
+        return get_variable_order(scores=[scores], reverse=True)[0]
+
+    def get_recorded(self, instance, order, time_limit):
+        """Recorded (status, runtime) of an order valid under the time limit, or None"""
+        recorded = self.results.setdefault(instance, {}).get(order)
+        if recorded is None:
+            return None
+
+        status, runtime, recorded_time_limit = recorded
+        if status == 'SUCCESS':
+            # Solved, but not within the requested time limit
+            return (status, runtime) if runtime <= time_limit else ('TIMEOUT', time_limit)
+        if status == 'TIMEOUT' and time_limit <= recorded_time_limit:
+            return status, time_limit
+        if status == 'MEMOUT':
+            return status, runtime
+
+        return None
+
+    def evaluate(self, instance, order, time_limit, get_runtime=True, bdd_type=0, max_width=0):
+        if self.batch_worker:
+            pool = self.pools.get((bdd_type, max_width))
+            if pool is None:
+                pool = BDDWorkerPool(prob_id=self.prob_id, preprocess=self.preprocess, bin_path=self.bin_path,
+                                     bin_name=self.bin_name, mem_limit=self.mem_limit, cache=self.cache,
+                                     bdd_type=bdd_type, max_width=max_width, compact=self.compact)
+                self.pools[(bdd_type, max_width)] = pool
+
+            return pool.run(instance, order, time_limit=time_limit, get_runtime=get_runtime)
+
+        return run_bdd_builder(instance, order,
+                               prob_id=self.prob_id, preprocess=self.preprocess,
+                               bin_path=self.bin_path, bin_name=self.bin_name,
+                               time_limit=time_limit, get_runtime=get_runtime,
+                               mem_limit=self.mem_limit, cache=self.cache,
+                               bdd_type=bdd_type, max_width=max_width, compact=self.compact)
+
+    def screen(self, instance, order, time_limit):
+        """Screen an order on the restricted BDD. Returns whether it is promising and the screening runtime.
+        An order whose screen fails (timeout or memory limit) is not promising after the warmup, and the
+        threshold is taken over the orders screened successfully"""
+        screened = self.screened.setdefault(instance, {})
+        if order not in screened:
+            status, result = self.evaluate(instance, order, time_limit, get_runtime=False, bdd_type=1,
+                                           max_width=self.screen_width)
+            # Unlike the runtime, the number of comparisons does not depend on the machine load
+            score = result['num_comparisons'] if status == 'SUCCESS' else np.inf
+            screened[order] = score, result2runtime(status, result)
+
+        score, runtime = screened[order]
+        if len(screened) <= self.screen_warmup:
+            return True, runtime
+
+        if not np.isfinite(score):
+            return False, runtime
+
+        # Lower 1 / eta quantile, an actual score rather than an interpolation
+        scores = np.array([s for s, _ in screened.values() if np.isfinite(s)])
+        k = int((len(scores) - 1) / self.screen_eta)
+
+        return score <= np.partition(scores, k)[k], runtime
+
+    def update_stats(self, instance, deduplicated, screened_out=False):
+        stats = self.trial_stats.setdefault(instance, {'trials': 0, 'deduplicated': 0, 'unique_orders': 0,
+                                                       'screened_orders': 0, 'screened_out': 0})
+        stats['trials'] += 1
+        stats['deduplicated'] += int(deduplicated)
+        stats['unique_orders'] = len(self.results[instance])
+        stats['screened_orders'] = len(self.screened.get(instance, {}))
+        stats['screened_out'] += int(screened_out)
+
+        # The statistics of every instance are rewritten at once, so not on every trial
+        stats_time = self.runner_state['stats_time']
+        if stats_time is None or time.monotonic() - stats_time >= self.stats_interval:
+            self.write_stats()
+
+    def write_stats(self):
+        if self.stats_path is None or not self.trial_stats:
+            return
+
+        if self.runner_state['stats_time'] is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.stats_path)), exist_ok=True)
+        tmp_path = f'{self.stats_path}.tmp'
+        with open(tmp_path, 'w') as fp:
+            json.dump(self.trial_stats, fp, indent=2)
+        os.replace(tmp_path, self.stats_path)
+        self.runner_state['stats_time'] = time.monotonic()
+
+    def run(self, config, instance, cutoff=None, seed=12345, budget=None, instance_specific='0'):
+        log.debug(instance)
+        order = self.get_order(config, instance)
+
+        # Same cutoff as the one smac_worker.py receives from the SMAC call string
+        time_limit = int(float(cutoff) + 1)
+        recorded = self.get_recorded(instance, tuple(order), time_limit)
+        if recorded is not None:
+            status, runtime = recorded
+            log.debug(f'Order already evaluated: {status}, {runtime}')
+        else:
+            if self.screen_width is not None:
+                promising, screen_runtime = self.screen(instance, tuple(order), time_limit)
+                if not promising:
+                    log.debug(f'Order screened out in {screen_runtime}')
+                    self.update_stats(instance, False, screened_out=True)
+
+                    return StatusType.TIMEOUT, float(cutoff), screen_runtime, {'screened_out': True}
+
+            status, runtime = self.evaluate(instance, order, time_limit)
+            self.results[instance][tuple(order)] = status, runtime, time_limit
+        self.update_stats(instance, recorded is not None)
+
+        return StatusType[status], runtime, runtime, {}
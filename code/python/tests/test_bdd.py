@@ -0,0 +1,83 @@
+import random
+
+import pytest
+
+from leo import res_path
+from leo.utils.bdd import BDDWorkerPool
+from leo.utils.bdd import run_bdd_builder
+
+BIN_PATH = res_path / 'bin'
+
+pytestmark = pytest.mark.skipif(not (BIN_PATH / 'multiobj').exists(), reason='multiobj binary not built')
+
+
+@pytest.fixture
+def instance(tmp_path):
+    """Knapsack instance with 3 objectives and 6 items"""
+    dat_path = tmp_path / 'kp_7_3_6_0.dat'
+    dat_path.write_text('6\n3\n'
+                        '4 8 1 6 3 7\n'
+                        '2 5 9 1 6 3\n'
+                        '7 2 4 8 1 5\n'
+                        '3 6 2 5 4 7\n'
+                        '13\n')
+
+    return str(dat_path)
+
+
+@pytest.fixture
+def large_instance(tmp_path):
+    """Knapsack instance with 3 objectives and 30 items"""
+    rng = random.Random(0)
+    n_vars = 30
+    rows = [' '.join(str(rng.randint(1, 100)) for _ in range(n_vars)) for _ in range(4)]
+    dat_path = tmp_path / 'kp_7_3_30_0.dat'
+    dat_path.write_text(f'{n_vars}\n3\n' + '\n'.join(rows) + f'\n{25 * n_vars}\n')
+
+    return str(dat_path)
+
+
+def test_run_bdd_builder_rejects_duplicate_order(instance):
+    status, _ = run_bdd_builder(instance, list(range(6)), prob_id=1, preprocess=0, bin_path=BIN_PATH)
+    assert status == 'SUCCESS'
+
+    status, _ = run_bdd_builder(instance, [0] * 6, prob_id=1, preprocess=0, bin_path=BIN_PATH)
+    assert status == 'ABORT'
+
+
+def test_worker_pool_rejects_duplicate_order(instance):
+    with BDDWorkerPool(prob_id=1, preprocess=0, bin_path=BIN_PATH) as pool:
+        assert pool.run(instance, [0] * 6)[0] == 'ABORT'
+        # The worker keeps serving the next orders
+        assert pool.run(instance, [0, 1, 2, 3, 4, 5, 5])[0] == 'ABORT'
+        assert pool.run(instance, [5, 4, 3, 2, 1, 0])[0] == 'SUCCESS'
+
+
+def test_compact_records_are_marked(instance):
+    order = [5, 4, 3, 2, 1, 0]
+    status, record = run_bdd_builder(instance, order, prob_id=1, preprocess=0, bin_path=BIN_PATH)
+    status_compact, record_compact = run_bdd_builder(instance, order, prob_id=1, preprocess=0, bin_path=BIN_PATH,
+                                                     compact=True)
+    assert status == status_compact == 'SUCCESS'
+    assert 'compact' not in record and record_compact['compact']
+    # Same frontier and BDD
+    assert record['num_pareto_sol'] == record_compact['num_pareto_sol']
+    assert record['reduced_layer_nodes'] == record_compact['reduced_layer_nodes']
+
+
+def test_worker_status_does_not_depend_on_earlier_orders(large_instance):
+    order = list(range(30))
+    fresh_status, fresh = run_bdd_builder(large_instance, order, prob_id=1, preprocess=0, bin_path=BIN_PATH,
+                                          mem_limit=1)
+
+    # The node memory of the earlier orders is freed before the next one
+    rng = random.Random(1)
+    with BDDWorkerPool(prob_id=1, preprocess=0, bin_path=BIN_PATH, mem_limit=1) as pool:
+        for _ in range(5):
+            pool.run(large_instance, rng.sample(order, len(order)))
+        status, result = pool.run(large_instance, order)
+
+    assert status == fresh_status
+    if status == 'SUCCESS':
+        assert result['num_pareto_sol'] == fresh['num_pareto_sol']
+        assert result['num_comparisons'] == fresh['num_comparisons']
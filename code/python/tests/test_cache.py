@@ -0,0 +1,74 @@
+import pytest
+
+from leo.utils.bdd import get_failure_record
+from leo.utils.bdd import get_timeout_result
+from leo.utils.cache import BDDResultCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = BDDResultCache(tmp_path / 'cache.sqlite')
+    yield cache
+    cache.close()
+
+
+def get_success_record(runtime):
+    record = get_failure_record(0)
+    record.update({'num_pareto_sol': 3, 'compilation_time': runtime, 'reduction_time': 0, 'pareto_time': 0})
+
+    return record
+
+
+def test_success_over_time_limit_is_timeout(cache):
+    record = get_success_record(10)
+    cache.put('key', 'SUCCESS', record, time_limit=60, mem_limit=16)
+
+    assert cache.get('key', time_limit=60, mem_limit=16) == ('SUCCESS', record)
+    assert cache.get('key', time_limit=5, mem_limit=16) == get_timeout_result(5)
+
+
+def test_timeout_reused_under_smaller_time_limit(cache):
+    cache.put('key', *get_timeout_result(60), time_limit=60, mem_limit=16)
+
+    assert cache.get('key', time_limit=30, mem_limit=16) == get_timeout_result(30)
+    assert cache.get('key', time_limit=60, mem_limit=16) == get_timeout_result(60)
+    assert cache.get('key', time_limit=120, mem_limit=16) is None
+
+
+def test_memout_reused_under_smaller_memory_limit(cache):
+    record = get_failure_record(-1)
+    cache.put('key', 'MEMOUT', record, time_limit=60, mem_limit=16)
+
+    assert cache.get('key', time_limit=60, mem_limit=8) == ('MEMOUT', record)
+    assert cache.get('key', time_limit=60, mem_limit=16) == ('MEMOUT', record)
+    assert cache.get('key', time_limit=60, mem_limit=32) is None
+
+
+def test_put_never_overwrites_success(cache):
+    record = get_success_record(10)
+    cache.put('key', 'SUCCESS', record, time_limit=60, mem_limit=16)
+    cache.put('key', *get_timeout_result(5), time_limit=5, mem_limit=16)
+    cache.put('key', 'MEMOUT', get_failure_record(-1), time_limit=60, mem_limit=1)
+
+    assert cache.get('key', time_limit=60, mem_limit=16) == ('SUCCESS', record)
+
+
+def test_failures_other_than_timeout_and_memout_are_not_cached(cache):
+    cache.put('key', 'ABORT', get_failure_record(-1), time_limit=60, mem_limit=16)
+
+    assert cache.get('key', time_limit=60, mem_limit=16) is None
+
+
+def test_counters_are_written_on_flush(cache, tmp_path):
+    cache.put('key', 'SUCCESS', get_success_record(10), time_limit=60, mem_limit=16)
+    cache.get('key', time_limit=60)
+    cache.get('other', time_limit=60)
+
+    # Lookups do not write to the database
+    other = BDDResultCache(tmp_path / 'cache.sqlite')
+    assert other.stats()['hits'] == 0
+
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1)
+    assert other.stats()['hits'] == 1
+    other.close()
@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+from sklearn.datasets import load_svmlight_file
+
+from leo.generate_dataset import PairRankWriter
+from leo.utils.data import load_binary_dataset
+from leo.utils.data import load_ranking_dataset
+
+
+def format_rows(qid, labels, features):
+    """SVMlight rows as formatted before the dataset was streamed"""
+    rows = ''
+    for label, row in zip(labels, features):
+        features_str = ''
+        for fid, f in enumerate(row, start=1):
+            features_str += f'{fid}:{f} '
+        rows += f'{label} qid:{qid} {features_str}\n'
+
+    return rows
+
+
+@pytest.fixture
+def dataset(tmp_path):
+    """Three instances of 4, 6 and 5 items, with features of mixed magnitudes and zeros"""
+    rng = np.random.default_rng(0)
+    writer = PairRankWriter(tmp_path, 'kp_7_3_6', 'pair_rank', 'train')
+    instances = []
+    for i, n_items in enumerate([4, 6, 5]):
+        features = rng.uniform(0, 1, size=(n_items, 7)) * 10.0 ** rng.integers(-6, 4, size=(n_items, 7))
+        features[:, 0] = 0
+        features[:, 1] = rng.integers(0, 5, size=n_items)
+        labels = [int(label) for label in rng.permutation(n_items)]
+        writer.write(f'kp_7_3_6_{i}', labels, features)
+        instances.append((labels, features))
+    writer.close()
+
+    return writer.paths, instances
+
+
+def test_text_dataset_is_unchanged(dataset):
+    paths, instances = dataset
+
+    expected = ''.join(format_rows(qid, labels, features) for qid, (labels, features) in enumerate(instances, 1))
+    assert paths['dataset'].read_text() == expected
+    assert paths['n_items'].read_text() == ''.join(f'{len(labels)}\n' for labels, _ in instances)
+    assert paths['names'].read_text() == ''.join(f'kp_7_3_6_{i}\n' for i in range(len(instances)))
+
+
+def test_binary_dataset_matches_text(dataset):
+    paths, instances = dataset
+
+    x_text, y_text, qid = load_svmlight_file(str(paths['dataset']), query_id=True)
+    x_bin, y_bin, group_offsets = load_binary_dataset(paths['dataset'])
+    assert np.array_equal(x_bin, x_text.toarray().astype(np.float32))
+    assert np.array_equal(y_bin, y_text)
+    assert group_offsets.tolist() == [0] + np.cumsum([len(labels) for labels, _ in instances]).tolist()
+    assert np.array_equal(np.repeat(np.arange(1, len(instances) + 1), np.diff(group_offsets)), qid)
+
+
+def test_changed_text_dataset_is_rejected(dataset):
+    paths, _ = dataset
+
+    # Touched with the same content, the checksum still matches
+    st = os.stat(paths['dataset'])
+    os.utime(paths['dataset'], ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+    assert load_binary_dataset(paths['dataset']) is not None
+
+    with open(paths['dataset'], 'a') as fp:
+        fp.write('0 qid:4 1:0.5 2:1.0 3:0 4:0 5:0 6:0 7:0 \n')
+    assert load_binary_dataset(paths['dataset']) is None
+    # The text is parsed instead
+    assert load_ranking_dataset(paths['dataset'])[0].shape[0] == 16
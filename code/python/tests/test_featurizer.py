@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from omegaconf import OmegaConf
+
+from leo.featurizer.knapsack import KnapsackFeaturizer
+
+
+@pytest.mark.parametrize('raw', [0, 1])
+@pytest.mark.parametrize('context', [0, 1])
+def test_get_batch_matches_get(raw, context):
+    featurizer = KnapsackFeaturizer(OmegaConf.create({'norm_const': 1000, 'raw': raw, 'context': context}))
+    rng = np.random.default_rng(0)
+    n_insts, n_objs, n_vars = 5, 3, 12
+    # Few distinct weights and values, so that the static orderings have ties
+    weight = rng.integers(1, 5, size=(n_insts, n_vars))
+    value = rng.integers(1, 5, size=(n_insts, n_objs, n_vars))
+    capacity = np.ceil(weight.sum(axis=1) / 2)
+
+    batch = featurizer.get_batch(weight=weight, value=value, capacity=capacity)
+    for i in range(n_insts):
+        feat = featurizer.get({'weight': weight[i].tolist(), 'value': value[i].tolist(), 'capacity': capacity[i],
+                               'n_objs': n_objs, 'n_vars': n_vars})
+        for key, block in feat.items():
+            if block is None:
+                assert batch[key] is None
+            else:
+                assert np.array_equal(batch[key][i], block), key
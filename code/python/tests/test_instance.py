@@ -0,0 +1,100 @@
+import os
+
+import numpy as np
+import pytest
+
+from leo.utils.instance import load_instance
+from leo.utils.instance import open_instance_store
+from leo.utils.instance import read_data_from_file
+from leo.utils.instance import write_instance_store
+
+
+def write_knapsack(file_path, rng, n_objs=3, n_vars=8):
+    rows = [rng.integers(1, 100, size=n_vars) for _ in range(n_objs + 1)]
+    lines = [str(n_vars), str(n_objs)] + [' '.join(map(str, row)) for row in rows] + [str(rows[-1].sum() // 2)]
+    file_path.write_text('\n'.join(lines) + '\n')
+
+
+def write_binproblem(file_path, rng, n_objs=3, n_vars=8, n_cons=5):
+    lines = [f'{n_vars} {n_cons}', str(n_objs)]
+    lines += [' '.join(map(str, rng.integers(1, 100, size=n_vars))) for _ in range(n_objs)]
+    for _ in range(n_cons):
+        # 1-based variable ids, possibly repeated. The last variable is in no constraint
+        cons_vars = rng.integers(1, n_vars, size=rng.integers(1, 4))
+        lines += [str(len(cons_vars)), ' '.join(map(str, cons_vars))]
+    file_path.write_text('\n'.join(lines) + '\n')
+
+
+def read_binproblem_dense(file_path):
+    """Dense parse of a bin-problem instance, as before the constraints were kept sparse"""
+    with open(file_path, 'r') as fp:
+        n_vars, n_cons = list(map(int, fp.readline().split()))
+        n_objs = int(fp.readline())
+        value = [list(map(int, fp.readline().split())) for _ in range(n_objs)]
+        cons_mat = np.zeros((n_cons, n_vars))
+        for i in range(n_cons):
+            fp.readline()
+            cons_mat[i, np.array(list(map(int, fp.readline().split()))) - 1] = 1
+
+    weight = np.sum(cons_mat, axis=0)
+    active_vars = weight != 0
+
+    return {'n_vars': sum(active_vars), 'n_cons': n_cons, 'n_objs': n_objs, 'weight': weight[active_vars],
+            'value': np.array(value)[:, active_vars]}
+
+
+def assert_same_instance(data, expected):
+    assert data.keys() == expected.keys()
+    for key, value in expected.items():
+        assert np.array_equal(np.asarray(data[key]), np.asarray(value)), key
+
+
+@pytest.fixture
+def split_path(tmp_path):
+    split_path = tmp_path / '3_8' / 'train'
+    split_path.mkdir(parents=True)
+
+    return split_path
+
+
+def test_sparse_binproblem_parse_matches_dense(tmp_path):
+    rng = np.random.default_rng(0)
+    for i in range(20):
+        file_path = tmp_path / f'bp_{i}.dat'
+        write_binproblem(file_path, rng)
+        assert_same_instance(read_data_from_file('bp', file_path), read_binproblem_dense(file_path))
+
+
+@pytest.mark.parametrize('acronym, write', [('kp', write_knapsack), ('bp', write_binproblem)])
+def test_instance_store_round_trip(split_path, acronym, write):
+    rng = np.random.default_rng(1)
+    for pid in range(5):
+        write(split_path / f'{acronym}_7_3_8_{pid}.dat', rng)
+
+    write_instance_store(acronym, split_path)
+    store = open_instance_store(split_path)
+    assert store is not None and len(store) == 5
+    for pid in range(5):
+        file_path = split_path / f'{acronym}_7_3_8_{pid}.dat'
+        expected = read_data_from_file(acronym, file_path)
+        assert_same_instance(store.get(name=file_path.stem), expected)
+        assert_same_instance(store.get(pid=pid), expected)
+        assert_same_instance(load_instance(acronym, file_path), expected)
+
+
+def test_stale_instance_store_is_rejected(split_path):
+    rng = np.random.default_rng(2)
+    for pid in range(3):
+        write_knapsack(split_path / f'kp_7_3_8_{pid}.dat', rng)
+    write_instance_store('kp', split_path)
+    assert open_instance_store(split_path) is not None
+
+    # Touch the source of one instance
+    file_path = split_path / 'kp_7_3_8_1.dat'
+    write_knapsack(file_path, rng)
+    st = os.stat(file_path)
+    os.utime(file_path, ns=(st.st_atime_ns, st.st_mtime_ns + 10 ** 9))
+
+    assert open_instance_store(split_path) is None
+    # The instance is parsed again from its file
+    assert_same_instance(load_instance('kp', file_path), read_data_from_file('kp', file_path))
@@ -0,0 +1,79 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from leo.utils.const import KnapsackPropertyWeights
+from leo.utils.label import LabelStore
+from leo.utils.label import MIN_WEIGHT_INCUMBENT
+from leo.utils.label import write_label_store
+
+
+@pytest.fixture
+def label_csv(tmp_path):
+    """Label CSV of three instances as written by find_best_label, keys not in KnapsackPropertyWeights order"""
+    rng = np.random.default_rng(0)
+    names = [pw.name for pw in KnapsackPropertyWeights][::-1]
+    pids = [3, 0, 11]
+    incumbents = [dict(zip(names, rng.uniform(-1, 1, len(names)).round(6).tolist())) for _ in pids]
+    df = pd.DataFrame({'pid': pids, 'seed': [7, 1, 2], 'cost': [10.5, 3.25, 8.0],
+                       'incb': [str(incb) for incb in incumbents]})
+
+    csv_path = tmp_path / 'label_7_40.csv'
+    df.to_csv(csv_path, index=False)
+
+    return csv_path, df, incumbents
+
+
+def test_npz_round_trip(label_csv):
+    csv_path, df, incumbents = label_csv
+    from_csv = LabelStore.from_csv(csv_path)
+    npz_path = write_label_store(csv_path, df['pid'].values, df['seed'].values, df['cost'].values, incumbents)
+    assert npz_path == csv_path.with_suffix('.npz')
+
+    store = LabelStore.load(csv_path)
+    assert store.names == from_csv.names == list(incumbents[0].keys())
+    np.testing.assert_array_equal(store.pids, from_csv.pids)
+    np.testing.assert_array_equal(store.seeds, from_csv.seeds)
+    np.testing.assert_array_equal(store.costs, from_csv.costs)
+    np.testing.assert_array_equal(store.weights, from_csv.weights)
+
+    for pid, seed, incb in zip(df['pid'], df['seed'], incumbents):
+        # Integer and string pids, as parsed from instance names, find the same label
+        assert pid in store and str(pid) in store
+        assert store.get_seed(str(pid)) == seed
+        assert store.get_weights(str(pid)) == incb
+        assert list(store.get_weights(pid).keys()) == list(incb.keys())
+        np.testing.assert_array_equal(store.get_vector(pid), [incb[pw.name] for pw in KnapsackPropertyWeights])
+
+
+def test_load_falls_back_to_stale_csv(label_csv):
+    csv_path, df, incumbents = label_csv
+    write_label_store(csv_path, df['pid'].values, df['seed'].values, df['cost'].values, incumbents)
+
+    # Relabel one instance in the CSV after the npz was written
+    df.loc[0, 'cost'] = 1.0
+    df.to_csv(csv_path, index=False)
+    npz_mtime = os.stat(csv_path.with_suffix('.npz')).st_mtime_ns
+    os.utime(csv_path, ns=(npz_mtime + 1, npz_mtime + 1))
+
+    assert LabelStore.load(csv_path).costs[0] == 1.0
+
+
+def test_get_weights_fallback(label_csv):
+    csv_path, df, incumbents = label_csv
+    store = LabelStore.from_csv(csv_path)
+
+    assert 5 not in store
+    assert store.get_weights(5, default=MIN_WEIGHT_INCUMBENT) is MIN_WEIGHT_INCUMBENT
+    # A labelled pid ignores the default
+    assert store.get_weights('0', default=MIN_WEIGHT_INCUMBENT) == incumbents[1]
+    with pytest.raises(KeyError):
+        store.get_weights(5)
+
+    matrix = store.get_matrix([11, 5], default=MIN_WEIGHT_INCUMBENT)
+    np.testing.assert_array_equal(matrix[0], store.get_vector(11))
+    np.testing.assert_array_equal(matrix[1], [MIN_WEIGHT_INCUMBENT[pw.name] for pw in KnapsackPropertyWeights])
+    with pytest.raises(KeyError):
+        store.get_matrix([11, 5])
@@ -0,0 +1,124 @@
+from operator import itemgetter
+
+import numpy as np
+import pytest
+
+from leo.utils.order import _score2order
+from leo.utils.order import _score2rank
+from leo.utils.order import get_normalized_properties
+from leo.utils.order import get_static_orders
+from leo.utils.order import get_variable_score_batch
+from leo.utils.order import get_variable_score_from_properties
+from leo.utils.order import pad_scores
+from leo.utils.order import score2order_batch
+from leo.utils.order import score2rank_batch
+from leo.utils.order import static_ranks_batch
+from leo.utils.order import STATIC_ORDERINGS
+
+
+def sort_order(scores, reverse=False):
+    """Order of the Python sort the batch APIs replace"""
+    var_score = sorted(enumerate(scores), key=itemgetter(1), reverse=reverse)
+
+    return [var for var, _ in var_score]
+
+
+def sort_rank(scores, reverse=False, high_to_low=False):
+    n_items = len(scores)
+    ranks = [0] * n_items
+    for rank, var in enumerate(sort_order(scores, reverse=reverse)):
+        ranks[var] = rank if high_to_low is False else n_items - rank
+
+    return ranks
+
+
+def get_random_scores(rng, n_instances=20, max_items=12):
+    # Few distinct values, so that most rows have ties
+    return [rng.integers(-3, 4, size=rng.integers(1, max_items + 1)).astype(float) for _ in range(n_instances)]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_score2order_batch_matches_sort(reverse):
+    rng = np.random.default_rng(0)
+    scores = get_random_scores(rng)
+    padded, n_items = pad_scores(scores)
+
+    orders = score2order_batch(padded, n_items=n_items, reverse=reverse)
+    for _scores, _order, n in zip(scores, orders, n_items):
+        assert _order[:n].tolist() == sort_order(_scores, reverse=reverse)
+        assert (_order[n:] == -1).all()
+
+    assert _score2order(scores, reverse=reverse) == [sort_order(s, reverse=reverse) for s in scores]
+    assert _score2order([[80, -10, 50, 100]], reverse=reverse) == [[3, 0, 2, 1] if reverse else [1, 2, 0, 3]]
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+@pytest.mark.parametrize('high_to_low', [False, True])
+def test_score2rank_batch_matches_sort(reverse, high_to_low):
+    rng = np.random.default_rng(1)
+    scores = get_random_scores(rng)
+    padded, n_items = pad_scores(scores)
+
+    ranks = score2rank_batch(padded, n_items=n_items, reverse=reverse, high_to_low=high_to_low)
+    normalized = score2rank_batch(padded, n_items=n_items, reverse=reverse, high_to_low=high_to_low,
+                                  normalized=True)
+    for _scores, _ranks, _normalized, n in zip(scores, ranks, normalized, n_items):
+        expected = sort_rank(_scores, reverse=reverse, high_to_low=high_to_low)
+        assert _ranks[:n].tolist() == expected
+        assert np.allclose(_normalized[:n], np.array(expected) / n)
+        assert (_ranks[n:] == -1).all() and (_normalized[n:] == -1).all()
+
+    expected = [sort_rank(s, reverse=reverse, high_to_low=high_to_low) for s in scores]
+    assert _score2rank(scores, reverse=reverse, high_to_low=high_to_low) == expected
+
+
+def test_static_orders_match_sort():
+    rng = np.random.default_rng(2)
+    for _ in range(20):
+        n_objs, n_vars = rng.integers(2, 5), rng.integers(2, 15)
+        data = {'weight': rng.integers(1, 5, size=n_vars), 'value': rng.integers(1, 5, size=(n_objs, n_vars))}
+        orders = get_static_orders(data, order_type=list(STATIC_ORDERINGS.keys()))
+        for name, (prop, descending) in STATIC_ORDERINGS.items():
+            value = np.asarray(data['value'])
+            keys = {'weight': data['weight'],
+                    'avg_value': np.mean(value, 0), 'max_value': np.max(value, 0), 'min_value': np.min(value, 0)}
+            for agg in ['avg', 'max', 'min']:
+                keys[f'{agg}_value_by_weight'] = [v / w for v, w in zip(keys[f'{agg}_value'], data['weight'])]
+
+            assert orders[name] == sort_order(keys[prop], reverse=descending)
+
+
+def test_static_ranks_batch_matches_single_instances():
+    rng = np.random.default_rng(3)
+    n_insts, n_objs, max_vars = 6, 3, 10
+    n_items = rng.integers(2, max_vars + 1, size=n_insts)
+    weight = np.zeros((n_insts, max_vars))
+    value = np.zeros((n_insts, n_objs, max_vars))
+    for i, n in enumerate(n_items):
+        weight[i, :n] = rng.integers(1, 5, size=n)
+        value[i, :, :n] = rng.integers(1, 5, size=(n_objs, n))
+
+    ranks = static_ranks_batch(weight, value, n_items=n_items)
+    for i, n in enumerate(n_items):
+        single = static_ranks_batch(weight[i:i + 1, :n], value[i:i + 1, :, :n])[:, 0]
+        assert (ranks[:, i, :n] == single).all()
+        assert (ranks[:, i, n:] == -1).all()
+
+
+def test_variable_score_batch_matches_single_scores():
+    rng = np.random.default_rng(4)
+    n_insts, n_configs, n_objs, n_vars = 4, 5, 3, 8
+    data_lst = [{'weight': rng.integers(1, 100, size=n_vars), 'value': rng.integers(1, 100, size=(n_objs, n_vars))}
+                for _ in range(n_insts)]
+    props = [get_normalized_properties(data) for data in data_lst]
+    keys = list(props[0].keys())
+    weights = rng.uniform(-1, 1, size=(n_configs, len(keys)))
+
+    norm_properties = np.stack([np.stack([p[k] for k in keys]) for p in props])
+    scores = get_variable_score_batch(norm_properties[:, np.newaxis], weights[np.newaxis])
+    assert scores.shape == (n_insts, n_configs, n_vars)
+    for i in range(n_insts):
+        for c in range(n_configs):
+            expected = get_variable_score_from_properties(props[i], dict(zip(keys, weights[c])))
+            # Same accumulation order, so the scores are identical and so are the ties of the orders
+            assert (scores[i, c] == expected).all()
@@ -0,0 +1,134 @@
+import json
+
+import pytest
+
+pytest.importorskip('smac')
+
+from smac.tae import StatusType
+
+from leo.utils.bdd import get_failure_record
+from leo.utils.tae import BDDTargetRunner
+
+INSTANCE = 'kp_7_3_6_0.dat'
+
+
+def get_screen_record(num_comparisons, runtime=1.0):
+    record = get_failure_record(0)
+    record.update({'num_comparisons': num_comparisons, 'compilation_time': runtime, 'reduction_time': 0,
+                   'pareto_time': 0})
+
+    return record
+
+
+@pytest.fixture
+def runner():
+    """Runner whose configurations are orders, evaluated from `screens` and `exact` instead of the binary"""
+    runner = BDDTargetRunner(ta=None, stats=None, screen_width=4, screen_eta=3, screen_warmup=2)
+    runner.screens, runner.exact, runner.calls = {}, {}, []
+
+    def evaluate(instance, order, time_limit, get_runtime=True, bdd_type=0, max_width=0):
+        runner.calls.append((tuple(order), bdd_type))
+        if bdd_type == 1:
+            return runner.screens[tuple(order)]
+        return runner.exact[tuple(order)]
+
+    runner.evaluate = evaluate
+    runner.get_order = lambda config, instance: list(config)
+    yield runner
+    runner.close()
+
+
+def test_screen_warmup_keeps_every_order(runner):
+    runner.screens[(0, 1)] = 'SUCCESS', get_screen_record(10)
+    runner.screens[(1, 0)] = 'TIMEOUT', get_failure_record(60)
+
+    # The worst score and a failed screen are both promising during the warmup
+    assert runner.screen(INSTANCE, (0, 1), 60) == (True, 1.0)
+    assert runner.screen(INSTANCE, (1, 0), 60) == (True, 60)
+
+
+def test_screen_keeps_best_eta_fraction(runner):
+    for i, score in enumerate([30, 10, 50, 20, 40, 60]):
+        runner.screens[(i,)] = 'SUCCESS', get_screen_record(score)
+    promising = [runner.screen(INSTANCE, (i,), 60)[0] for i in range(6)]
+
+    # Warmup, then the best of 3 scores and the 2nd best of 4, 5 and 6 scores: k = int((n - 1) / 3)
+    assert promising == [True, True, False, True, False, False]
+    # Screens are recorded: a second screen of an order does not rerun it, and sees all six scores
+    n_calls = len(runner.calls)
+    assert runner.screen(INSTANCE, (3,), 60) == (True, 1.0)
+    assert runner.screen(INSTANCE, (0,), 60) == (False, 1.0)
+    assert len(runner.calls) == n_calls
+
+
+def test_failed_screens_are_not_promising(runner):
+    runner.screens[(0,)] = 'SUCCESS', get_screen_record(10)
+    runner.screens[(1,)] = 'SUCCESS', get_screen_record(20)
+    runner.screens[(2,)] = 'MEMOUT', get_failure_record(-1)
+    runner.screens[(3,)] = 'TIMEOUT', get_failure_record(60)
+    runner.screens[(4,)] = 'SUCCESS', get_screen_record(20)
+    promising = [runner.screen(INSTANCE, (i,), 60)[0] for i in range(5)]
+
+    # Failed screens are left out of the threshold: int((3 - 1) / 3) = 0 keeps only the best score
+    assert promising == [True, True, False, False, False]
+
+
+def test_screened_out_order_is_a_timeout_at_cutoff(runner):
+    runner.screens[(0,)] = 'SUCCESS', get_screen_record(10)
+    runner.screens[(1,)] = 'SUCCESS', get_screen_record(20)
+    runner.screens[(2,)] = 'SUCCESS', get_screen_record(30, runtime=2.5)
+    runner.exact[(0,)] = 'SUCCESS', 3.0
+    runner.exact[(1,)] = 'SUCCESS', 4.0
+
+    assert runner.run((0,), INSTANCE, cutoff=59)[:2] == (StatusType.SUCCESS, 3.0)
+    assert runner.run((1,), INSTANCE, cutoff=59)[:2] == (StatusType.SUCCESS, 4.0)
+    assert runner.run((2,), INSTANCE, cutoff=59) == (StatusType.TIMEOUT, 59.0, 2.5, {'screened_out': True})
+    # The screened-out order is never built exactly
+    assert ((2,), 0) not in runner.calls
+    assert runner.trial_stats[INSTANCE]['screened_out'] == 1
+
+
+def test_recorded_success_slower_than_time_limit_is_timeout(runner):
+    runner.results[INSTANCE] = {(0,): ('SUCCESS', 10.0, 60)}
+
+    assert runner.get_recorded(INSTANCE, (0,), 60) == ('SUCCESS', 10.0)
+    assert runner.get_recorded(INSTANCE, (0,), 10) == ('SUCCESS', 10.0)
+    assert runner.get_recorded(INSTANCE, (0,), 5) == ('TIMEOUT', 5)
+
+
+def test_recorded_timeout_reused_under_smaller_time_limit(runner):
+    runner.results[INSTANCE] = {(0,): ('TIMEOUT', 60, 60)}
+
+    assert runner.get_recorded(INSTANCE, (0,), 30) == ('TIMEOUT', 30)
+    assert runner.get_recorded(INSTANCE, (0,), 60) == ('TIMEOUT', 60)
+    assert runner.get_recorded(INSTANCE, (0,), 120) is None
+    assert runner.get_recorded(INSTANCE, (1,), 30) is None
+
+
+def test_run_deduplicates_orders(runner):
+    runner.screen_width = None
+    runner.exact[(0,)] = 'SUCCESS', 3.0
+
+    assert runner.run((0,), INSTANCE, cutoff=59)[:2] == (StatusType.SUCCESS, 3.0)
+    # A time limit of int(cutoff + 1) = 2 seconds
+    assert runner.run((0,), INSTANCE, cutoff=1)[:2] == (StatusType.TIMEOUT, 2)
+    assert runner.calls == [((0,), 0)]
+    assert runner.trial_stats[INSTANCE] == {'trials': 2, 'deduplicated': 1, 'unique_orders': 1,
+                                            'screened_orders': 0, 'screened_out': 0}
+
+
+def test_stats_written_every_interval_and_on_close(runner, tmp_path):
+    runner.screen_width = None
+    runner.stats_path = str(tmp_path / 'run_1' / 'tae_stats.json')
+    runner.stats_interval = 3600
+    for i in range(3):
+        runner.exact[(i,)] = 'SUCCESS', 1.0
+        runner.run((i,), INSTANCE, cutoff=59)
+
+    # Only the first trial is written within the interval
+    with open(runner.stats_path) as fp:
+        assert json.load(fp)[INSTANCE]['trials'] == 1
+
+    runner.close()
+    with open(runner.stats_path) as fp:
+        assert json.load(fp)[INSTANCE]['trials'] == 3
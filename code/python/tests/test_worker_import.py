@@ -0,0 +1,50 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+# Modules that must never be loaded on the SMAC worker path
+HEAVY_MODULES = ['torch', 'sklearn', 'scipy', 'pandas', 'omegaconf', 'hydra', 'xgboost']
+
+# Maximum median wall time (in seconds) of a worker start-up
+STARTUP_BUDGET = 0.5
+
+WORKER_IMPORT = f"""
+import json
+import sys
+import time
+
+t = time.perf_counter()
+import leo.smac_worker
+elapsed = time.perf_counter() - t
+heavy = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(json.dumps({{'import_time': elapsed, 'heavy': heavy}}))
+"""
+
+MODULE_PATH = Path(__file__).parent.parent
+
+
+def time_worker_import():
+    # As set by label_instance.py for the workers SMAC spawns
+    env = dict(os.environ, module_path=str(MODULE_PATH))
+    start = time.perf_counter()
+    out = subprocess.run([sys.executable, '-c', WORKER_IMPORT], cwd=MODULE_PATH, env=env,
+                         capture_output=True, text=True, check=True)
+    wall = time.perf_counter() - start
+
+    result = json.loads(out.stdout.strip().split('\n')[-1])
+    result['wall_time'] = wall
+
+    return result
+
+
+def test_worker_startup():
+    # Warm up the file system cache
+    time_worker_import()
+    results = [time_worker_import() for _ in range(5)]
+
+    assert sorted(set(m for r in results for m in r['heavy'])) == []
+    assert statistics.median(r['wall_time'] for r in results) <= STARTUP_BUDGET